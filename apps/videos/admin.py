@@ -1,8 +1,10 @@
 """
 Admin configuration for Video Profile Management
 """
+from django import forms
 from django.contrib import admin
-from .models import VideoProfile, PromptTemplate
+from .encoding import get_encoding_profile_choices
+from .models import VideoProfile, PromptTemplate, Segment, ProcessingJob
 
 
 @admin.register(PromptTemplate)
@@ -28,6 +30,17 @@ class PromptTemplateAdmin(admin.ModelAdmin):
     )
 
 
+class SegmentInline(admin.TabularInline):
+    """Inline segments trong VideoProfile"""
+    
+    model = Segment
+    extra = 0
+    fields = ['position', 'start_time', 'end_time', 'status', 'cut_mode', 'minio_output_link', 'processed_at']
+    readonly_fields = ['processed_at']
+    ordering = ['position']
+    show_change_link = True
+
+
 @admin.register(VideoProfile)
 class VideoProfileAdmin(admin.ModelAdmin):
     """Admin cho VideoProfile"""
@@ -35,7 +48,15 @@ class VideoProfileAdmin(admin.ModelAdmin):
     list_display = ['title', 'status', 'assigned_user', 'get_progress', 'created_at', 'updated_at']
     list_filter = ['status', 'assigned_user', 'created_at']
     search_fields = ['title', 'youtube_link', 'notes']
-    readonly_fields = ['id', 'created_at', 'updated_at', 'get_progress_display']
+    readonly_fields = [
+        'id', 'created_at', 'updated_at', 'get_progress_display',
+        'duration', 'width', 'height', 'fps', 'video_codec', 'audio_codec',
+        'bitrate', 'file_size', 'probed_at', 'legacy_segments',
+        'total_segments', 'processed_segments', 'version',
+        'preview_proxy_link', 'preview_hls_link', 'preview_generated_at',
+        'thumbnails_vtt_link', 'thumbnails_index_link', 'thumbnails_info', 'thumbnails_generated_at'
+    ]
+    inlines = [SegmentInline]
     autocomplete_fields = ['assigned_user', 'prompt_template']
     
     fieldsets = (
@@ -45,9 +66,27 @@ class VideoProfileAdmin(admin.ModelAdmin):
         ('Links', {
             'fields': ('youtube_link', 'minio_input_link')
         }),
+        ('Metadata video input', {
+            'fields': (
+                'duration', ('width', 'height'), 'fps', ('video_codec', 'audio_codec'),
+                'bitrate', 'file_size', 'probed_at'
+            ),
+            'classes': ('collapse',)
+        }),
+        ('Preview', {
+            'fields': (
+                'preview_proxy_link', 'preview_hls_link', 'preview_generated_at',
+                'thumbnails_vtt_link', 'thumbnails_index_link', 'thumbnails_info', 'thumbnails_generated_at'
+            ),
+            'classes': ('collapse',)
+        }),
         ('Segments', {
-            'fields': ('segments', 'get_progress_display'),
-            'description': 'Danh sách các segments đã xử lý'
+            'fields': ('cut_mode', 'encoding_profile', 'get_progress_display'),
+            'description': 'Danh sách segments ở bảng bên dưới'
+        }),
+        ('Segments (JSON cũ)', {
+            'fields': ('legacy_segments',),
+            'classes': ('collapse',)
         }),
         ('Ghi chú', {
             'fields': ('notes',),
@@ -59,10 +98,22 @@ class VideoProfileAdmin(admin.ModelAdmin):
         }),
     )
     
+    def formfield_for_dbfield(self, db_field, request, **kwargs):
+        # Danh sách profile lấy từ settings nên không khai báo choices ở model
+        if db_field.name == 'encoding_profile':
+            kwargs['widget'] = forms.Select(choices=[('', 'Mặc định')] + get_encoding_profile_choices())
+        return super().formfield_for_dbfield(db_field, request, **kwargs)
+    
+    def save_related(self, request, form, formsets, change):
+        """Cập nhật bộ đếm segments sau khi lưu inline"""
+        super().save_related(request, form, formsets, change)
+        VideoProfile.refresh_segment_counters(form.instance.pk)
+    
     def get_progress(self, obj):
         """Display progress percentage"""
         return f"{obj.get_progress_percentage()}%"
     get_progress.short_description = 'Tiến độ'
+    get_progress.admin_order_field = 'processed_segments'
     
     def get_progress_display(self, obj):
         """Display detailed progress info"""
@@ -70,4 +121,57 @@ class VideoProfileAdmin(admin.ModelAdmin):
         processed = obj.get_processed_segments()
         percentage = obj.get_progress_percentage()
         return f"{processed}/{total} segments ({percentage}%)"
-    get_progress_display.short_description = 'Chi tiết tiến độ'
\ No newline at end of file
+    get_progress_display.short_description = 'Chi tiết tiến độ'
+
+
+@admin.register(Segment)
+class SegmentAdmin(admin.ModelAdmin):
+    """Admin cho Segment"""
+    
+    list_display = ['__str__', 'video', 'position', 'start_time', 'end_time', 'status', 'cut_mode', 'processed_at']
+    list_filter = ['status', 'cut_mode']
+    search_fields = ['prompt', 'result', 'minio_output_link', 'video__title']
+    readonly_fields = ['id', 'version', 'metrics', 'created_at', 'updated_at', 'processing_started_at', 'processed_at']
+    list_select_related = ['video']
+    raw_id_fields = ['video']
+    
+    fieldsets = (
+        ('Thông tin cơ bản', {
+            'fields': ('id', 'video', 'position', 'status')
+        }),
+        ('Nội dung', {
+            'fields': ('prompt', 'result')
+        }),
+        ('Cắt video', {
+            'fields': ('start_time', 'end_time', 'cut_mode', 'minio_output_link')
+        }),
+        ('Thông tin hệ thống', {
+            'fields': ('version', 'metrics', 'processing_started_at', 'processed_at', 'created_at', 'updated_at'),
+            'classes': ('collapse',)
+        }),
+    )
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        VideoProfile.refresh_segment_counters(obj.video_id)
+    
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        VideoProfile.refresh_segment_counters(obj.video_id)
+    
+    def delete_queryset(self, request, queryset):
+        video_ids = set(queryset.values_list('video_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for video_id in video_ids:
+            VideoProfile.refresh_segment_counters(video_id)
+
+
+@admin.register(ProcessingJob)
+class ProcessingJobAdmin(admin.ModelAdmin):
+    """Admin cho ProcessingJob"""
+    
+    list_display = ['id', 'video', 'kind', 'segment_index', 'status', 'node', 'attempts', 'created_at', 'started_at', 'finished_at']
+    list_filter = ['status', 'kind', 'node', 'created_at']
+    search_fields = ['video__title', 'error', 'worker_id']
+    readonly_fields = ['id', 'metrics', 'created_at', 'started_at', 'finished_at', 'heartbeat_at', 'lease_expires_at']
+    raw_id_fields = ['video', 'segment']
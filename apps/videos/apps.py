@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class VideosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.videos'
-    verbose_name = 'Video Profile Management'
\ No newline at end of file
+    verbose_name = 'Video Profile Management'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
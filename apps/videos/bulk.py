@@ -0,0 +1,321 @@
+"""
+Thao tác hàng loạt trên segments: thêm/sửa/xóa trong 1 transaction (JSON hoặc CSV)
+và generate prompt cho nhiều video/segment
+"""
+import csv
+import io
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import VideoProfile, PromptTemplate, Segment
+from .prompts import compile_template, build_prompt_values
+
+
+# Cột CSV mặc định khi file không có header
+CSV_COLUMNS = ['start_time', 'end_time', 'prompt', 'result']
+
+
+class BulkValidationError(Exception):
+    """Dữ liệu bulk không hợp lệ, không có thay đổi nào được ghi"""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid row(s)")
+        self.errors = errors
+
+
+def parse_time(value):
+    """
+    Đọc thời gian dạng giây (12.5) hoặc [hh:]mm:ss[.ms] (01:02:03.5)
+
+    Returns:
+        float: Số giây, None nếu rỗng
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    value = str(value).strip()
+    if not value:
+        return None
+
+    seconds = 0.0
+    for part in value.split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def parse_segments_csv(text):
+    """
+    Đọc danh sách segments từ CSV (start_time,end_time,prompt[,result])
+
+    Dòng đầu được coi là header nếu có cột start_time.
+
+    Args:
+        text: Nội dung CSV
+
+    Returns:
+        list: List dict theo thứ tự các dòng (bỏ qua dòng trống)
+    """
+    rows = [row for row in csv.reader(io.StringIO(text)) if any(cell.strip() for cell in row)]
+    if not rows:
+        return []
+
+    header = [cell.strip().lower() for cell in rows[0]]
+    if 'start_time' in header:
+        columns, rows = header, rows[1:]
+    else:
+        columns = CSV_COLUMNS
+
+    return [
+        {column: cell for column, cell in zip(columns, row) if column in CSV_COLUMNS}
+        for row in rows
+    ]
+
+
+def _check_time_range(start_time, end_time, duration):
+    """Lỗi của khoảng thời gian segment (None nếu hợp lệ), giá trị None = bỏ trống"""
+    if start_time is not None and start_time < 0:
+        return 'Start time must not be negative'
+    if start_time is not None and end_time is not None and start_time >= end_time:
+        return 'Start time must be less than end time'
+    if duration is not None and start_time is not None and start_time >= duration:
+        return f'Start time {start_time} exceeds video duration {duration:.3f}'
+    if duration is not None and end_time is not None and end_time > duration:
+        return f'End time {end_time} exceeds video duration {duration:.3f}'
+    return None
+
+
+def _clean_item(item, duration):
+    """Chuẩn hóa 1 segment từ request, trả về (values, error)"""
+    if not isinstance(item, dict):
+        return None, 'Segment must be an object'
+    if item.get('version') is not None:
+        try:
+            int(item['version'])
+        except (TypeError, ValueError):
+            return None, 'Invalid version'
+    try:
+        item = dict(item)
+        for field in ('start_time', 'end_time'):
+            if field in item:
+                item[field] = parse_time(item[field])
+        values = Segment.clean_values(item)
+    except (TypeError, ValueError):
+        return None, 'Invalid start_time/end_time'
+
+    error = _check_time_range(values.get('start_time'), values.get('end_time'), duration)
+    if error:
+        return None, error
+    return values, None
+
+
+def apply_segment_changes(video, create=None, update=None, delete=None):
+    """
+    Thêm/sửa/xóa nhiều segments của video trong 1 transaction
+
+    Toàn bộ dữ liệu được kiểm tra trước; nếu có dòng lỗi thì không ghi gì
+    (BulkValidationError). Segment cập nhật có kèm `version` chỉ được ghi
+    nếu version trong DB còn khớp, ngược lại được trả về trong `conflicts`.
+
+    Args:
+        video: VideoProfile instance
+        create: List dict segment mới (thêm vào cuối, theo thứ tự)
+        update: List dict có `id` (và `version` tùy chọn) cùng các field cần sửa
+        delete: List id segment cần xóa
+
+    Returns:
+        dict: created (id, position), updated (id, version), deleted, conflicts
+
+    Raises:
+        BulkValidationError: Có dòng không hợp lệ (update được kiểm tra cả với giá trị đang lưu)
+    """
+    create = create or []
+    update = update or []
+    delete = [str(pk) for pk in (delete or [])]
+    errors = []
+
+    new_values = []
+    for row, item in enumerate(create):
+        values, error = _clean_item(item, video.duration)
+        if error:
+            errors.append({'op': 'create', 'row': row, 'error': error})
+        else:
+            new_values.append(values)
+
+    changes = {}
+    for row, item in enumerate(update):
+        if not isinstance(item, dict) or not item.get('id'):
+            errors.append({'op': 'update', 'row': row, 'error': 'Segment id is required'})
+            continue
+        values, error = _clean_item(item, video.duration)
+        if error:
+            errors.append({'op': 'update', 'row': row, 'id': str(item['id']), 'error': error})
+        else:
+            changes[str(item['id'])] = (row, values, item.get('version'))
+
+    if errors:
+        raise BulkValidationError(errors)
+
+    now = timezone.now()
+    result = {'created': [], 'updated': [], 'deleted': 0, 'conflicts': []}
+
+    with transaction.atomic():
+        video.lock()
+
+        if delete:
+            result['deleted'], _ = Segment.objects.filter(video=video, pk__in=delete).delete()
+            # Đánh lại vị trí liên tục sau khi xóa
+            moved = []
+            for position, segment in enumerate(video.segments.order_by('position').only('id', 'position')):
+                if segment.position != position:
+                    segment.position = position
+                    moved.append(segment)
+            Segment.objects.bulk_update(moved, ['position'], batch_size=1000)
+
+        if changes:
+            existing = {
+                str(segment.pk): segment
+                for segment in video.segments.filter(pk__in=list(changes))
+            }
+            # Sửa 1 phần (vd: chỉ start_time) phải hợp lệ với giá trị còn lại
+            # đang lưu của segment; lỗi thì rollback cả phần delete ở trên
+            for segment_id, (row, values, _) in changes.items():
+                segment = existing.get(segment_id)
+                if segment is None:
+                    continue
+                error = _check_time_range(
+                    values.get('start_time', segment.start_time),
+                    values.get('end_time', segment.end_time),
+                    video.duration
+                )
+                if error:
+                    errors.append({'op': 'update', 'row': row, 'id': segment_id, 'error': error})
+            if errors:
+                raise BulkValidationError(errors)
+
+            for segment_id, (_, values, expected_version) in changes.items():
+                segment = existing.get(segment_id)
+                if segment is None:
+                    result['conflicts'].append({'id': segment_id, 'error': 'Segment not found'})
+                    continue
+                if expected_version is not None and int(expected_version) != segment.version:
+                    result['conflicts'].append({'id': segment_id, 'error': 'Version mismatch'})
+                    continue
+
+                fields = {
+                    field: value for field, value in values.items()
+                    if getattr(segment, field) != value
+                }
+                if not fields:
+                    continue
+                if 'minio_output_link' in fields:
+                    fields['status'] = 'completed' if fields['minio_output_link'] else 'pending'
+                if Segment.objects.filter(pk=segment.pk, version=segment.version).update(
+                    version=models.F('version') + 1,
+                    updated_at=now,
+                    **fields
+                ):
+                    result['updated'].append({'id': segment_id, 'version': segment.version + 1})
+                else:
+                    result['conflicts'].append({'id': segment_id, 'error': 'Version mismatch'})
+
+        if new_values:
+            last = video.segments.order_by('-position').values_list('position', flat=True).first()
+            start = 0 if last is None else last + 1
+            segments = []
+            for offset, values in enumerate(new_values):
+                if values.get('minio_output_link'):
+                    values['status'] = 'completed'
+                segments.append(Segment(video=video, position=start + offset, **values))
+            Segment.objects.bulk_create(segments, batch_size=1000)
+            result['created'] = [
+                {'id': str(segment.pk), 'position': segment.position} for segment in segments
+            ]
+
+        if new_values or delete or result['updated']:
+            VideoProfile.refresh_segment_counters(video.pk)
+
+    return result
+
+
+# Số video xử lý mỗi lượt khi generate prompt hàng loạt
+PROMPT_BATCH_VIDEOS = 200
+
+
+def generate_segment_prompts(videos, template=None, only_empty=False, dry_run=False,
+                             batch_size=PROMPT_BATCH_VIDEOS, progress=None):
+    """
+    Generate prompt cho tất cả segments của nhiều video
+
+    Mỗi lượt `batch_size` video dùng số query cố định (video, template, segments,
+    bulk_update) thay vì query theo từng segment.
+
+    Args:
+        videos: QuerySet/list VideoProfile hoặc list UUID
+        template: PromptTemplate dùng chung; None = template riêng của từng video
+        only_empty: Chỉ điền segment chưa có prompt
+        dry_run: Chỉ đếm, không ghi DB
+        batch_size: Số video mỗi lượt
+        progress: Callback progress(done_videos, total_videos, updated_segments)
+
+    Returns:
+        dict: videos, segments, updated, skipped_videos (không có template)
+    """
+    if isinstance(videos, models.QuerySet):
+        video_ids = list(videos.values_list('pk', flat=True))
+    else:
+        video_ids = [getattr(video, 'pk', video) for video in videos]
+
+    result = {'videos': len(video_ids), 'segments': 0, 'updated': 0, 'skipped_videos': 0}
+    compiled = compile_template(template) if template is not None else None
+
+    for start in range(0, len(video_ids), batch_size):
+        chunk = list(
+            VideoProfile.objects.filter(pk__in=video_ids[start:start + batch_size])
+            .only('id', 'title', 'youtube_link', 'notes', 'duration', 'prompt_template_id')
+        )
+
+        templates = {}
+        if compiled is None:
+            template_ids = {video.prompt_template_id for video in chunk if video.prompt_template_id}
+            templates = {
+                item.pk: compile_template(item)
+                for item in PromptTemplate.objects.filter(pk__in=template_ids)
+                .only('id', 'template_content', 'updated_at')
+            }
+
+        compiled_by_video = {}
+        for video in chunk:
+            video_template = compiled or templates.get(video.prompt_template_id)
+            if video_template is None:
+                result['skipped_videos'] += 1
+            else:
+                compiled_by_video[video.pk] = (video, video_template)
+
+        segments = Segment.objects.filter(video_id__in=list(compiled_by_video)).only(
+            'id', 'video_id', 'position', 'start_time', 'end_time', 'prompt'
+        )
+        if only_empty:
+            segments = segments.filter(models.Q(prompt='') | models.Q(prompt__isnull=True))
+
+        now = timezone.now()
+        changed = []
+        for segment in segments:
+            result['segments'] += 1
+            video, video_template = compiled_by_video[segment.video_id]
+            prompt = video_template.render(build_prompt_values(video, segment))
+            if prompt != segment.prompt:
+                segment.prompt = prompt
+                segment.version = models.F('version') + 1
+                segment.updated_at = now
+                changed.append(segment)
+
+        if changed and not dry_run:
+            Segment.objects.bulk_update(changed, ['prompt', 'version', 'updated_at'], batch_size=1000)
+        result['updated'] += len(changed)
+
+        if progress:
+            progress(min(start + batch_size, len(video_ids)), len(video_ids), result['updated'])
+
+    return result
@@ -0,0 +1,88 @@
+"""
+Cache dữ liệu tham chiếu ít thay đổi (template đang active, danh sách user)
+cho các màn hình editor, tự xóa khi dữ liệu thay đổi (xem signals.py)
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from .models import PromptTemplate
+
+
+ACTIVE_TEMPLATES_KEY = 'videos:active_prompt_templates'
+USER_CHOICES_KEY = 'videos:user_choices'
+# Version của các fragment dropdown đã render ({% cache %} vary theo version này)
+FRAGMENT_VERSION_KEY = 'videos:reference_fragment_version'
+
+
+def get_active_prompt_templates():
+    """
+    Danh sách prompt template đang active cho dropdown
+
+    Returns:
+        list: List dict (id, name, category, category_display), sắp theo category, name
+    """
+    templates = cache.get(ACTIVE_TEMPLATES_KEY)
+    if templates is None:
+        templates = [
+            {
+                'id': template.id,
+                'name': template.name,
+                'category': template.category,
+                'category_display': template.get_category_display(),
+            }
+            for template in PromptTemplate.objects.filter(is_active=True).only('id', 'name', 'category')
+        ]
+        cache.set(ACTIVE_TEMPLATES_KEY, templates, settings.REFERENCE_CACHE_TIMEOUT)
+    return templates
+
+
+def get_user_choices():
+    """
+    Danh sách user cho dropdown người phụ trách
+
+    Returns:
+        list: List dict (id, username, label), label = họ tên hoặc email
+    """
+    users = cache.get(USER_CHOICES_KEY)
+    if users is None:
+        User = get_user_model()
+        users = [
+            {
+                'id': user.id,
+                'username': user.username,
+                'label': user.get_full_name() or user.email,
+            }
+            for user in User.objects.only('id', 'username', 'first_name', 'last_name', 'email').order_by('username')
+        ]
+        cache.set(USER_CHOICES_KEY, users, settings.REFERENCE_CACHE_TIMEOUT)
+    return users
+
+
+def get_fragment_version():
+    """Version hiện tại của các fragment dropdown đã render"""
+    version = cache.get(FRAGMENT_VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(FRAGMENT_VERSION_KEY, version, None)
+    return version
+
+
+def invalidate_prompt_templates():
+    """Xóa cache template (gọi khi PromptTemplate thay đổi)"""
+    cache.delete(ACTIVE_TEMPLATES_KEY)
+    _bump_fragment_version()
+
+
+def invalidate_user_choices():
+    """Xóa cache user (gọi khi User thay đổi)"""
+    cache.delete(USER_CHOICES_KEY)
+    _bump_fragment_version()
+
+
+def _bump_fragment_version():
+    """Đổi version để các fragment đã render không còn được dùng"""
+    try:
+        cache.incr(FRAGMENT_VERSION_KEY)
+    except ValueError:
+        cache.set(FRAGMENT_VERSION_KEY, 2, None)
@@ -0,0 +1,156 @@
+"""
+Encoding profile cho các chế độ cắt có encode lại (reencode, phần đầu/cuối
+của smart cut, streaming)
+
+Mỗi profile đặt preset/CRF (hoặc bitrate), số thread, giới hạn độ phân giải
+và audio. Profile được chọn theo thứ tự: VideoProfile.encoding_profile ->
+settings.VIDEO_ENCODING_PROFILE_BY_CATEGORY (category của prompt template)
+-> settings.VIDEO_ENCODING_PROFILE. settings.VIDEO_ENCODING_PROFILES dùng để
+ghi đè tham số hoặc thêm profile mới.
+"""
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# name -> tham số; field không khai báo lấy mặc định của EncodingProfile
+DEFAULT_ENCODING_PROFILES = {
+    'fast-preview': {
+        'label': 'Fast preview (nhanh, chất lượng thấp, tối đa 480p)',
+        'preset': 'veryfast',
+        'crf': 30,
+        'max_height': 480,
+        'threads': 2,
+        'audio_bitrate': '96k',
+    },
+    'balanced': {
+        'label': 'Balanced (mặc định)',
+        'preset': 'medium',
+        'crf': 23,
+    },
+    'archival': {
+        'label': 'Archival (chậm, chất lượng cao)',
+        'preset': 'slow',
+        'crf': 18,
+        'audio_bitrate': '192k',
+        'audio_sample_rate': 48000,
+    },
+}
+
+
+class EncodingProfile:
+    """Tham số encode H.264/AAC của 1 profile"""
+
+    __slots__ = (
+        'name', 'label', 'video_codec', 'preset', 'crf', 'video_bitrate', 'max_height', 'threads',
+        'audio_codec', 'audio_bitrate', 'audio_sample_rate',
+    )
+
+    def __init__(self, name, label=None, video_codec='libx264', preset='medium', crf=None, video_bitrate=None,
+                 max_height=None, threads=None, audio_codec='aac', audio_bitrate=None, audio_sample_rate=44100):
+        self.name = name
+        self.label = label or name
+        self.video_codec = video_codec
+        self.preset = preset
+        self.crf = crf
+        # Đặt video_bitrate (vd: '4M') thì encode theo bitrate thay cho CRF
+        self.video_bitrate = video_bitrate
+        self.max_height = max_height
+        # None/0 = ffmpeg tự chọn theo số CPU
+        self.threads = threads
+        self.audio_codec = audio_codec
+        self.audio_bitrate = audio_bitrate
+        self.audio_sample_rate = audio_sample_rate
+
+    def _scale_filter(self):
+        if not self.max_height:
+            return None
+        # Chỉ thu nhỏ, giữ tỉ lệ khung hình (chiều rộng chẵn cho yuv420p)
+        return f"scale=-2:'min({int(self.max_height)},ih)'"
+
+    def video_args(self, scale=True):
+        """
+        Tham số ffmpeg cho video stream
+
+        Args:
+            scale: Áp dụng giới hạn độ phân giải (False khi output phải khớp
+                stream gốc, vd: phần đầu/cuối của smart cut)
+        """
+        args = ['-c:v', self.video_codec, '-preset', self.preset]
+        if self.video_bitrate:
+            args += ['-b:v', self.video_bitrate]
+        elif self.crf is not None:
+            args += ['-crf', self.crf]
+        if self.threads:
+            args += ['-threads', self.threads]
+        if scale and self._scale_filter():
+            args += ['-vf', self._scale_filter()]
+        return args
+
+    def audio_args(self):
+        """Tham số ffmpeg cho audio stream"""
+        args = ['-c:a', self.audio_codec]
+        if self.audio_bitrate:
+            args += ['-b:a', self.audio_bitrate]
+        if self.audio_sample_rate:
+            args += ['-ar', self.audio_sample_rate]
+        return args
+
+    def moviepy_params(self):
+        """Tham số cho MoviePy write_videofile"""
+        ffmpeg_params = []
+        if self.crf is not None and not self.video_bitrate:
+            ffmpeg_params += ['-crf', str(self.crf)]
+        if self._scale_filter():
+            ffmpeg_params += ['-vf', self._scale_filter()]
+        return {
+            'codec': self.video_codec,
+            'preset': self.preset,
+            'bitrate': self.video_bitrate,
+            'threads': self.threads or None,
+            'audio_codec': self.audio_codec,
+            'audio_bitrate': self.audio_bitrate,
+            'audio_fps': self.audio_sample_rate or 44100,
+            'ffmpeg_params': ffmpeg_params or None,
+        }
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+def get_encoding_profiles():
+    """
+    Tất cả profile (mặc định + settings.VIDEO_ENCODING_PROFILES)
+
+    Returns:
+        dict: name -> dict tham số
+    """
+    profiles = {name: dict(params) for name, params in DEFAULT_ENCODING_PROFILES.items()}
+    for name, params in settings.VIDEO_ENCODING_PROFILES.items():
+        profiles.setdefault(name, {}).update(params)
+    return profiles
+
+
+def get_encoding_profile_choices():
+    """List (name, label) cho dropdown"""
+    return [(name, params.get('label') or name) for name, params in get_encoding_profiles().items()]
+
+
+def get_encoding_profile(name=None):
+    """
+    Lấy EncodingProfile theo tên
+
+    Args:
+        name: Tên profile, None = settings.VIDEO_ENCODING_PROFILE
+
+    Returns:
+        EncodingProfile (profile mặc định nếu tên không tồn tại)
+    """
+    profiles = get_encoding_profiles()
+    name = name or settings.VIDEO_ENCODING_PROFILE
+    if name not in profiles:
+        logger.warning(f"Unknown encoding profile {name}, using {settings.VIDEO_ENCODING_PROFILE}")
+        name = settings.VIDEO_ENCODING_PROFILE
+    return EncodingProfile(name, **profiles.get(name, {}))
+
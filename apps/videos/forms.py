@@ -23,7 +23,7 @@ class PromptTemplateForm(forms.ModelForm):
             'template_content': forms.Textarea(attrs={
                 'class': 'form-control',
                 'rows': 10,
-                'placeholder': 'Nhập nội dung template...\nSử dụng {youtube_title}, {youtube_description}, {youtube_tags}'
+                'placeholder': 'Nhập nội dung template...\nSử dụng {youtube_link}, {youtube_title}, {youtube_description}, {youtube_tags}, {start_time}, {end_time}, ...'
             }),
             'description': forms.Textarea(attrs={
                 'class': 'form-control',
@@ -0,0 +1,286 @@
+"""
+Disk cache (LRU) cho video input tải từ Minio
+"""
+import os
+import json
+import fcntl
+import hashlib
+import tempfile
+from contextlib import contextmanager
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class InputVideoCache:
+    """
+    Cache file video input trên đĩa local, dùng chung giữa các worker
+
+    - Key: object name + ETag trên Minio, nên object bị ghi đè sẽ tự động
+      tạo entry mới thay vì dùng bản cũ
+    - Giới hạn tổng dung lượng theo settings.VIDEO_INPUT_CACHE_MAX_BYTES,
+      loại bỏ entry ít dùng nhất (LRU theo mtime, được cập nhật mỗi lần hit)
+    - An toàn khi nhiều process cùng truy cập: dùng flock cho từng entry
+      (download 1 lần, entry đang được dùng không bị evict) và 1 lock chung
+      cho eviction/thống kê
+    - File tải tạm (object lớn hơn cache) nằm trong thư mục con, không bao
+      giờ bị coi là entry
+    """
+
+    ENTRY_SUFFIX = '.mp4'
+    LOCK_SUFFIX = '.lock'
+    GLOBAL_LOCK = 'cache.lock'
+    STATS_FILE = 'stats.json'
+    UNCACHED_DIR = 'uncached'
+
+    def __init__(self, minio_client, cache_dir=None, max_bytes=None):
+        self.minio_client = minio_client
+        self.cache_dir = cache_dir or settings.VIDEO_INPUT_CACHE_DIR
+        self.max_bytes = settings.VIDEO_INPUT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        # Kết quả lần open() gần nhất: cache (hit/miss/bypass) và số byte đã download
+        self.last_fetch = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_key(self, object_name, etag):
+        return hashlib.sha256(f"{object_name}:{etag}".encode()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + self.ENTRY_SUFFIX)
+
+    def _lock_path(self, key):
+        return os.path.join(self.cache_dir, key + self.LOCK_SUFFIX)
+
+    @contextmanager
+    def _global_lock(self):
+        with open(os.path.join(self.cache_dir, self.GLOBAL_LOCK), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _is_current(self, lock_file, lock_path):
+        """Lock file đang giữ vẫn là file tại lock_path (chưa bị _try_remove xóa)"""
+        try:
+            return os.fstat(lock_file.fileno()).st_ino == os.stat(lock_path).st_ino
+        except FileNotFoundError:
+            return False
+
+    @contextmanager
+    def _entry_lock(self, key, mode):
+        """
+        Mở và flock lock file của entry
+
+        Lock file bị xóa cùng entry (_try_remove) nên có thể đã bị xóa trong
+        lúc chờ lock; khi đó mở lại file mới để lock có tác dụng với process khác.
+
+        Raises:
+            BlockingIOError: mode có LOCK_NB và entry đang bị giữ
+        """
+        lock_path = self._lock_path(key)
+        while True:
+            lock_file = open(lock_path, 'a')
+            try:
+                fcntl.flock(lock_file, mode)
+            except BaseException:
+                lock_file.close()
+                raise
+            if self._is_current(lock_file, lock_path):
+                break
+            lock_file.close()
+        try:
+            yield lock_file
+        finally:
+            # Đóng file cũng nhả flock
+            lock_file.close()
+
+    @contextmanager
+    def open(self, object_name):
+        """
+        Lấy đường dẫn local của object, download nếu chưa có trong cache
+
+        Entry được giữ (shared lock) trong suốt khối with nên không bị evict
+        khi đang đọc.
+
+        Args:
+            object_name: Tên object trên Minio
+
+        Yields:
+            str: Đường dẫn file local
+        """
+        stat = self.minio_client.stat_file(object_name)
+        if stat is None:
+            raise FileNotFoundError(f"Object not found on Minio: {object_name}")
+
+        if self.max_bytes <= 0 or stat.size > self.max_bytes:
+            # Object lớn hơn toàn bộ cache: download tạm, không cache
+            self._record('bypass')
+            self.last_fetch = {'cache': 'bypass', 'bytes': stat.size}
+            with self._download_uncached(object_name) as path:
+                yield path
+            return
+
+        key = self._entry_key(object_name, stat.etag)
+        entry_path = self._entry_path(key)
+        lock_path = self._lock_path(key)
+
+        while True:
+            # Shared lock: nhiều worker cùng đọc 1 entry, evictor không xóa được
+            with self._entry_lock(key, fcntl.LOCK_SH) as lock_file:
+                if os.path.exists(entry_path):
+                    self._hit(object_name, entry_path)
+                    yield entry_path
+                    return
+
+                # Exclusive lock khi cần download để các worker khác chờ thay vì
+                # download trùng
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if not self._is_current(lock_file, lock_path):
+                    continue
+                if os.path.exists(entry_path):
+                    # Worker khác vừa download xong
+                    self._hit(object_name, entry_path)
+                else:
+                    self._record('misses')
+                    logger.info(f"Input cache miss: {object_name}")
+                    self._evict(stat.size)
+                    try:
+                        self._download_entry(object_name, entry_path)
+                    except BaseException:
+                        # Không để lại lock file của entry không tồn tại
+                        os.remove(lock_path)
+                        raise
+                    self.last_fetch = {'cache': 'miss', 'bytes': stat.size}
+
+                # Hạ về shared lock để các worker khác cùng đọc được. flock
+                # không đổi lock nguyên tử: trong khoảng trống evictor có thể
+                # đã xóa entry, khi đó làm lại từ đầu
+                fcntl.flock(lock_file, fcntl.LOCK_SH)
+                if not self._is_current(lock_file, lock_path) or not os.path.exists(entry_path):
+                    logger.info(f"Input cache entry evicted before use, retrying: {object_name}")
+                    continue
+                yield entry_path
+                return
+
+    def _hit(self, object_name, entry_path):
+        os.utime(entry_path)
+        self._record('hits')
+        self.last_fetch = {'cache': 'hit', 'bytes': 0}
+        logger.info(f"Input cache hit: {object_name}")
+
+    def _download_entry(self, object_name, entry_path):
+        """Download vào file tạm rồi rename để không bao giờ thấy file dở dang"""
+        fd, temp_path = tempfile.mkstemp(suffix='.part', dir=self.cache_dir)
+        os.close(fd)
+        try:
+            if not self.minio_client.download_file(object_name, temp_path):
+                raise IOError(f"Failed to download {object_name}")
+            os.replace(temp_path, entry_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @contextmanager
+    def _download_uncached(self, object_name):
+        """Download vào file tạm ngoài danh sách entry, xóa khi dùng xong"""
+        temp_dir = os.path.join(self.cache_dir, self.UNCACHED_DIR)
+        os.makedirs(temp_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(suffix=self.ENTRY_SUFFIX, dir=temp_dir)
+        os.close(fd)
+        try:
+            if not self.minio_client.download_file(object_name, temp_path):
+                raise IOError(f"Failed to download {object_name}")
+            yield temp_path
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _entries(self):
+        """Danh sách (mtime, size, key) của các entry hiện có"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(self.ENTRY_SUFFIX):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name[:-len(self.ENTRY_SUFFIX)]))
+        return entries
+
+    def _evict(self, incoming_bytes):
+        """Xóa các entry cũ nhất cho tới khi đủ chỗ cho incoming_bytes"""
+        with self._global_lock():
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+
+            for _, size, key in entries:
+                if total + incoming_bytes <= self.max_bytes:
+                    break
+                if self._try_remove(key):
+                    total -= size
+                    self._record('evictions', locked=True)
+                    logger.info(f"Input cache evicted {key} ({size} bytes)")
+
+    def _try_remove(self, key):
+        """Xóa entry (kèm lock file) nếu không có worker nào đang dùng"""
+        try:
+            with self._entry_lock(key, fcntl.LOCK_EX | fcntl.LOCK_NB):
+                # Xóa lock file khi còn giữ lock: process đang chờ lock file cũ
+                # sẽ thấy file đã bị thay (_is_current) và mở lại
+                os.remove(self._lock_path(key))
+                try:
+                    os.remove(self._entry_path(key))
+                    return True
+                except FileNotFoundError:
+                    return False
+        except BlockingIOError:
+            return False
+
+    def _read_stats(self):
+        try:
+            with open(os.path.join(self.cache_dir, self.STATS_FILE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _record(self, counter, locked=False):
+        """Tăng bộ đếm thống kê (dùng chung giữa các process)"""
+        def update():
+            stats = self._read_stats()
+            stats[counter] = stats.get(counter, 0) + 1
+            stats_path = os.path.join(self.cache_dir, self.STATS_FILE)
+            with open(stats_path + '.tmp', 'w') as f:
+                json.dump(stats, f)
+            os.replace(stats_path + '.tmp', stats_path)
+
+        if locked:
+            update()
+        else:
+            with self._global_lock():
+                update()
+
+    def stats(self):
+        """
+        Thống kê cache
+
+        Returns:
+            dict: hits, misses, evictions, bypass, hit_rate, entries, bytes, max_bytes
+        """
+        with self._global_lock():
+            stats = self._read_stats()
+            entries = self._entries()
+
+        hits = stats.get('hits', 0)
+        misses = stats.get('misses', 0)
+        return {
+            'hits': hits,
+            'misses': misses,
+            'evictions': stats.get('evictions', 0),
+            'bypass': stats.get('bypass', 0),
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
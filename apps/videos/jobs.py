@@ -0,0 +1,685 @@
+"""
+Job queue (lưu trong DB) cho xử lý video chạy nền
+"""
+import time
+from datetime import timedelta
+from uuid import UUID
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, F
+from django.utils import timezone
+import logging
+
+from .models import VideoProfile, Segment, ProcessingJob
+from .utils import VideoProcessor
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_segment_job(video, segment_index, start_time, end_time, cut_mode=None, segment=None):
+    """
+    Tạo job cắt 1 segment
+
+    Args:
+        video: VideoProfile instance
+        segment_index: Index của segment
+        start_time: Thời gian bắt đầu (giây)
+        end_time: Thời gian kết thúc (giây)
+        cut_mode: Chế độ cắt, None = theo video
+        segment: Segment instance, None nếu segment chưa được lưu
+            (kết quả chỉ trả về qua job, không ghi vào DB)
+
+    Returns:
+        ProcessingJob: Job vừa tạo
+    """
+    return ProcessingJob.objects.create(
+        video=video,
+        kind='segment',
+        segment=segment,
+        segment_index=segment_index,
+        params={
+            'start_time': start_time,
+            'end_time': end_time,
+            'cut_mode': cut_mode or video.cut_mode,
+            'encoding_profile': video.get_encoding_profile_name(),
+        },
+    )
+
+
+def enqueue_segment_jobs(video, segments, cut_mode=None):
+    """
+    Tạo job cắt cho nhiều segments (1 job/segment, 1 query INSERT)
+
+    Các job được các worker nhận song song.
+
+    Args:
+        video: VideoProfile instance
+        segments: List Segment (đã có start/end time hợp lệ)
+        cut_mode: Chế độ cắt, None = theo video
+
+    Returns:
+        list: Các ProcessingJob vừa tạo, cùng thứ tự với segments
+    """
+    encoding_profile = video.get_encoding_profile_name()
+    return ProcessingJob.objects.bulk_create([
+        ProcessingJob(
+            video=video,
+            kind='segment',
+            segment=segment,
+            segment_index=segment.position,
+            params={
+                'start_time': segment.start_time,
+                'end_time': segment.end_time,
+                'cut_mode': cut_mode or video.cut_mode,
+                'encoding_profile': encoding_profile,
+            },
+        )
+        for segment in segments
+    ])
+
+
+def enqueue_all_segments_job(video, cut_mode=None, segment_ids=None):
+    """
+    Tạo job cắt tất cả segments có start/end time của video
+
+    Args:
+        video: VideoProfile instance
+        cut_mode: Chế độ cắt, None = theo video
+        segment_ids: Chỉ cắt các segment này, None = tất cả
+
+    Returns:
+        ProcessingJob: Job vừa tạo
+    """
+    params = {'cut_mode': cut_mode or video.cut_mode, 'encoding_profile': video.get_encoding_profile_name()}
+    if segment_ids is not None:
+        params['segment_ids'] = [str(pk) for pk in segment_ids]
+    return ProcessingJob.objects.create(
+        video=video,
+        kind='all_segments',
+        params=params,
+    )
+
+
+def enqueue_preview_job(video):
+    """
+    Tạo job tạo proxy/HLS preview cho input hiện tại của video
+
+    Args:
+        video: VideoProfile instance (đã có minio_input_link)
+
+    Returns:
+        ProcessingJob: Job vừa tạo
+    """
+    return ProcessingJob.objects.create(
+        video=video,
+        kind='preview',
+        params={'minio_input_link': video.minio_input_link},
+    )
+
+
+def enqueue_thumbnails_job(video):
+    """
+    Tạo job tạo sprite sheet thumbnail cho input hiện tại của video
+
+    Args:
+        video: VideoProfile instance (đã có minio_input_link)
+
+    Returns:
+        ProcessingJob: Job vừa tạo
+    """
+    return ProcessingJob.objects.create(
+        video=video,
+        kind='thumbnails',
+        params={'minio_input_link': video.minio_input_link},
+    )
+
+
+def _lock_node(node):
+    """
+    Khóa claim theo node trong transaction hiện tại (Postgres advisory lock),
+    để giới hạn concurrency của node đúng khi nhiều worker chạy cùng máy
+    """
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [f"video-worker:{node}"])
+
+
+def claim_next_job(worker_id, node=None, node_concurrency=None, lease_seconds=None):
+    """
+    Nhận job queued cũ nhất và giữ lease cho worker
+
+    Dùng SELECT ... FOR UPDATE SKIP LOCKED nên nhiều worker trên nhiều máy
+    có thể claim cùng lúc mà không nhận trùng job.
+
+    Args:
+        worker_id: ID của worker (node:pid)
+        node: Tên node, mặc định settings.VIDEO_WORKER_NODE
+        node_concurrency: Số job tối đa đang chạy trên node
+        lease_seconds: Thời hạn lease (giây)
+
+    Returns:
+        ProcessingJob: Job đã nhận, None nếu queue rỗng hoặc node đã đủ job
+    """
+    node = node or settings.VIDEO_WORKER_NODE
+    node_concurrency = node_concurrency or settings.VIDEO_WORKER_NODE_CONCURRENCY
+    lease_seconds = lease_seconds or settings.VIDEO_JOB_LEASE_SECONDS
+
+    with transaction.atomic():
+        _lock_node(node)
+
+        running_on_node = ProcessingJob.objects.filter(status='running', node=node).count()
+        if running_on_node >= node_concurrency:
+            return None
+
+        job = (
+            ProcessingJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='queued')
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+
+        now = timezone.now()
+        job.status = 'running'
+        job.node = node
+        job.worker_id = worker_id
+        job.attempts += 1
+        job.stage = None
+        job.progress = 0
+        job.started_at = now
+        job.heartbeat_at = now
+        job.lease_expires_at = now + timedelta(seconds=lease_seconds)
+        job.save(update_fields=[
+            'status', 'node', 'worker_id', 'attempts', 'stage', 'progress',
+            'started_at', 'heartbeat_at', 'lease_expires_at'
+        ])
+        return job
+
+
+def heartbeat_jobs(worker_id, job_ids, lease_seconds=None):
+    """
+    Gia hạn lease cho các job worker đang chạy
+
+    Returns:
+        int: Số job còn đang được worker giữ lease
+    """
+    if not job_ids:
+        return 0
+
+    lease_seconds = lease_seconds or settings.VIDEO_JOB_LEASE_SECONDS
+    now = timezone.now()
+    return ProcessingJob.objects.filter(
+        pk__in=job_ids,
+        worker_id=worker_id,
+        status='running'
+    ).update(
+        heartbeat_at=now,
+        lease_expires_at=now + timedelta(seconds=lease_seconds)
+    )
+
+
+def _release_jobs(queryset, error, max_attempts, now):
+    """
+    Trả lại queue các job running trong queryset, job đã chạy đủ max_attempts
+    lần thì đánh dấu failed (kèm các segment còn 'processing' của job)
+
+    Returns:
+        tuple: (số job được trả lại queue, số job bị failed)
+    """
+    with transaction.atomic():
+        # Bỏ qua job đang bị khóa: worker cũ vẫn đang ghi kết quả (run_job)
+        given_up = list(
+            queryset.filter(attempts__gte=max_attempts)
+            .select_for_update(skip_locked=True)
+            .only('id', 'kind', 'video_id', 'segment_id', 'params')
+        )
+        failed = ProcessingJob.objects.filter(pk__in=[job.pk for job in given_up]).update(
+            status='failed',
+            error=error,
+            finished_at=now,
+            worker_id=None,
+            lease_expires_at=None
+        )
+        for job in given_up:
+            _fail_processing_segments(job, now)
+    requeued = queryset.filter(attempts__lt=max_attempts).update(
+        status='queued',
+        worker_id=None,
+        node=None,
+        stage=None,
+        progress=0,
+        lease_expires_at=None
+    )
+    return requeued, failed
+
+
+def reclaim_expired_jobs(max_attempts=None):
+    """
+    Trả lại queue các job có lease hết hạn (worker/node bị crash)
+
+    Job đã chạy đủ max_attempts lần sẽ bị đánh dấu failed, các segment của
+    job còn ở trạng thái 'processing' cũng chuyển sang 'failed'.
+
+    Returns:
+        tuple: (số job được trả lại queue, số job bị failed)
+    """
+    max_attempts = max_attempts or settings.VIDEO_JOB_MAX_ATTEMPTS
+    now = timezone.now()
+    requeued, failed = _release_jobs(
+        ProcessingJob.objects.filter(status='running', lease_expires_at__lt=now),
+        'Lease expired (worker lost) after max attempts',
+        max_attempts,
+        now
+    )
+
+    if requeued or failed:
+        logger.warning(f"Reclaimed expired jobs: {requeued} requeued, {failed} failed")
+    return requeued, failed
+
+
+def release_worker_jobs(worker_id, job_ids, error, max_attempts=None):
+    """
+    Trả lại queue ngay các job worker đang giữ mà không chạy tiếp được
+    (vd: process pool bị hỏng do process con bị OOM kill), không chờ lease hết hạn
+
+    Returns:
+        tuple: (số job được trả lại queue, số job bị failed)
+    """
+    if not job_ids:
+        return 0, 0
+    max_attempts = max_attempts or settings.VIDEO_JOB_MAX_ATTEMPTS
+    requeued, failed = _release_jobs(
+        ProcessingJob.objects.filter(pk__in=job_ids, worker_id=worker_id, status='running'),
+        error,
+        max_attempts,
+        timezone.now()
+    )
+    logger.warning(f"Released jobs of {worker_id}: {requeued} requeued, {failed} failed ({error})")
+    return requeued, failed
+
+
+def _fail_processing_segments(job, now):
+    """Chuyển các segment của job còn 'processing' sang 'failed' và đánh dấu video failed"""
+    if job.kind == 'segment':
+        segments = Segment.objects.filter(pk=job.segment_id)
+    elif job.kind == 'all_segments':
+        segments = _all_segments_queryset(job)
+    else:
+        return
+    if segments.filter(status='processing').update(status='failed', processed_at=now, updated_at=now):
+        VideoProfile.objects.filter(pk=job.video_id).update(status='failed', updated_at=now)
+
+
+def finish_job(job_id, worker_id, status, result=None, error=None, metrics=None):
+    """
+    Ghi kết quả (và số liệu từng stage) của job nếu worker vẫn đang giữ lease
+
+    Returns:
+        bool: False nếu lease đã mất (job đã được worker khác nhận lại)
+    """
+    updated = ProcessingJob.objects.filter(
+        pk=job_id,
+        worker_id=worker_id,
+        status='running'
+    ).update(
+        status=status,
+        result=result or {},
+        metrics=metrics or {},
+        error=error,
+        progress=100 if status == 'done' else F('progress'),
+        finished_at=timezone.now(),
+        lease_expires_at=None
+    )
+    if not updated:
+        logger.warning(f"Job {job_id} lease lost, result of {worker_id} discarded")
+    return bool(updated)
+
+
+def fail_crashed_job(job_id, worker_id, error):
+    """
+    Đánh dấu failed job bị lỗi ngoài run_job (vd: process con raise trước khi
+    ghi được kết quả), kèm các segment của job còn ở trạng thái 'processing'
+
+    Returns:
+        bool: False nếu lease đã mất (job đã được worker khác nhận lại)
+    """
+    with transaction.atomic():
+        job = (
+            ProcessingJob.objects.select_for_update()
+            .filter(pk=job_id, worker_id=worker_id, status='running')
+            .only('id', 'kind', 'video_id', 'segment_id', 'params')
+            .first()
+        )
+        if job is None:
+            logger.warning(f"Job {job_id} lease lost, crash of {worker_id} ignored")
+            return False
+        _fail_processing_segments(job, timezone.now())
+        return finish_job(job_id, worker_id, 'failed', error=error)
+
+
+def _progress_reporter(job_id, worker_id, interval=None):
+    """
+    Tạo callback ghi tiến độ (stage, percent) của job vào DB
+
+    Chỉ ghi khi đổi stage hoặc sau mỗi `interval` giây để không query DB
+    theo từng frame.
+    """
+    interval = settings.VIDEO_JOB_PROGRESS_INTERVAL if interval is None else interval
+    last = {'stage': None, 'at': 0.0}
+
+    def report(stage, percent):
+        now = time.monotonic()
+        if stage == last['stage'] and percent < 100 and now - last['at'] < interval:
+            return
+        last['stage'] = stage
+        last['at'] = now
+        ProcessingJob.objects.filter(
+            pk=job_id,
+            worker_id=worker_id,
+            status='running'
+        ).update(stage=stage, progress=percent)
+
+    return report
+
+
+def run_job(job_id, worker_id):
+    """
+    Chạy 1 job (gọi trong process của worker pool)
+
+    Args:
+        job_id: UUID của job
+        worker_id: ID của worker đang giữ lease
+
+    Returns:
+        str: Trạng thái cuối cùng của job
+    """
+    job = ProcessingJob.objects.select_related('video').get(pk=job_id)
+    if job.status != 'running' or job.worker_id != worker_id:
+        logger.warning(f"Job {job.id} lease lost before start, {worker_id} skips it")
+        return 'lost'
+    result = None
+    error = None
+    started = time.perf_counter()
+
+    processor = VideoProcessor(
+        progress_callback=_progress_reporter(job.id, worker_id),
+        encoding_profile=job.params.get('encoding_profile')
+    )
+
+    handlers = JOB_HANDLERS.get(job.kind)
+    try:
+        if handlers is None:
+            raise ValueError(f"Unknown job kind: {job.kind}")
+        result = handlers[0](job, processor)
+        status = 'done'
+
+    except Exception as e:
+        logger.error(f"Job {job.id} failed: {e}")
+        status = 'failed'
+        error = str(e)
+
+    job_metrics = dict(processor.last_metrics, total_seconds=round(time.perf_counter() - started, 4))
+
+    with transaction.atomic():
+        # Khóa job và kiểm tra lease trước khi ghi kết quả vào segment/video:
+        # job đã bị reclaim_expired_jobs trả lại queue (worker khác sẽ chạy lại)
+        # thì bỏ toàn bộ kết quả. Khóa giữ tới hết transaction nên lease không
+        # thể bị thu hồi giữa lúc ghi kết quả và finish_job.
+        owned = (
+            ProcessingJob.objects.select_for_update()
+            .filter(pk=job.id, worker_id=worker_id, status='running')
+            .values_list('pk', flat=True)
+            .first()
+        )
+        if owned is None:
+            logger.warning(f"Job {job.id} lease lost, result of {worker_id} discarded")
+            return 'lost'
+
+        if handlers is not None:
+            try:
+                with transaction.atomic():
+                    handlers[1](job, processor, status, result)
+            except Exception as e:
+                logger.error(f"Job {job.id} failed to save result: {e}")
+                status = 'failed'
+                error = f"Failed to save result: {e}"
+                with transaction.atomic():
+                    handlers[1](job, processor, status, None)
+
+        finish_job(job.id, worker_id, status, result if status == 'done' else None, error, job_metrics)
+
+    metrics.observe('video_job_duration_seconds', job_metrics['total_seconds'], kind=job.kind)
+    metrics.inc('video_jobs_finished_total', kind=job.kind, status=status)
+    metrics.flush()
+    return status
+
+
+def _holds_lease(job):
+    """
+    Điều kiện (dùng trong filter) worker vẫn giữ lease của lần chạy này,
+    để các lệnh ghi trong lúc chạy không đụng tới segment khi job đã bị
+    reclaim và chạy lại ở worker khác
+    """
+    return Exists(ProcessingJob.objects.filter(
+        pk=job.pk, worker_id=job.worker_id, attempts=job.attempts, status='running'
+    ))
+
+
+def _update_video_status(video):
+    """Cập nhật bộ đếm segments, đánh dấu video completed khi tất cả segments đã có output"""
+    total, processed = VideoProfile.refresh_segment_counters(video.pk)
+    if processed == total:
+        VideoProfile.objects.filter(pk=video.pk).update(status='completed', updated_at=timezone.now())
+
+
+def _run_segment_job(job, processor):
+    """Cắt 1 segment (kết quả được ghi vào segment bởi _save_segment_job)"""
+    params = job.params
+
+    # Segment có thể đã bị xóa trong lúc chờ, lúc đó chỉ trả kết quả qua job
+    Segment.objects.filter(_holds_lease(job), pk=job.segment_id).update(
+        status='processing', processing_started_at=timezone.now()
+    )
+
+    result = processor.process_segment(
+        job.video.minio_input_link,
+        params['start_time'],
+        params['end_time'],
+        job.segment_index,
+        cut_mode=params.get('cut_mode')
+    )
+    if not result:
+        raise RuntimeError('Failed to process video segment')
+    return result
+
+
+def _save_segment_job(job, processor, status, result):
+    """Ghi kết quả job cắt 1 segment vào segment và video (worker đang giữ lease)"""
+    video = job.video
+    segment = Segment.objects.filter(pk=job.segment_id)
+
+    if status != 'done':
+        segment.update(status='failed', processed_at=timezone.now())
+        VideoProfile.objects.filter(pk=video.pk).update(status='failed', updated_at=timezone.now())
+        return
+
+    # Chỉ ghi các field kết quả, và chỉ khi start/end của segment chưa bị sửa
+    # (form/bulk) trong lúc cắt: output cắt theo thời gian cũ thì không ghi đè
+    now = timezone.now()
+    updated = segment.filter(start_time=job.params['start_time'], end_time=job.params['end_time']).update(
+        minio_output_link=result['output_link'],
+        cut_mode=result['cut_mode'],
+        status='completed',
+        processed_at=now,
+        updated_at=now,
+        metrics=processor.last_metrics,
+        version=F('version') + 1
+    )
+    if not updated and segment.exists():
+        # Output không còn khớp segment: trả segment về pending để cắt lại
+        segment.filter(status='processing').update(status='pending', updated_at=now)
+        result['stale'] = True
+        logger.info(f"Job {job.id}: segment {job.segment_id} time range changed, output not saved")
+    # Version mới để form đang mở không bị conflict khi lưu lại
+    result['segment_version'] = segment.values_list('version', flat=True).first()
+
+    # Update status
+    _update_video_status(video)
+
+
+def _all_segments_queryset(job):
+    """Các segment có start/end time mà job all_segments cắt"""
+    queryset = Segment.objects.filter(video_id=job.video_id).with_time_range()
+    if job.params.get('segment_ids') is not None:
+        queryset = queryset.filter(pk__in=job.params['segment_ids'])
+    return queryset
+
+
+def _run_all_segments_job(job, processor):
+    """Cắt tất cả segments có start/end time của video trong 1 lần"""
+    segments = {segment.position: segment for segment in _all_segments_queryset(job).defer('prompt', 'result')}
+    if not segments:
+        raise ValueError('No segments with valid start/end time')
+
+    started_at = timezone.now()
+    Segment.objects.filter(_holds_lease(job), pk__in=[s.pk for s in segments.values()]).update(
+        status='processing', processing_started_at=started_at
+    )
+
+    results = processor.process_all_segments(
+        job.video.minio_input_link,
+        [(position, segment.start_time, segment.end_time) for position, segment in segments.items()],
+        cut_mode=job.params.get('cut_mode')
+    )
+    for result in results:
+        segment = segments[result['segment_index']]
+        result['segment_id'] = str(segment.pk)
+        # Thời gian đã cắt, để _save_all_segments_job bỏ output nếu segment bị sửa
+        result['start_time'] = segment.start_time
+        result['end_time'] = segment.end_time
+    return {'success': all(result['success'] for result in results), 'results': results}
+
+
+def _save_all_segments_job(job, processor, status, result):
+    """Ghi kết quả job cắt nhiều segments vào segments và video (worker đang giữ lease)"""
+    video = job.video
+    now = timezone.now()
+    if status != 'done':
+        _fail_processing_segments(job, now)
+        return
+
+    results = result['results']
+    segments = {
+        str(segment.pk): segment
+        # Khóa các segment đến hết transaction để start/end không đổi giữa lúc
+        # so sánh và lúc ghi
+        for segment in Segment.objects.select_for_update().filter(pk__in=[r['segment_id'] for r in results])
+        .only('id', 'start_time', 'end_time')
+    }
+
+    # Update segments: chỉ ghi các field kết quả, không đè lên thay đổi
+    # khác của segment trong lúc xử lý
+    succeeded = []
+    failed_ids = []
+    stale_ids = []
+    for item in results:
+        segment = segments.get(item['segment_id'])
+        if segment is None:
+            # Segment đã bị xóa trong lúc xử lý
+            continue
+        if (segment.start_time, segment.end_time) != (item.get('start_time'), item.get('end_time')):
+            # Start/end bị sửa trong lúc cắt: output không còn khớp, cắt lại sau
+            item['stale'] = True
+            stale_ids.append(segment.pk)
+        elif item['success']:
+            segment.minio_output_link = item['output_link']
+            segment.cut_mode = item['cut_mode']
+            segment.status = 'completed'
+            segment.processed_at = now
+            segment.updated_at = now
+            segment.version = F('version') + 1
+            succeeded.append(segment)
+        else:
+            failed_ids.append(segment.pk)
+    if succeeded:
+        Segment.objects.bulk_update(
+            succeeded, ['minio_output_link', 'cut_mode', 'status', 'processed_at', 'updated_at', 'version']
+        )
+    if failed_ids:
+        Segment.objects.filter(pk__in=failed_ids).update(status='failed', processed_at=now, updated_at=now)
+    if stale_ids:
+        Segment.objects.filter(pk__in=stale_ids, status='processing').update(status='pending', updated_at=now)
+
+    VideoProfile.refresh_segment_counters(video.pk)
+
+    # Update status once, at the end
+    VideoProfile.objects.filter(pk=video.pk).update(
+        status='completed' if result['success'] else 'failed',
+        updated_at=now
+    )
+
+    versions = dict(Segment.objects.filter(pk__in=segments.keys()).values_list('pk', 'version'))
+    for item in results:
+        item['segment_version'] = versions.get(UUID(item['segment_id']))
+
+
+def _run_preview_job(job, processor):
+    """Tạo proxy/HLS preview (link được ghi bởi _save_preview_job)"""
+    minio_input_link = job.params['minio_input_link']
+    result = processor.generate_preview(minio_input_link, duration=job.video.duration)
+    if not result:
+        raise RuntimeError('Failed to generate preview')
+    return result
+
+
+def _save_preview_job(job, processor, status, result):
+    """Ghi link proxy/HLS preview vào video profile"""
+    if status != 'done':
+        return
+    # Input có thể đã bị đổi trong lúc tạo preview, lúc đó bỏ kết quả.
+    # Không tăng version: preview không phải field của form
+    VideoProfile.objects.filter(pk=job.video_id, minio_input_link=job.params['minio_input_link']).update(
+        preview_proxy_link=result['proxy_link'],
+        preview_hls_link=result['hls_link'],
+        preview_generated_at=timezone.now()
+    )
+
+
+def _run_thumbnails_job(job, processor):
+    """Tạo sprite sheet thumbnail (link/index được ghi bởi _save_thumbnails_job)"""
+    minio_input_link = job.params['minio_input_link']
+    video = job.video
+    result = processor.generate_thumbnails(
+        minio_input_link, duration=video.duration, width=video.width, height=video.height
+    )
+    if not result:
+        raise RuntimeError('Failed to generate thumbnails')
+    return result
+
+
+def _save_thumbnails_job(job, processor, status, result):
+    """Ghi link/index sprite sheet thumbnail vào video profile"""
+    if status != 'done':
+        return
+    # Như preview: bỏ kết quả nếu input đã đổi, không tăng version
+    VideoProfile.objects.filter(pk=job.video_id, minio_input_link=job.params['minio_input_link']).update(
+        thumbnails_vtt_link=result['vtt_link'],
+        thumbnails_index_link=result['index_link'],
+        thumbnails_info=result['info'],
+        thumbnails_generated_at=timezone.now()
+    )
+
+
+# kind -> (chạy job, ghi kết quả vào segment/video). Hàm chạy không ghi trạng
+# thái cuối của segment/video; hàm ghi được gọi cả khi job lỗi (result = None)
+# và chỉ khi worker còn giữ lease.
+JOB_HANDLERS = {
+    'segment': (_run_segment_job, _save_segment_job),
+    'all_segments': (_run_all_segments_job, _save_all_segments_job),
+    'preview': (_run_preview_job, _save_preview_job),
+    'thumbnails': (_run_thumbnails_job, _save_thumbnails_job),
+}
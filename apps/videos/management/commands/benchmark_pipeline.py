@@ -0,0 +1,391 @@
+"""
+Benchmark pipeline cắt video: tạo video tổng hợp bằng ffmpeg (lavfi), chạy
+upload/download/probe/cut/process_segment trên Minio hoặc filesystem backend
+và xuất kết quả (thời gian từng stage, segments/phút, MB/s, CPU, peak RSS) dạng JSON
+"""
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from moviepy.config import get_setting
+
+from apps.videos.encoding import get_encoding_profiles
+from apps.videos.input_cache import InputVideoCache
+from apps.videos.utils import MinioClient, VideoProcessor
+
+
+# Encoder ffmpeg cho từng codec có thể tạo video tổng hợp
+CODEC_ENCODERS = {
+    'h264': ['-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p'],
+    'hevc': ['-c:v', 'libx265', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', '-tag:v', 'hvc1'],
+    'mpeg4': ['-c:v', 'mpeg4', '-q:v', '5'],
+    'vp9': ['-c:v', 'libvpx-vp9', '-deadline', 'realtime', '-cpu-used', '8'],
+}
+
+OBJECT_PREFIX = 'benchmark'
+
+
+def _csv(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+class _Usage:
+    """Đo thời gian và CPU (process + các ffmpeg con) của 1 khối code"""
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.self_usage = resource.getrusage(resource.RUSAGE_SELF)
+        self.child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+        self_usage = resource.getrusage(resource.RUSAGE_SELF)
+        child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self.cpu_seconds = (
+            (self_usage.ru_utime - self.self_usage.ru_utime)
+            + (self_usage.ru_stime - self.self_usage.ru_stime)
+            + (child_usage.ru_utime - self.child_usage.ru_utime)
+            + (child_usage.ru_stime - self.child_usage.ru_stime)
+        )
+        return False
+
+    def report(self, size=None, segments=None):
+        result = {
+            'seconds': round(self.elapsed, 4),
+            'cpu_seconds': round(self.cpu_seconds, 4),
+            # 100% = 1 core bận suốt thời gian đo
+            'cpu_percent': round(self.cpu_seconds / self.elapsed * 100, 1) if self.elapsed else None,
+        }
+        if size is not None:
+            result['bytes'] = size
+            result['mb_per_second'] = round(size / 1024 ** 2 / self.elapsed, 2) if self.elapsed else None
+        if segments is not None:
+            result['segments'] = segments
+            result['segments_per_minute'] = round(segments / self.elapsed * 60, 2) if self.elapsed else None
+        return result
+
+
+def _peak_rss_mb():
+    """Peak RSS (MB) của process và của process con lớn nhất (ffmpeg) tính tới hiện tại"""
+    # Linux: ru_maxrss tính bằng KB
+    return {
+        'self': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'children': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+class _StageTimer:
+    """Progress callback ghi thời điểm bắt đầu từng stage của process_segment"""
+
+    def __init__(self):
+        self.starts = []
+
+    def __call__(self, stage, percent):
+        if not self.starts or self.starts[-1][0] != stage:
+            self.starts.append((stage, time.perf_counter()))
+
+    def reset(self):
+        self.starts = []
+
+    def durations(self, finished):
+        """Tổng thời gian (giây) của từng stage"""
+        result = {}
+        for index, (stage, started) in enumerate(self.starts):
+            ended = self.starts[index + 1][1] if index + 1 < len(self.starts) else finished
+            result[stage] = result.get(stage, 0.0) + ended - started
+        return result
+
+
+class Command(BaseCommand):
+    help = 'Benchmark cắt video/transfer trên video tổng hợp, xuất kết quả JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backend',
+            choices=['filesystem', 'minio'],
+            default='filesystem',
+            help='filesystem = thư mục tạm; minio = Minio/S3 đang cấu hình (vd: Minio local trong docker)'
+        )
+        parser.add_argument('--resolutions', default='640x360,1280x720', help='Danh sách WxH')
+        parser.add_argument('--durations', default='30', help='Độ dài video (giây)')
+        parser.add_argument('--codecs', default='h264', help=f"Codec: {', '.join(CODEC_ENCODERS)}")
+        parser.add_argument('--fps', type=int, default=30)
+        parser.add_argument(
+            '--modes',
+            default=','.join(VideoProcessor.CUT_MODES),
+            help='Chế độ cắt cần so sánh'
+        )
+        parser.add_argument(
+            '--encoding-profile',
+            help='Encoding profile khi re-encode (mặc định settings.VIDEO_ENCODING_PROFILE)'
+        )
+        parser.add_argument('--segments', type=int, default=3, help='Số segment cắt mỗi kịch bản')
+        parser.add_argument('--segment-length', type=float, default=5, help='Độ dài mỗi segment (giây)')
+        parser.add_argument(
+            '--streaming',
+            action='store_true',
+            help='Đo thêm process_segment ở chế độ streaming (không file tạm)'
+        )
+        parser.add_argument('--output', help='Ghi JSON ra file thay vì stdout')
+        parser.add_argument(
+            '--baseline',
+            help='File JSON của lần chạy trước, so sánh segments/phút và MB/s'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=10,
+            help='Báo regression khi chậm hơn baseline quá N%% (mặc định 10)'
+        )
+        parser.add_argument('--keep', action='store_true', help='Giữ lại thư mục làm việc')
+
+    def handle(self, *args, **options):
+        ffmpeg = get_setting('FFMPEG_BINARY')
+        modes = _csv(options['modes'])
+        invalid = [mode for mode in modes if mode not in VideoProcessor.CUT_MODES]
+        if invalid:
+            raise CommandError(f"Invalid cut mode: {', '.join(invalid)}")
+        self.encoding_profile = options['encoding_profile'] or settings.VIDEO_ENCODING_PROFILE
+        if self.encoding_profile not in get_encoding_profiles():
+            raise CommandError(f"Invalid encoding profile: {self.encoding_profile}")
+        codecs = _csv(options['codecs'])
+        invalid = [codec for codec in codecs if codec not in CODEC_ENCODERS]
+        if invalid:
+            raise CommandError(f"Unsupported codec: {', '.join(invalid)}")
+
+        work_dir = tempfile.mkdtemp(prefix='video_benchmark_')
+        overrides = {
+            'TEMP_VIDEO_DIR': os.path.join(work_dir, 'tmp'),
+            'VIDEO_INPUT_CACHE_DIR': os.path.join(work_dir, 'input_cache'),
+        }
+        if options['backend'] == 'filesystem':
+            overrides.update(
+                MINIO_BACKEND='filesystem',
+                MINIO_FILESYSTEM_ROOT=os.path.join(work_dir, 'object_store'),
+            )
+
+        # MinioClient là singleton: tạo lại theo backend của benchmark, khôi phục khi xong
+        previous_client = MinioClient._instance
+        MinioClient._instance = None
+        try:
+            with override_settings(**overrides):
+                report = {
+                    'environment': self._environment(ffmpeg, options),
+                    'scenarios': [],
+                }
+                for codec in codecs:
+                    for resolution in _csv(options['resolutions']):
+                        for duration in _csv(options['durations']):
+                            report['scenarios'].append(self._run_scenario(
+                                ffmpeg, work_dir, codec, resolution, float(duration), modes, options
+                            ))
+                report['peak_rss_mb'] = _peak_rss_mb()
+        finally:
+            MinioClient._instance = previous_client
+            if not options['keep']:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        regressions = []
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                regressions = self._compare(json.load(f), report, options['threshold'])
+            report['regressions'] = regressions
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stderr.write(f"Wrote {options['output']}")
+        else:
+            self.stdout.write(output)
+
+        if regressions:
+            raise CommandError(f"{len(regressions)} regression(s) vs baseline")
+
+    def _environment(self, ffmpeg, options):
+        version = subprocess.run([ffmpeg, '-version'], capture_output=True, text=True).stdout.split('\n')[0]
+        return {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'ffmpeg': version,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'backend': options['backend'],
+            'encoding_profile': self.encoding_profile,
+            'minio_part_size': settings.MINIO_PART_SIZE,
+            'minio_transfer_threads': settings.MINIO_TRANSFER_THREADS,
+            'segment_length': options['segment_length'],
+            'segments': options['segments'],
+        }
+
+    def _generate(self, ffmpeg, path, codec, resolution, duration, fps):
+        """Tạo video tổng hợp (testsrc2 + sine) với keyframe mỗi 2 giây"""
+        subprocess.run(
+            [
+                ffmpeg, '-y', '-v', 'error',
+                '-f', 'lavfi', '-i', f"testsrc2=size={resolution}:rate={fps}:duration={duration}",
+                '-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate=48000:duration={duration}",
+                *CODEC_ENCODERS[codec],
+                '-g', str(fps * 2),
+                '-c:a', 'aac', '-b:a', '128k',
+                '-movflags', '+faststart',
+                '-shortest', path,
+            ],
+            check=True,
+            capture_output=True,
+        )
+
+    def _cuts(self, duration, count, length):
+        """Các đoạn cắt rải đều trên video, lệch khỏi keyframe để smart cut phải encode đầu/cuối"""
+        length = min(length, duration / max(count, 1))
+        step = (duration - length) / max(count - 1, 1) if count > 1 else 0
+        return [
+            (round(index * step + 0.37, 3), round(min(index * step + 0.37 + length, duration), 3))
+            for index in range(count)
+        ]
+
+    def _run_scenario(self, ffmpeg, work_dir, codec, resolution, duration, modes, options):
+        name = f"{codec}_{resolution}_{duration:g}s"
+        scenario = {'name': name, 'codec': codec, 'resolution': resolution, 'duration': duration}
+        self.stderr.write(f"Scenario {name}")
+
+        source = os.path.join(work_dir, f"{name}.mp4")
+        try:
+            with _Usage() as usage:
+                self._generate(ffmpeg, source, codec, resolution, duration, options['fps'])
+        except subprocess.CalledProcessError as e:
+            scenario['error'] = f"Cannot generate video: {e.stderr.decode(errors='replace').strip()}"
+            return scenario
+        size = os.path.getsize(source)
+        scenario['file_size'] = size
+        scenario['generate'] = usage.report()
+
+        minio_client = MinioClient()
+        object_name = f"{OBJECT_PREFIX}/{name}.mp4"
+        stages = {}
+
+        with _Usage() as usage:
+            uploaded = minio_client.upload_file(source, object_name)
+        stages['upload'] = usage.report(size=size) if uploaded else {'error': 'Upload failed'}
+
+        download_path = os.path.join(work_dir, f"{name}.download.mp4")
+        with _Usage() as usage:
+            downloaded = minio_client.download_file(object_name, download_path)
+        stages['download'] = usage.report(size=size) if downloaded else {'error': 'Download failed'}
+        if downloaded:
+            os.remove(download_path)
+
+        processor = VideoProcessor(encoding_profile=self.encoding_profile)
+        with _Usage() as usage:
+            info = processor.probe_video(object_name)
+        stages['probe'] = usage.report() if info else {'error': 'Probe failed'}
+        scenario['stages'] = stages
+
+        cuts = self._cuts(duration, options['segments'], options['segment_length'])
+        scenario['cut_video'] = {}
+        scenario['process_segment'] = {}
+        for mode in modes:
+            scenario['cut_video'][mode] = self._bench_cut(processor, source, work_dir, cuts, mode)
+            scenario['process_segment'][mode] = self._bench_process(object_name, cuts, mode, streaming=False)
+            if options['streaming'] and mode != VideoProcessor.CUT_MODE_SMART:
+                scenario['process_segment'][f"{mode}_streaming"] = self._bench_process(
+                    object_name, cuts, mode, streaming=True
+                )
+
+        minio_client.delete_file(object_name)
+        os.remove(source)
+        return scenario
+
+    def _bench_cut(self, processor, source, work_dir, cuts, mode):
+        """cut_video trên file local (chỉ encode, không transfer)"""
+        output = os.path.join(work_dir, 'cut.mp4')
+        errors = []
+        applied = {}
+        done = 0
+        with _Usage() as usage:
+            for start_time, end_time in cuts:
+                try:
+                    applied_mode = processor.cut_video(source, output, start_time, end_time, mode)
+                    if applied_mode:
+                        done += 1
+                        applied[applied_mode] = applied.get(applied_mode, 0) + 1
+                    else:
+                        errors.append(f"{start_time}-{end_time}: cut failed")
+                except Exception as e:
+                    errors.append(f"{start_time}-{end_time}: {e}")
+        if os.path.exists(output):
+            os.remove(output)
+        result = usage.report(segments=done)
+        # Chế độ thực tế (vd: copy/smart fallback về reencode khi thiếu ffprobe/codec không hỗ trợ)
+        result['applied_modes'] = applied
+        if errors:
+            result['errors'] = errors
+        return result
+
+    def _bench_process(self, object_name, cuts, mode, streaming):
+        """process_segment end-to-end, input cache trống (segment đầu tải input từ object store)"""
+        timer = _StageTimer()
+        processor = VideoProcessor(progress_callback=timer, encoding_profile=self.encoding_profile)
+        shutil.rmtree(settings.VIDEO_INPUT_CACHE_DIR, ignore_errors=True)
+        processor.input_cache = InputVideoCache(processor.minio_client)
+
+        stage_totals = {}
+        errors = []
+        applied = {}
+        done = 0
+        with _Usage() as usage:
+            for index, (start_time, end_time) in enumerate(cuts):
+                timer.reset()
+                result = processor.process_segment(
+                    object_name, start_time, end_time, index, cut_mode=mode, streaming=streaming
+                )
+                for stage, seconds in timer.durations(time.perf_counter()).items():
+                    stage_totals[stage] = stage_totals.get(stage, 0.0) + seconds
+                if result:
+                    done += 1
+                    applied[result['cut_mode']] = applied.get(result['cut_mode'], 0) + 1
+                    processor.minio_client.delete_file(result['output_link'])
+                else:
+                    errors.append(f"{start_time}-{end_time}: process_segment failed")
+        report = usage.report(segments=done)
+        report['stages'] = {stage: round(seconds, 4) for stage, seconds in stage_totals.items()}
+        report['applied_modes'] = applied
+        if errors:
+            report['errors'] = errors
+        return report
+
+    def _compare(self, baseline, report, threshold):
+        """Danh sách metric chậm hơn baseline quá threshold %"""
+        def metrics(data):
+            values = {}
+            for scenario in data.get('scenarios', []):
+                for group in ('cut_video', 'process_segment'):
+                    for mode, result in scenario.get(group, {}).items():
+                        if result.get('segments_per_minute'):
+                            values[f"{scenario['name']}.{group}.{mode}.segments_per_minute"] = \
+                                result['segments_per_minute']
+                for stage, result in scenario.get('stages', {}).items():
+                    if result.get('mb_per_second'):
+                        values[f"{scenario['name']}.{stage}.mb_per_second"] = result['mb_per_second']
+            return values
+
+        current = metrics(report)
+        regressions = []
+        for key, before in metrics(baseline).items():
+            after = current.get(key)
+            if after is None:
+                continue
+            change = (after - before) / before * 100
+            if change < -threshold:
+                regressions.append({'metric': key, 'baseline': before, 'current': after, 'change_percent': round(change, 1)})
+        return regressions
@@ -0,0 +1,85 @@
+"""
+Generate prompt hàng loạt cho segments của nhiều video profile
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.videos.bulk import generate_segment_prompts, PROMPT_BATCH_VIDEOS
+from apps.videos.models import VideoProfile, PromptTemplate
+
+
+class Command(BaseCommand):
+    help = 'Generate prompt cho tất cả segments của các video (theo template riêng của video hoặc 1 template chung)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'video_ids',
+            nargs='*',
+            help='UUID các video, bỏ trống = chọn theo --category/--uses-template hoặc tất cả'
+        )
+        parser.add_argument(
+            '--template',
+            help='UUID template dùng chung cho mọi video (mặc định: template riêng của từng video)'
+        )
+        parser.add_argument(
+            '--category',
+            help='Chỉ các video có prompt template thuộc category này'
+        )
+        parser.add_argument(
+            '--uses-template',
+            help='Chỉ các video đang dùng template này (vd: sau khi sửa template)'
+        )
+        parser.add_argument(
+            '--status',
+            help='Chỉ các video có status này'
+        )
+        parser.add_argument(
+            '--only-empty',
+            action='store_true',
+            help='Chỉ điền segment chưa có prompt'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Chỉ đếm số segment sẽ thay đổi, không ghi DB'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=PROMPT_BATCH_VIDEOS,
+            help='Số video mỗi lượt'
+        )
+
+    def handle(self, *args, **options):
+        template = None
+        if options['template']:
+            template = PromptTemplate.objects.filter(pk=options['template']).first()
+            if template is None:
+                raise CommandError(f"Prompt template {options['template']} not found")
+
+        videos = VideoProfile.objects.all()
+        if options['video_ids']:
+            videos = videos.filter(pk__in=options['video_ids'])
+        if options['category']:
+            videos = videos.filter(prompt_template__category=options['category'])
+        if options['uses_template']:
+            videos = videos.filter(prompt_template_id=options['uses_template'])
+        if options['status']:
+            videos = videos.filter(status=options['status'])
+
+        def progress(done, total, updated):
+            self.stdout.write(f"{done}/{total} videos, {updated} segments updated")
+
+        result = generate_segment_prompts(
+            videos,
+            template=template,
+            only_empty=options['only_empty'],
+            dry_run=options['dry_run'],
+            batch_size=max(1, options['batch_size']),
+            progress=progress
+        )
+
+        prefix = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{result['videos']} videos, {result['segments']} segments, "
+            f"{result['updated']} updated, {result['skipped_videos']} videos without template"
+        ))
@@ -0,0 +1,71 @@
+"""
+Chuyển segments dạng JSON cũ (VideoProfile.legacy_segments) sang bảng Segment
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.videos.models import VideoProfile, Segment
+
+
+class Command(BaseCommand):
+    help = 'Chuyển segments JSON cũ của các video profile sang bảng Segment'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Xóa JSON cũ sau khi chuyển xong'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Chỉ thống kê, không ghi DB'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Số segment mỗi lần bulk_create'
+        )
+
+    def handle(self, *args, **options):
+        videos = (
+            VideoProfile.objects
+            .exclude(legacy_segments=[])
+            .only('id', 'title', 'legacy_segments')
+        )
+        migrated_videos = 0
+        migrated_segments = 0
+
+        for video in videos.iterator(chunk_size=100):
+            items = video.legacy_segments
+            if not isinstance(items, list) or not items:
+                continue
+
+            # Video đã có Segment (đã chuyển trước đó) thì bỏ qua để không tạo trùng
+            if video.segments.exists():
+                self.stdout.write(f"Skipping {video.id}: already has segments")
+                continue
+
+            segments = []
+            for position, item in enumerate(items):
+                values = Segment.clean_values(item if isinstance(item, dict) else {})
+                if values.get('minio_output_link'):
+                    values['status'] = 'completed'
+                segments.append(Segment(video=video, position=position, **values))
+
+            if not options['dry_run']:
+                with transaction.atomic():
+                    Segment.objects.bulk_create(segments, batch_size=options['batch_size'])
+                    VideoProfile.refresh_segment_counters(video.pk)
+                    if options['clear']:
+                        VideoProfile.objects.filter(pk=video.pk).update(legacy_segments=[])
+
+            migrated_videos += 1
+            migrated_segments += len(segments)
+            self.stdout.write(f"{video.id} ({video.title}): {len(segments)} segments")
+
+        prefix = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Migrated {migrated_segments} segments from {migrated_videos} video profiles"
+        ))
@@ -0,0 +1,35 @@
+"""
+Đếm lại bộ đếm segments (total_segments/processed_segments) của video profile
+"""
+from django.core.management.base import BaseCommand
+
+from apps.videos.models import VideoProfile
+
+
+class Command(BaseCommand):
+    help = 'Đếm lại total_segments/processed_segments từ bảng Segment'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'video_ids',
+            nargs='*',
+            help='UUID các video cần đếm lại, bỏ trống = tất cả'
+        )
+
+    def handle(self, *args, **options):
+        videos = VideoProfile.objects.only('id', 'total_segments', 'processed_segments')
+        if options['video_ids']:
+            videos = videos.filter(pk__in=options['video_ids'])
+
+        checked = 0
+        fixed = 0
+        for video in videos.iterator(chunk_size=500):
+            total, processed = VideoProfile.refresh_segment_counters(video.pk)
+            checked += 1
+            if (total, processed) != (video.total_segments, video.processed_segments):
+                fixed += 1
+                self.stdout.write(
+                    f"{video.id}: {video.processed_segments}/{video.total_segments} -> {processed}/{total}"
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} video profiles, fixed {fixed}"))
@@ -0,0 +1,161 @@
+"""
+Worker chạy các processing job (cắt video) trong process pool
+
+Có thể chạy nhiều worker trên nhiều máy cùng dùng chung Postgres/Minio:
+job được claim bằng lease (SELECT ... FOR UPDATE SKIP LOCKED) và gia hạn
+bằng heartbeat, job của worker bị crash sẽ được trả lại queue khi lease hết hạn.
+Process con bị kill (vd: OOM) làm hỏng pool: các job đang chạy được trả lại
+queue ngay và pool được tạo lại.
+
+Process con (spawn) import lại module này trước khi chạy _init_worker nên
+apps.videos.jobs (import models) chỉ được import bên trong hàm.
+"""
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def _init_worker():
+    """Khởi tạo Django trong process con (spawn)"""
+    django.setup()
+
+
+def _run_job(job_id, worker_id):
+    # Dùng lại connection của process con giữa các job (CONN_MAX_AGE/CONN_HEALTH_CHECKS),
+    # chỉ đóng connection đã hết hạn hoặc bị lỗi
+    from django.db import close_old_connections
+    from apps.videos.jobs import run_job
+    close_old_connections()
+    try:
+        return run_job(job_id, worker_id)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Chạy worker xử lý các processing job trong queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.VIDEO_WORKER_CONCURRENCY,
+            help='Số job chạy song song (số process trong pool)'
+        )
+        parser.add_argument(
+            '--node',
+            default=settings.VIDEO_WORKER_NODE,
+            help='Tên node, dùng để giới hạn số job chạy đồng thời trên 1 máy'
+        )
+        parser.add_argument(
+            '--node-concurrency',
+            type=int,
+            default=settings.VIDEO_WORKER_NODE_CONCURRENCY,
+            help='Số job tối đa chạy đồng thời trên node (tính cả các worker khác cùng node)'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.VIDEO_WORKER_POLL_INTERVAL,
+            help='Thời gian chờ (giây) khi queue rỗng'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Thoát khi queue rỗng và tất cả job đã xong'
+        )
+
+    def handle(self, *args, **options):
+        from apps.videos.jobs import (
+            claim_next_job, heartbeat_jobs, reclaim_expired_jobs, fail_crashed_job, release_worker_jobs
+        )
+
+        concurrency = max(1, options['concurrency'])
+        node = options['node']
+        node_concurrency = options['node_concurrency']
+        poll_interval = options['poll_interval']
+        heartbeat_interval = settings.VIDEO_JOB_HEARTBEAT_INTERVAL
+        worker_id = f"{node}:{os.getpid()}"
+
+        self.stdout.write(
+            f"Starting video worker {worker_id} "
+            f"(concurrency={concurrency}, node_concurrency={node_concurrency})"
+        )
+
+        context = multiprocessing.get_context('spawn')
+        running = {}
+        claimed = None
+        last_heartbeat = 0
+
+        def new_executor():
+            return ProcessPoolExecutor(
+                max_workers=concurrency,
+                mp_context=context,
+                initializer=_init_worker
+            )
+
+        executor = new_executor()
+        try:
+            while True:
+                # Gia hạn lease và thu hồi job của worker đã chết
+                if time.monotonic() - last_heartbeat >= heartbeat_interval:
+                    heartbeat_jobs(worker_id, list(running.values()))
+                    reclaim_expired_jobs()
+                    last_heartbeat = time.monotonic()
+
+                try:
+                    # Nhận job mới khi còn slot trống
+                    if len(running) < concurrency:
+                        job = claim_next_job(worker_id, node, node_concurrency)
+                        if job:
+                            self.stdout.write(f"Running job {job.id} ({job.kind}, attempt {job.attempts})")
+                            # submit cũng raise BrokenProcessPool nếu pool đã hỏng
+                            claimed = job.id
+                            running[executor.submit(_run_job, job.id, worker_id)] = job.id
+                            claimed = None
+                            continue
+
+                    if not running:
+                        if options['once']:
+                            break
+                        time.sleep(min(poll_interval, heartbeat_interval))
+                        continue
+
+                    done, _ = wait(
+                        running,
+                        timeout=min(poll_interval, heartbeat_interval),
+                        return_when=FIRST_COMPLETED
+                    )
+                    for future in done:
+                        if isinstance(future.exception(), BrokenProcessPool):
+                            raise future.exception()
+                        job_id = running.pop(future)
+                        try:
+                            status = future.result()
+                            self.stdout.write(f"Job {job_id} finished: {status}")
+                        except Exception as e:
+                            self.stderr.write(f"Job {job_id} crashed: {e}")
+                            fail_crashed_job(job_id, worker_id, f"Worker crashed: {e}")
+
+                except BrokenProcessPool as e:
+                    # 1 process con bị kill (vd: OOM) làm hỏng cả pool: mọi job đang chạy
+                    # đều mất kết quả, không biết job nào gây lỗi nên trả lại queue tất cả
+                    # (job chạy đủ VIDEO_JOB_MAX_ATTEMPTS lần sẽ failed) rồi tạo pool mới
+                    job_ids = list(running.values()) + ([claimed] if claimed else [])
+                    self.stderr.write(f"Process pool broken ({e}), requeueing {len(job_ids)} job(s)")
+                    release_worker_jobs(worker_id, job_ids, f"Worker process died: {e or 'process pool broken'}")
+                    running.clear()
+                    claimed = None
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = new_executor()
+
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping video worker...")
+        finally:
+            executor.shutdown()
@@ -0,0 +1,220 @@
+"""
+Metrics dạng Prometheus (text format) cho pipeline xử lý video
+
+Web và worker chạy ở nhiều process (và container) khác nhau nên mỗi process
+ghi số liệu của mình ra 1 file JSON trong settings.METRICS_DIR (thư mục dùng
+chung, vd: volume /tmp/video_processing), endpoint /metrics cộng dồn các file
+khi được scrape. Giá trị là tích lũy từ lúc process khởi động, file của
+process đã dừng vẫn được giữ lại để counter không bị giảm.
+"""
+import atexit
+import json
+import math
+import os
+import socket
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+STAGE_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+FPS_BUCKETS = (5, 10, 25, 50, 100, 200, 400, 800, 1600)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'video_stage_duration_seconds': (
+        'histogram', 'Duration of a pipeline stage (download, encode, upload) per segment or batch', STAGE_BUCKETS
+    ),
+    'video_stage_bytes_total': ('counter', 'Bytes moved by pipeline stage', None),
+    'video_encode_fps': ('histogram', 'Encoder throughput in output frames per second', FPS_BUCKETS),
+    'video_jobs_finished_total': ('counter', 'Processing jobs finished, by kind and status', None),
+    'video_job_duration_seconds': ('histogram', 'Wall time of a processing job', STAGE_BUCKETS),
+    'minio_request_duration_seconds': (
+        'histogram', 'Latency of Minio client calls (time to response headers for streamed reads)', REQUEST_BUCKETS
+    ),
+    'minio_request_errors_total': ('counter', 'Failed Minio client calls', None),
+    'minio_presigned_cache_requests_total': ('counter', 'Presigned URL cache lookups, by result', None),
+}
+
+
+class _Registry:
+    """Số liệu của process hiện tại, ghi ra file theo chu kỳ"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.dirty = False
+        self.last_flush = 0.0
+
+    def reset(self):
+        """Xóa số liệu (process con sau fork không được tính lại số liệu của process cha)"""
+        self.lock = threading.Lock()
+        self.values = {}
+        self.dirty = False
+        self.last_flush = 0.0
+
+    def _key(self, name, labels):
+        return json.dumps([name, sorted(labels.items())], separators=(',', ':'))
+
+    def observe(self, name, value, labels):
+        buckets = METRICS[name][2]
+        key = self._key(name, labels)
+        with self.lock:
+            # [count từng bucket..., +Inf, sum]
+            data = self.values.setdefault(key, [0] * (len(buckets) + 1) + [0.0])
+            index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+            data[index] += 1
+            data[-1] += value
+            self.dirty = True
+        self.flush()
+
+    def inc(self, name, amount, labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+            self.dirty = True
+        self.flush()
+
+    def _path(self):
+        return os.path.join(settings.METRICS_DIR, f"{socket.gethostname()}_{os.getpid()}.json")
+
+    def flush(self, force=False):
+        """Ghi số liệu ra file (tối đa 1 lần mỗi METRICS_FLUSH_INTERVAL giây trừ khi force)"""
+        if not settings.METRICS_DIR:
+            return
+        with self.lock:
+            if not self.dirty or (not force and time.monotonic() - self.last_flush < settings.METRICS_FLUSH_INTERVAL):
+                return
+            payload = json.dumps(self.values)
+            self.dirty = False
+            self.last_flush = time.monotonic()
+        try:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=settings.METRICS_DIR, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                f.write(payload)
+            os.replace(temp_path, self._path())
+        except OSError as e:
+            logger.warning(f"Cannot write metrics: {e}")
+
+    def collect(self):
+        """Cộng dồn số liệu của mọi process (các file trong METRICS_DIR + process hiện tại)"""
+        self.flush(force=True)
+        totals = {}
+        sources = []
+        if settings.METRICS_DIR and os.path.isdir(settings.METRICS_DIR):
+            for name in os.listdir(settings.METRICS_DIR):
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(settings.METRICS_DIR, name)) as f:
+                        sources.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        else:
+            with self.lock:
+                sources.append(dict(self.values))
+
+        for values in sources:
+            for key, value in values.items():
+                if isinstance(value, list):
+                    current = totals.get(key)
+                    totals[key] = value[:] if current is None else [a + b for a, b in zip(current, value)]
+                else:
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+
+_registry = _Registry()
+atexit.register(_registry.flush, force=True)
+os.register_at_fork(after_in_child=_registry.reset)
+
+
+def observe(name, value, **labels):
+    """Ghi 1 giá trị vào histogram"""
+    if value is None or math.isnan(value):
+        return
+    _registry.observe(name, float(value), labels)
+
+
+def inc(name, amount=1, **labels):
+    """Tăng counter"""
+    if amount:
+        _registry.inc(name, amount, labels)
+
+
+def flush():
+    """Ghi ngay số liệu của process ra file (vd: khi job kết thúc)"""
+    _registry.flush(force=True)
+
+
+@contextmanager
+def timed(name, **labels):
+    """Đo thời gian khối code và ghi vào histogram `name`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value) if math.isfinite(value) else ('+Inf' if value > 0 else '-Inf')
+    return str(value)
+
+
+def render(gauges=None):
+    """
+    Xuất toàn bộ metrics theo Prometheus text format 0.0.4
+
+    Args:
+        gauges: List (name, help, [(labels dict, value), ...]) tính tại thời điểm scrape
+
+    Returns:
+        str: Nội dung cho endpoint /metrics
+    """
+    totals = {}
+    for key, value in _registry.collect().items():
+        name, labels = json.loads(key)
+        totals.setdefault(name, []).append(([tuple(item) for item in labels], value))
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(totals.get(name, [])):
+            if kind == 'histogram':
+                cumulative = 0
+                for bound, count in zip(list(buckets) + [math.inf], value[:-1]):
+                    cumulative += count
+                    le = '+Inf' if bound == math.inf else _format_value(float(bound))
+                    lines.append(f"{name}_bucket{_format_labels(labels + [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value[-1])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+            else:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    for name, help_text, samples in gauges or []:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+
+    return '\n'.join(lines) + '\n'
@@ -2,10 +2,17 @@
 Models for Video Profile Management System
 """
 import uuid
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import ExpressionWrapper, F, FloatField, Value
+from django.db.models.functions import Coalesce, NullIf
 from django.contrib.auth.models import User
+from django.utils import timezone
+from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
 
+from .prompts import find_unknown_placeholders
+
 
 class PromptTemplate(models.Model):
     """Model cho Prompt Template"""
@@ -44,7 +51,7 @@ class PromptTemplate(models.Model):
     
     template_content = models.TextField(
         verbose_name='Nội dung Template',
-        help_text='Template sử dụng để generate prompt. Dùng {youtube_link} làm placeholder'
+        help_text='Template sử dụng để generate prompt. Dùng {youtube_link}, {start_time}, ... làm placeholder'
     )
     
     description = models.TextField(
@@ -75,11 +82,37 @@ class PromptTemplate(models.Model):
         verbose_name_plural = 'Prompt Templates'
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['category', '-created_at']),
+            models.Index(fields=['-created_at', '-id'], name='prompttemplate_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id']),
         ]
     
     def __str__(self):
         return f"{self.name} ({self.get_category_display()})"
+    
+    def clean(self):
+        """Kiểm tra placeholder trong template_content"""
+        unknown = find_unknown_placeholders(self.template_content)
+        if unknown:
+            raise ValidationError({
+                'template_content': 'Placeholder không được hỗ trợ: '
+                + ', '.join('{' + name + '}' for name in unknown)
+            })
+
+
+def video_progress_expression():
+    """
+    Tiến độ processed_segments/total_segments (video chưa có segment = -1)
+
+    Dùng chung cho sort trên danh sách video và index của sort đó: Postgres
+    chỉ dùng expression index khi biểu thức trong query giống hệt.
+    """
+    return Coalesce(
+        ExpressionWrapper(
+            F('processed_segments') * 1.0 / NullIf(F('total_segments'), 0),
+            output_field=FloatField()
+        ),
+        Value(-1.0)
+    )
 
 
 class VideoProfile(models.Model):
@@ -92,6 +125,12 @@ class VideoProfile(models.Model):
         ('failed', 'Failed'),
     ]
     
+    CUT_MODE_CHOICES = [
+        ('reencode', 'Re-encode (MoviePy)'),
+        ('copy', 'Stream copy (không encode lại)'),
+        ('smart', 'Smart cut (chỉ encode lại GOP đầu/cuối)'),
+    ]
+    
     id = models.UUIDField(
         primary_key=True,
         default=uuid.uuid4,
@@ -140,10 +179,30 @@ class VideoProfile(models.Model):
         verbose_name='Prompt Template'
     )
     
-    segments = models.JSONField(
+    # Segments dạng JSON cũ, giữ lại để chuyển dữ liệu sang bảng Segment
+    # (python manage.py migrate_segments_json)
+    legacy_segments = models.JSONField(
         default=list,
-        verbose_name='Danh sách segments',
-        help_text='Mảng các object chứa: prompt, result, minio_output_link, start_time, end_time'
+        blank=True,
+        db_column='segments',
+        verbose_name='Segments (JSON cũ)',
+        help_text='Mảng các object chứa: prompt, result, minio_output_link, start_time, end_time, cut_mode'
+    )
+    
+    cut_mode = models.CharField(
+        max_length=20,
+        choices=CUT_MODE_CHOICES,
+        default='reencode',
+        verbose_name='Chế độ cắt',
+        help_text='Chế độ cắt mặc định cho các segment của video này'
+    )
+    
+    encoding_profile = models.CharField(
+        max_length=50,
+        blank=True,
+        null=True,
+        verbose_name='Encoding profile',
+        help_text='Preset encode khi cắt có re-encode (để trống = theo category của prompt template / mặc định)'
     )
     
     status = models.CharField(
@@ -154,6 +213,133 @@ class VideoProfile(models.Model):
         db_index=True
     )
     
+    version = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Phiên bản',
+        help_text='Tăng mỗi lần sửa từ form, dùng để phát hiện sửa đồng thời'
+    )
+    
+    # Bộ đếm segments, cập nhật mỗi khi segments thay đổi (refresh_segment_counters)
+    total_segments = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Tổng số segments'
+    )
+    
+    processed_segments = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Số segments đã xử lý'
+    )
+    
+    # Metadata của video input (đọc từ header moov, không download cả file)
+    duration = models.FloatField(
+        null=True,
+        blank=True,
+        verbose_name='Độ dài (giây)'
+    )
+    
+    width = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Chiều rộng'
+    )
+    
+    height = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Chiều cao'
+    )
+    
+    fps = models.FloatField(
+        null=True,
+        blank=True,
+        verbose_name='FPS'
+    )
+    
+    video_codec = models.CharField(
+        max_length=50,
+        null=True,
+        blank=True,
+        verbose_name='Video codec'
+    )
+    
+    audio_codec = models.CharField(
+        max_length=50,
+        null=True,
+        blank=True,
+        verbose_name='Audio codec'
+    )
+    
+    bitrate = models.BigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Bitrate (bps)'
+    )
+    
+    file_size = models.BigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Dung lượng (byte)'
+    )
+    
+    probed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Thời điểm đọc metadata'
+    )
+    
+    # Preview cho editor (job 'preview'), input gốc vẫn dùng để cắt
+    preview_proxy_link = models.CharField(
+        max_length=500,
+        blank=True,
+        null=True,
+        verbose_name='Link Minio proxy preview',
+        help_text='MP4 độ phân giải thấp để xem/tua trong editor'
+    )
+    
+    preview_hls_link = models.CharField(
+        max_length=500,
+        blank=True,
+        null=True,
+        verbose_name='Link Minio HLS preview',
+        help_text='Playlist HLS (index.m3u8) của proxy'
+    )
+    
+    preview_generated_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Thời điểm tạo preview'
+    )
+    
+    # Sprite sheet thumbnail cho timeline của editor (job 'thumbnails')
+    thumbnails_vtt_link = models.CharField(
+        max_length=500,
+        blank=True,
+        null=True,
+        verbose_name='Link Minio WebVTT thumbnail',
+        help_text='Index WebVTT (sprite_XXX.jpg#xywh=...) của sprite sheet'
+    )
+    
+    thumbnails_index_link = models.CharField(
+        max_length=500,
+        blank=True,
+        null=True,
+        verbose_name='Link Minio JSON thumbnail',
+        help_text='Index JSON của sprite sheet'
+    )
+    
+    thumbnails_info = models.JSONField(
+        blank=True,
+        null=True,
+        verbose_name='Thông tin sprite sheet',
+        help_text='interval, kích thước thumbnail, số cột/hàng, số thumbnail và object của từng sprite'
+    )
+    
+    thumbnails_generated_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Thời điểm tạo thumbnail'
+    )
+    
     notes = models.TextField(
         blank=True,
         null=True,
@@ -175,27 +361,645 @@ class VideoProfile(models.Model):
         verbose_name = 'Video Profile'
         verbose_name_plural = 'Video Profiles'
         ordering = ['-created_at']
+        # Index theo đúng ordering của danh sách video (keyset pagination, views.video_list):
+        # (created_at, id) khi không filter / filter status / filter user, và các sort
+        # tiến độ, số segments (cột phụ cùng chiều với cột sort để 1 index dùng cho cả 2 chiều)
         indexes = [
-            models.Index(fields=['status', '-created_at']),
-            models.Index(fields=['assigned_user', '-created_at']),
+            models.Index(fields=['-created_at', '-id'], name='videoprofile_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id']),
+            models.Index(fields=['assigned_user', '-created_at', '-id']),
+            models.Index(fields=['status', 'processed_segments', 'total_segments']),
+            models.Index(
+                fields=['-total_segments', '-created_at', '-id'], name='videoprofile_segments_idx'
+            ),
+            models.Index(
+                video_progress_expression().desc(), F('created_at').desc(), F('id').desc(),
+                name='videoprofile_progress_idx'
+            ),
         ]
     
     def __str__(self):
         return f"{self.title} ({self.get_status_display()})"
     
+    @classmethod
+    def refresh_segment_counters(cls, video_id):
+        """
+        Đếm lại total_segments/processed_segments từ bảng Segment (1 query
+        aggregate + 1 update), gọi sau mỗi thao tác thêm/sửa/xóa segments
+        
+        Args:
+            video_id: UUID của video profile
+        
+        Returns:
+            tuple: (total_segments, processed_segments)
+        """
+        counts = Segment.objects.filter(video_id=video_id).aggregate(
+            total=models.Count('id'),
+            processed=models.Count(
+                'id',
+                filter=~models.Q(minio_output_link__isnull=True) & ~models.Q(minio_output_link='')
+            )
+        )
+        cls.objects.filter(pk=video_id).update(
+            total_segments=counts['total'],
+            processed_segments=counts['processed']
+        )
+        return counts['total'], counts['processed']
+    
     def get_total_segments(self):
         """Lấy tổng số segments"""
-        return len(self.segments) if self.segments else 0
+        return self.total_segments
     
     def get_processed_segments(self):
         """Lấy số segments đã xử lý (có output link)"""
-        if not self.segments:
-            return 0
-        return sum(1 for seg in self.segments if seg.get('minio_output_link'))
+        return self.processed_segments
     
     def get_progress_percentage(self):
         """Tính phần trăm hoàn thành"""
         total = self.get_total_segments()
         if total == 0:
             return 0
-        return int((self.get_processed_segments() / total) * 100)
\ No newline at end of file
+        return int((self.get_processed_segments() / total) * 100)
+    
+    # Các field sửa từ form video_edit
+    FORM_FIELDS = [
+        'title', 'youtube_link', 'minio_input_link', 'notes',
+        'assigned_user_id', 'prompt_template_id', 'cut_mode', 'encoding_profile'
+    ]
+    
+    def get_encoding_profile_name(self):
+        """
+        Encoding profile áp dụng khi cắt video: theo video, theo category của
+        prompt template (settings.VIDEO_ENCODING_PROFILE_BY_CATEGORY), hoặc mặc định
+        
+        Returns:
+            str: Tên profile
+        """
+        if self.encoding_profile:
+            return self.encoding_profile
+        by_category = settings.VIDEO_ENCODING_PROFILE_BY_CATEGORY
+        if by_category and self.prompt_template_id:
+            category = PromptTemplate.objects.filter(pk=self.prompt_template_id).values_list(
+                'category', flat=True
+            ).first()
+            if category in by_category:
+                return by_category[category]
+        return settings.VIDEO_ENCODING_PROFILE
+    
+    def lock(self):
+        """
+        Khóa dòng video profile (SELECT ... FOR UPDATE) trong transaction hiện tại
+        
+        Dùng cho các thao tác thay đổi cấu trúc danh sách segments (thêm/xóa/
+        sắp xếp) để vị trí không bị trùng. Worker chỉ ghi vào dòng Segment nên
+        không bị chặn bởi lock này.
+        """
+        VideoProfile.objects.select_for_update().filter(pk=self.pk).values_list('pk', flat=True).first()
+    
+    def sync_segments(self, items):
+        """
+        Đồng bộ danh sách segments gửi từ form (theo thứ tự hiển thị)
+        
+        Segment có `id` được cập nhật nếu có thay đổi, segment không có `id`
+        được tạo mới, segment không còn trong danh sách bị xóa. Chỉ các dòng
+        và các field thay đổi mới được ghi xuống DB.
+        
+        Segment gửi kèm `version` chỉ được cập nhật nếu version trong DB vẫn
+        khớp (optimistic locking); nếu segment đã bị sửa ở nơi khác (vd: worker
+        vừa ghi output) thì bỏ qua và trả về trong `conflicts`.
+        
+        Args:
+            items: List dict (prompt, result, start_time, end_time, minio_output_link, cut_mode, id, version)
+        
+        Returns:
+            dict: Số segment created/updated/deleted và danh sách vị trí bị conflict
+        """
+        now = timezone.now()
+        to_create = []
+        moved = []
+        updated = 0
+        conflicts = []
+        keep = set()
+        
+        with transaction.atomic():
+            self.lock()
+            existing = {str(segment.id): segment for segment in self.segments.all()}
+            
+            for position, item in enumerate(items):
+                values = Segment.clean_values(item)
+                segment_id = str(item.get('id') or '')
+                
+                if not segment_id:
+                    if values.get('minio_output_link'):
+                        values['status'] = 'completed'
+                    to_create.append(Segment(video=self, position=position, **values))
+                    continue
+                
+                segment = existing.get(segment_id)
+                if segment is None:
+                    # Đã bị xóa ở nơi khác, không tạo lại
+                    conflicts.append(position)
+                    continue
+                keep.add(segment_id)
+                
+                if segment.position != position:
+                    segment.position = position
+                    moved.append(segment)
+                
+                changes = {
+                    field: value for field, value in values.items()
+                    if getattr(segment, field) != value
+                }
+                if not changes:
+                    continue
+                
+                expected_version = item.get('version')
+                if expected_version is not None and int(expected_version) != segment.version:
+                    conflicts.append(position)
+                    continue
+                
+                if 'minio_output_link' in changes:
+                    changes['status'] = 'completed' if changes['minio_output_link'] else 'pending'
+                # Chỉ ghi các field thay đổi, điều kiện version để không đè lên
+                # kết quả worker vừa ghi
+                if Segment.objects.filter(pk=segment.pk, version=segment.version).update(
+                    version=models.F('version') + 1,
+                    updated_at=now,
+                    **changes
+                ):
+                    updated += 1
+                else:
+                    conflicts.append(position)
+            
+            deleted = [pk for pk in existing if pk not in keep]
+            if deleted:
+                Segment.objects.filter(pk__in=deleted).delete()
+            if moved:
+                # Worker không ghi position nên đổi vị trí không cần kiểm tra version
+                Segment.objects.bulk_update(moved, ['position'])
+            if to_create:
+                Segment.objects.bulk_create(to_create)
+            if to_create or updated or deleted:
+                self.total_segments, self.processed_segments = self.refresh_segment_counters(self.pk)
+        
+        return {
+            'created': len(to_create),
+            'updated': updated,
+            'moved': len(moved),
+            'deleted': len(deleted),
+            'conflicts': conflicts,
+        }
+    
+    METADATA_FIELDS = [
+        'duration', 'width', 'height', 'fps', 'video_codec', 'audio_codec', 'bitrate', 'file_size'
+    ]
+    
+    def set_metadata(self, info, probed_at=None):
+        """
+        Gán metadata video input (kết quả của VideoProcessor.probe_video)
+        
+        Args:
+            info: dict metadata, None để xóa metadata cũ (hoặc khi probe lỗi)
+            probed_at: Thời điểm probe; probe lỗi vẫn ghi thời điểm (metadata
+                rỗng) để không probe lại mỗi lần mở trang. None = chưa probe
+        
+        Returns:
+            list: Các field đã thay đổi (dùng cho save(update_fields=...))
+        """
+        info = info or {}
+        for field in self.METADATA_FIELDS:
+            setattr(self, field, info.get(field))
+        self.probed_at = probed_at
+        return self.METADATA_FIELDS + ['probed_at']
+    
+    @property
+    def probe_failed(self):
+        """Đã probe input nhưng không đọc được metadata"""
+        return self.probed_at is not None and self.duration is None
+    
+    PREVIEW_FIELDS = ['preview_proxy_link', 'preview_hls_link', 'preview_generated_at']
+    
+    def clear_preview(self):
+        """
+        Xóa thông tin preview (khi input thay đổi)
+        
+        Returns:
+            list: Các field đã thay đổi (dùng cho save(update_fields=...))
+        """
+        for field in self.PREVIEW_FIELDS:
+            setattr(self, field, None)
+        return self.PREVIEW_FIELDS
+    
+    THUMBNAIL_FIELDS = ['thumbnails_vtt_link', 'thumbnails_index_link', 'thumbnails_info', 'thumbnails_generated_at']
+    
+    def clear_thumbnails(self):
+        """
+        Xóa thông tin sprite sheet thumbnail (khi input thay đổi)
+        
+        Returns:
+            list: Các field đã thay đổi (dùng cho save(update_fields=...))
+        """
+        for field in self.THUMBNAIL_FIELDS:
+            setattr(self, field, None)
+        return self.THUMBNAIL_FIELDS
+    
+    def get_resolution_display(self):
+        """Độ phân giải dạng WxH"""
+        if self.width and self.height:
+            return f"{self.width}x{self.height}"
+        return ''
+
+
+class SegmentQuerySet(models.QuerySet):
+    """QuerySet cho Segment"""
+    
+    def processed(self):
+        """Các segment đã có output trên Minio"""
+        return self.exclude(minio_output_link__isnull=True).exclude(minio_output_link='')
+    
+    def with_time_range(self):
+        """Các segment có start/end time hợp lệ để cắt"""
+        return self.filter(
+            start_time__isnull=False,
+            end_time__isnull=False,
+            start_time__lt=models.F('end_time')
+        )
+
+
+class Segment(models.Model):
+    """Model cho 1 segment (đoạn cắt) của Video Profile"""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    # Field có thể sửa từ form/API, cũng là các key trong JSON cũ
+    EDITABLE_FIELDS = ['prompt', 'result', 'start_time', 'end_time', 'minio_output_link', 'cut_mode']
+    
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False,
+        verbose_name='UUID'
+    )
+    
+    video = models.ForeignKey(
+        VideoProfile,
+        on_delete=models.CASCADE,
+        related_name='segments',
+        verbose_name='Video Profile'
+    )
+    
+    position = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Thứ tự',
+        help_text='Vị trí của segment trong video (bắt đầu từ 0)'
+    )
+    
+    prompt = models.TextField(
+        blank=True,
+        default='',
+        verbose_name='Prompt'
+    )
+    
+    result = models.TextField(
+        blank=True,
+        default='',
+        verbose_name='Kết quả'
+    )
+    
+    start_time = models.FloatField(
+        null=True,
+        blank=True,
+        verbose_name='Bắt đầu (giây)'
+    )
+    
+    end_time = models.FloatField(
+        null=True,
+        blank=True,
+        verbose_name='Kết thúc (giây)'
+    )
+    
+    minio_output_link = models.CharField(
+        max_length=500,
+        null=True,
+        blank=True,
+        verbose_name='Link Minio Output'
+    )
+    
+    cut_mode = models.CharField(
+        max_length=20,
+        choices=VideoProfile.CUT_MODE_CHOICES,
+        null=True,
+        blank=True,
+        verbose_name='Chế độ cắt',
+        help_text='Chế độ cắt đã áp dụng cho output'
+    )
+    
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name='Trạng thái'
+    )
+    
+    version = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Phiên bản',
+        help_text='Tăng mỗi lần nội dung/kết quả segment thay đổi (optimistic locking)'
+    )
+    
+    metrics = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Số liệu xử lý',
+        help_text='Thời gian, bytes, fps từng giai đoạn (download/encode/upload) của lần cắt gần nhất'
+    )
+    
+    processing_started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Bắt đầu xử lý lúc'
+    )
+    
+    processed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Xử lý xong lúc'
+    )
+    
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Ngày tạo'
+    )
+    
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Ngày cập nhật'
+    )
+    
+    objects = SegmentQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = 'Segment'
+        verbose_name_plural = 'Segments'
+        ordering = ['video', 'position']
+        indexes = [
+            models.Index(fields=['video', 'position']),
+            models.Index(fields=['video', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"Segment {self.position + 1} - {self.video_id}"
+    
+    @classmethod
+    def clean_values(cls, item):
+        """
+        Chuẩn hóa dữ liệu segment từ form/API/JSON cũ
+        
+        Args:
+            item: dict chứa một số key trong EDITABLE_FIELDS
+        
+        Returns:
+            dict: Giá trị đã chuẩn hóa, chỉ gồm các key có trong item
+        """
+        values = {}
+        for field in cls.EDITABLE_FIELDS:
+            if field not in item:
+                continue
+            value = item[field]
+            if field in ('start_time', 'end_time'):
+                value = float(value) if value not in (None, '') else None
+            elif field in ('prompt', 'result'):
+                value = value or ''
+            else:
+                value = value or None
+            values[field] = value
+        return values
+    
+    def get_processing_time(self):
+        """Thời gian xử lý (giây), None nếu chưa xử lý xong"""
+        if not self.processing_started_at or not self.processed_at:
+            return None
+        return (self.processed_at - self.processing_started_at).total_seconds()
+    
+    def to_dict(self):
+        """Serialize segment cho template/API (cùng key với JSON cũ)"""
+        return {
+            'id': str(self.id),
+            'position': self.position,
+            'prompt': self.prompt,
+            'result': self.result,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'minio_output_link': self.minio_output_link,
+            'cut_mode': self.cut_mode,
+            'status': self.status,
+            'version': self.version,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None,
+            'processing_time': self.get_processing_time(),
+            'metrics': self.metrics,
+        }
+
+
+class ProcessingJob(models.Model):
+    """Model cho job xử lý video chạy nền (worker)"""
+    
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    KIND_CHOICES = [
+        ('segment', 'Cắt 1 segment'),
+        ('all_segments', 'Cắt tất cả segments'),
+        ('preview', 'Tạo proxy/HLS preview'),
+        ('thumbnails', 'Tạo sprite sheet thumbnail'),
+    ]
+    
+    STAGE_CHOICES = [
+        ('download', 'Download'),
+        ('encode', 'Encode'),
+        ('upload', 'Upload'),
+    ]
+    
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False,
+        verbose_name='UUID'
+    )
+    
+    video = models.ForeignKey(
+        VideoProfile,
+        on_delete=models.CASCADE,
+        related_name='jobs',
+        verbose_name='Video Profile'
+    )
+    
+    kind = models.CharField(
+        max_length=30,
+        choices=KIND_CHOICES,
+        default='segment',
+        verbose_name='Loại job'
+    )
+    
+    segment = models.ForeignKey(
+        Segment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='jobs',
+        verbose_name='Segment'
+    )
+    
+    segment_index = models.IntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Index segment'
+    )
+    
+    params = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Tham số',
+        help_text='Tham số xử lý: start_time, end_time, cut_mode, encoding_profile'
+    )
+    
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='queued',
+        verbose_name='Trạng thái',
+        db_index=True
+    )
+    
+    stage = models.CharField(
+        max_length=20,
+        choices=STAGE_CHOICES,
+        blank=True,
+        null=True,
+        verbose_name='Giai đoạn'
+    )
+    
+    progress = models.FloatField(
+        default=0,
+        verbose_name='Tiến độ (%)',
+        help_text='Tiến độ của giai đoạn hiện tại'
+    )
+    
+    result = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Kết quả'
+    )
+    
+    metrics = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Số liệu xử lý',
+        help_text='Thời gian, bytes, fps từng giai đoạn (download/encode/upload)'
+    )
+    
+    error = models.TextField(
+        blank=True,
+        null=True,
+        verbose_name='Lỗi'
+    )
+    
+    node = models.CharField(
+        max_length=200,
+        blank=True,
+        null=True,
+        verbose_name='Node',
+        help_text='Máy đang chạy job'
+    )
+    
+    worker_id = models.CharField(
+        max_length=200,
+        blank=True,
+        null=True,
+        verbose_name='Worker',
+        help_text='Worker đang giữ lease của job (node:pid)'
+    )
+    
+    lease_expires_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Lease hết hạn lúc'
+    )
+    
+    heartbeat_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Heartbeat gần nhất'
+    )
+    
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Số lần chạy'
+    )
+    
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Ngày tạo'
+    )
+    
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Bắt đầu lúc'
+    )
+    
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Kết thúc lúc'
+    )
+    
+    class Meta:
+        verbose_name = 'Processing Job'
+        verbose_name_plural = 'Processing Jobs'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['status', 'lease_expires_at']),
+            models.Index(fields=['status', 'node']),
+            models.Index(fields=['video', '-created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} - {self.video_id} ({self.get_status_display()})"
+    
+    def get_duration(self):
+        """Thời gian chạy (giây), None nếu chưa bắt đầu/kết thúc"""
+        if not self.started_at or not self.finished_at:
+            return None
+        return (self.finished_at - self.started_at).total_seconds()
+    
+    def to_dict(self):
+        """Serialize trạng thái job cho API"""
+        return {
+            'id': str(self.id),
+            'video_id': str(self.video_id),
+            'kind': self.kind,
+            'segment_id': str(self.segment_id) if self.segment_id else None,
+            'segment_index': self.segment_index,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': self.progress,
+            'result': self.result,
+            'metrics': self.metrics,
+            'error': self.error,
+            'node': self.node,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration': self.get_duration(),
+        }
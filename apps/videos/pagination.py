@@ -0,0 +1,151 @@
+"""
+Keyset (cursor) pagination cho các màn hình danh sách
+"""
+import base64
+import json
+from django.conf import settings
+from django.db.models import F, Q
+
+
+class KeysetPage:
+    """1 trang kết quả của keyset pagination"""
+
+    def __init__(self, items, next_cursor, previous_cursor, page_size):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.page_size = page_size
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def get_page_size(request):
+    """
+    Lấy page size từ query string (?page_size=), giới hạn bởi settings
+
+    Args:
+        request: HttpRequest
+
+    Returns:
+        int: Page size
+    """
+    try:
+        page_size = int(request.GET.get('page_size') or settings.LIST_PAGE_SIZE)
+    except ValueError:
+        page_size = settings.LIST_PAGE_SIZE
+    return max(1, min(page_size, settings.LIST_MAX_PAGE_SIZE))
+
+
+def _encode_cursor(values, direction):
+    payload = json.dumps({'v': values, 'd': direction}, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    """Giải mã cursor, trả về (values, direction) hoặc (None, None) nếu cursor sai"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload['d'] not in ('next', 'prev') or not isinstance(payload['v'], list):
+            raise ValueError
+        return payload['v'], payload['d']
+    except (ValueError, KeyError, TypeError):
+        return None, None
+
+
+def _keyset_filter(ordering, values, reverse):
+    """
+    Điều kiện "sau cursor" theo thứ tự từ điển của các cột ordering
+
+    (a, b) sau (x, y) <=> a > x OR (a = x AND b > y), với chiều so sánh
+    theo từng cột (asc/desc) và đảo ngược khi đi về trang trước.
+
+    Kèm điều kiện thừa a >= x trên cột đầu: Postgres không dùng được dạng OR
+    làm điểm bắt đầu của index scan (sẽ đọc index từ đầu rồi lọc, trang càng
+    sâu càng chậm), còn a >= x thì được.
+    """
+    condition = Q()
+    equal = Q()
+    for (field, descending), value in zip(ordering, values):
+        lookup = 'lt' if descending != reverse else 'gt'
+        condition |= equal & Q(**{f"{field}__{lookup}": value})
+        equal &= Q(**{field: value})
+
+    (field, descending), value = ordering[0], values[0]
+    if value is not None:
+        condition &= Q(**{f"{field}__{'lte' if descending != reverse else 'gte'}": value})
+    return condition
+
+
+def keyset_paginate(queryset, ordering, cursor=None, page_size=None, converters=None):
+    """
+    Phân trang theo keyset: WHERE (cột ordering) sau cursor ORDER BY ... LIMIT n
+
+    Không dùng OFFSET/COUNT: khi có index khớp (filter +) ordering (đọc xuôi
+    hoặc ngược, tức các cột cùng chiều hoặc đúng chiều của index) thì mỗi
+    trang chỉ đọc page_size + 1 dòng của index, không phụ thuộc vị trí trang.
+    Cột cuối của ordering phải unique (vd: id) để thứ tự ổn định.
+
+    Args:
+        queryset: QuerySet đã filter
+        ordering: List (field, descending), vd: [('created_at', True), ('id', True)]
+        cursor: Cursor từ trang trước (None = trang đầu)
+        page_size: Số dòng mỗi trang, mặc định settings.LIST_PAGE_SIZE
+        converters: dict field -> hàm chuyển giá trị trong cursor về kiểu của cột
+
+    Returns:
+        KeysetPage: Các dòng của trang và cursor trang trước/sau
+    """
+    page_size = page_size or settings.LIST_PAGE_SIZE
+    converters = converters or {}
+    fields = [field for field, _ in ordering]
+
+    values, direction = _decode_cursor(cursor) if cursor else (None, None)
+    if values is not None and len(values) != len(fields):
+        values, direction = None, None
+    reverse = direction == 'prev'
+
+    if values is not None:
+        values = [
+            converters[field](value) if field in converters and value is not None else value
+            for field, value in zip(fields, values)
+        ]
+        queryset = queryset.filter(_keyset_filter(ordering, values, reverse))
+
+    order_by = [
+        F(field).desc() if descending != reverse else F(field).asc()
+        for field, descending in ordering
+    ]
+    items = list(queryset.order_by(*order_by)[:page_size + 1])
+
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    if reverse:
+        items.reverse()
+
+    def cursor_for(item, direction):
+        return _encode_cursor([getattr(item, field) for field in fields], direction)
+
+    next_cursor = None
+    previous_cursor = None
+    if items:
+        # Đi tới: còn trang sau nếu lấy dư; có trang trước nếu đã có cursor
+        # Đi lùi: ngược lại
+        if has_more if not reverse else values is not None:
+            next_cursor = cursor_for(items[-1], 'next')
+        if values is not None if not reverse else has_more:
+            previous_cursor = cursor_for(items[0], 'prev')
+
+    return KeysetPage(items, next_cursor, previous_cursor, page_size)
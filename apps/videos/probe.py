@@ -0,0 +1,236 @@
+"""
+Đọc metadata MP4/MOV chỉ từ box `moov` bằng ranged GET trên Minio
+(không download cả file)
+"""
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Số byte đọc lần đầu ở đầu file (đủ cho ftyp + moov của phần lớn file faststart)
+HEAD_READ_BYTES = 256 * 1024
+
+# Giới hạn kích thước moov để tránh đọc nhầm file không phải MP4
+MAX_MOOV_BYTES = 64 * 1024 * 1024
+
+CODEC_NAMES = {
+    b'avc1': 'h264',
+    b'avc3': 'h264',
+    b'hvc1': 'hevc',
+    b'hev1': 'hevc',
+    b'av01': 'av1',
+    b'vp09': 'vp9',
+    b'mp4v': 'mpeg4',
+    b'mp4a': 'aac',
+    b'Opus': 'opus',
+    b'ac-3': 'ac3',
+    b'ec-3': 'eac3',
+    b'fLaC': 'flac',
+}
+
+
+class ProbeError(Exception):
+    """Không đọc được metadata (không phải MP4, thiếu moov, ...)"""
+
+
+def _iter_boxes(data, offset=0, end=None):
+    """Duyệt các box trong data[offset:end], yield (type, payload_start, box_end)"""
+    end = len(data) if end is None else end
+    while offset + 8 <= end:
+        size, box_type = struct.unpack('>I4s', data[offset:offset + 8])
+        header = 8
+        if size == 1:
+            if offset + 16 > end:
+                break
+            size = struct.unpack('>Q', data[offset + 8:offset + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            break
+        yield box_type, offset + header, min(offset + size, end)
+        offset += size
+
+
+def _find_box(data, path, offset=0, end=None):
+    """Tìm box theo đường dẫn (vd: [b'mdia', b'mdhd']), trả về (start, end) của payload"""
+    for box_type, start, box_end in _iter_boxes(data, offset, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return start, box_end
+            return _find_box(data, path[1:], start, box_end)
+    return None
+
+
+def _read_header_timing(data, start):
+    """Đọc timescale và duration từ mvhd/mdhd (version 0 hoặc 1)"""
+    version = data[start]
+    if version == 1:
+        timescale, duration = struct.unpack('>IQ', data[start + 20:start + 32])
+    else:
+        timescale, duration = struct.unpack('>II', data[start + 12:start + 20])
+    return timescale, duration
+
+
+def _parse_track(data, start, end):
+    """Đọc thông tin 1 track: loại, codec, kích thước, fps"""
+    track = {}
+
+    hdlr = _find_box(data, [b'mdia', b'hdlr'], start, end)
+    if hdlr:
+        track['handler'] = data[hdlr[0] + 8:hdlr[0] + 12].decode('latin-1')
+
+    mdhd = _find_box(data, [b'mdia', b'mdhd'], start, end)
+    if mdhd:
+        timescale, duration = _read_header_timing(data, mdhd[0])
+        if timescale:
+            track['duration'] = duration / timescale
+
+    stsd = _find_box(data, [b'mdia', b'minf', b'stbl', b'stsd'], start, end)
+    if stsd:
+        # stsd: version/flags (4) + entry_count (4), rồi sample entry đầu tiên
+        entry = stsd[0] + 8
+        if entry + 8 <= stsd[1]:
+            fourcc = data[entry + 4:entry + 8]
+            track['codec'] = CODEC_NAMES.get(fourcc, fourcc.decode('latin-1').strip())
+            if track.get('handler') == 'vide' and entry + 36 <= stsd[1]:
+                # VisualSampleEntry: width/height ở offset 32/34
+                track['width'], track['height'] = struct.unpack('>HH', data[entry + 32:entry + 36])
+
+    stts = _find_box(data, [b'mdia', b'minf', b'stbl', b'stts'], start, end)
+    if stts:
+        count = struct.unpack('>I', data[stts[0] + 4:stts[0] + 8])[0]
+        samples = 0
+        pos = stts[0] + 8
+        for _ in range(count):
+            if pos + 8 > stts[1]:
+                break
+            samples += struct.unpack('>I', data[pos:pos + 4])[0]
+            pos += 8
+        track['samples'] = samples
+
+    if 'width' not in track:
+        tkhd = _find_box(data, [b'tkhd'], start, end)
+        if tkhd and tkhd[1] - tkhd[0] >= 8:
+            # width/height dạng fixed 16.16 ở cuối tkhd
+            width, height = struct.unpack('>II', data[tkhd[1] - 8:tkhd[1]])
+            if width or height:
+                track['width'], track['height'] = width >> 16, height >> 16
+
+    return track
+
+
+def parse_moov(moov):
+    """
+    Đọc metadata từ nội dung box moov
+
+    Args:
+        moov: bytes của box moov (gồm cả header 8/16 byte)
+
+    Returns:
+        dict: duration, width, height, fps, video_codec, audio_codec
+    """
+    info = {
+        'duration': None,
+        'width': None,
+        'height': None,
+        'fps': None,
+        'video_codec': None,
+        'audio_codec': None,
+    }
+
+    moov_box = _find_box(moov, [b'moov'])
+    if not moov_box:
+        raise ProbeError('moov box not found')
+    start, end = moov_box
+
+    mvhd = _find_box(moov, [b'mvhd'], start, end)
+    if mvhd:
+        timescale, duration = _read_header_timing(moov, mvhd[0])
+        if timescale and duration:
+            info['duration'] = duration / timescale
+
+    for box_type, track_start, track_end in _iter_boxes(moov, start, end):
+        if box_type != b'trak':
+            continue
+        track = _parse_track(moov, track_start, track_end)
+
+        if track.get('handler') == 'vide' and not info['video_codec']:
+            info['video_codec'] = track.get('codec')
+            info['width'] = track.get('width')
+            info['height'] = track.get('height')
+            if track.get('samples') and track.get('duration'):
+                info['fps'] = round(track['samples'] / track['duration'], 3)
+            if not info['duration']:
+                info['duration'] = track.get('duration')
+        elif track.get('handler') == 'soun' and not info['audio_codec']:
+            info['audio_codec'] = track.get('codec')
+
+    return info
+
+
+def _locate_moov(read_range, size):
+    """
+    Tìm vị trí box moov bằng cách nhảy qua header các box top-level
+
+    Đọc 1 lần phần đầu file; nếu moov nằm sau mdat (không faststart) thì chỉ
+    đọc thêm header (16 byte) của từng box tiếp theo.
+
+    Returns:
+        tuple: (offset, size) của box moov và bytes phần đầu file đã đọc
+    """
+    head = read_range(0, min(size, HEAD_READ_BYTES))
+    offset = 0
+
+    while offset + 8 <= size:
+        if offset + 16 <= len(head):
+            header = head[offset:offset + 16]
+        else:
+            header = read_range(offset, min(16, size - offset))
+        if len(header) < 8:
+            break
+
+        box_size, box_type = struct.unpack('>I4s', header[:8])
+        if box_size == 1:
+            if len(header) < 16:
+                break
+            box_size = struct.unpack('>Q', header[8:16])[0]
+        elif box_size == 0:
+            box_size = size - offset
+        if box_size < 8:
+            raise ProbeError(f"Invalid box size at offset {offset}")
+
+        if box_type == b'moov':
+            return offset, box_size, head
+        offset += box_size
+
+    raise ProbeError('moov box not found')
+
+
+def probe_mp4(read_range, size):
+    """
+    Đọc metadata của file MP4/MOV chỉ bằng ranged read
+
+    Args:
+        read_range: Hàm read_range(offset, length) trả về bytes
+        size: Kích thước file (byte)
+
+    Returns:
+        dict: duration, width, height, fps, video_codec, audio_codec, bitrate, file_size
+    """
+    moov_offset, moov_size, head = _locate_moov(read_range, size)
+    if moov_size > MAX_MOOV_BYTES:
+        raise ProbeError(f"moov box too large: {moov_size} bytes")
+
+    if moov_offset + moov_size <= len(head):
+        moov = head[moov_offset:moov_offset + moov_size]
+    else:
+        moov = read_range(moov_offset, moov_size)
+    if len(moov) < moov_size:
+        raise ProbeError('Truncated moov box')
+
+    info = parse_moov(moov)
+    info['file_size'] = size
+    info['bitrate'] = int(size * 8 / info['duration']) if info['duration'] else None
+    return info
@@ -0,0 +1,258 @@
+"""
+Profiling theo request (bật khi cần, không phải deploy lại với DEBUG)
+
+Một request được profile khi:
+- user staff gửi header `X-Profile: 1` hoặc query `?_profile=1`
+  (giá trị `cprofile` để chạy thêm cProfile cho view), hoặc
+- được lấy mẫu ngẫu nhiên theo settings.REQUEST_PROFILING_SAMPLE_RATE.
+
+Số liệu ghi lại: wall time, số query SQL và thời gian, query lặp lại
+(cùng SQL) và trùng hẳn (cùng SQL + params), số lần gọi Minio và thời gian
+theo từng operation. Kết quả được log (logger apps.videos.profiling), trả về
+qua header Server-Timing; request do staff bật còn được ghi ra file JSON
+(và file .prof của cProfile, xem bằng snakeviz/flameprof) trong
+settings.REQUEST_PROFILING_DIR.
+"""
+import cProfile
+import json
+import os
+import random
+import time
+import uuid
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = '_profile'
+MODE_BASIC = 'basic'
+MODE_CPROFILE = 'cprofile'
+
+# Số nhóm query lặp lại / operation Minio tối đa đưa vào báo cáo
+REPORT_TOP = 10
+
+_current = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """Số liệu thu thập trong 1 request"""
+
+    def __init__(self, request, mode, source):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = request.method
+        self.path = request.path
+        self.mode = mode
+        self.source = source
+        self.started = time.perf_counter()
+        self.duration = None
+        self.view = None
+        self.queries = []
+        self.minio = {}
+        self.profiler = None
+
+    def record_query(self, sql, params, many, seconds):
+        self.queries.append((sql, repr(params), many, seconds))
+
+    def record_minio(self, operation, seconds):
+        entry = self.minio.setdefault(operation, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def report(self):
+        """
+        Tổng hợp số liệu của request
+
+        Returns:
+            dict: Báo cáo (thời gian tính bằng ms)
+        """
+        by_sql = {}
+        exact = {}
+        for sql, params, _, seconds in self.queries:
+            entry = by_sql.setdefault(sql, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            exact[(sql, params)] = exact.get((sql, params), 0) + 1
+
+        repeated = sorted(
+            ((sql, count, seconds) for sql, (count, seconds) in by_sql.items() if count > 1),
+            key=lambda item: (-item[1], -item[2])
+        )
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'view': self.view,
+            'source': self.source,
+            'duration_ms': _ms(self.duration),
+            'sql': {
+                'count': len(self.queries),
+                'time_ms': _ms(sum(query[3] for query in self.queries)),
+                # Thực thi thừa: cùng SQL và cùng params đã chạy trước đó trong request
+                'duplicates': sum(count - 1 for count in exact.values()),
+                # Cùng SQL khác params (thường là N+1)
+                'repeated': [
+                    {'sql': sql, 'count': count, 'time_ms': _ms(seconds)}
+                    for sql, count, seconds in repeated[:REPORT_TOP]
+                ],
+            },
+            'minio': {
+                'count': sum(count for count, _ in self.minio.values()),
+                'time_ms': _ms(sum(seconds for _, seconds in self.minio.values())),
+                'operations': {
+                    operation: {'count': count, 'time_ms': _ms(seconds)}
+                    for operation, (count, seconds) in sorted(self.minio.items(), key=lambda item: -item[1][1])
+                },
+            },
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def record_minio_call(operation, seconds):
+    """Ghi 1 lần gọi Minio client vào profile của request hiện tại (nếu có)"""
+    profile = _current.get()
+    if profile is not None:
+        profile.record_minio(operation, seconds)
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record_query(sql, params, many, time.perf_counter() - started)
+
+
+def _install_query_wrapper(sender=None, connection=None, **kwargs):
+    # Wrapper nằm trên DatabaseWrapper (mỗi thread 1 object) và giữ nguyên qua các lần kết nối lại
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+class RequestProfilingMiddleware:
+    """
+    Middleware profiling request theo yêu cầu (staff) hoặc lấy mẫu
+
+    Đặt sau AuthenticationMiddleware (cần request.user) và cuối danh sách để
+    cProfile chỉ bao view.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+        connection_created.connect(_install_query_wrapper, dispatch_uid='request_profiling_query_wrapper')
+        for connection in connections.all(initialized_only=True):
+            _install_query_wrapper(connection=connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        mode, sampled = self._requested_mode(request), self._sampled()
+        if not mode and not sampled:
+            return self.get_response(request)
+        profile = self._start(request, mode, sampled)
+        if profile is None:
+            return self.get_response(request)
+        token = _current.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(profile, response)
+
+    async def __acall__(self, request):
+        mode, sampled = self._requested_mode(request), self._sampled()
+        if not mode and not sampled:
+            return await self.get_response(request)
+
+        # request.user đọc session từ DB nên phải chạy ngoài event loop
+        profile = await sync_to_async(self._start)(request, mode, sampled)
+        if profile is None:
+            return await self.get_response(request)
+        token = _current.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return await sync_to_async(self._finish)(profile, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _current.get()
+        if profile is None:
+            return None
+        profile.view = f"{view_func.__module__}.{getattr(view_func, '__name__', type(view_func).__name__)}"
+        if profile.mode != MODE_CPROFILE or iscoroutinefunction(view_func):
+            return None
+
+        # Chạy view trong profiler (cùng thread với view cả khi chạy ASGI)
+        profile.profiler = cProfile.Profile()
+        return profile.profiler.runcall(view_func, request, *view_args, **view_kwargs)
+
+    def _requested_mode(self, request):
+        value = request.headers.get(PROFILE_HEADER) or request.GET.get(PROFILE_PARAM)
+        if not value or value in ('0', 'false'):
+            return None
+        return MODE_CPROFILE if value == MODE_CPROFILE else MODE_BASIC
+
+    def _sampled(self):
+        rate = settings.REQUEST_PROFILING_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+    def _start(self, request, mode, sampled):
+        if mode and request.user.is_authenticated and request.user.is_staff:
+            return RequestProfile(request, mode, source='staff')
+        if sampled:
+            return RequestProfile(request, MODE_BASIC, source='sample')
+        return None
+
+    def _finish(self, profile, response):
+        profile.duration = time.perf_counter() - profile.started
+        report = profile.report()
+        logger.info(f"Request profile {json.dumps(report)}")
+
+        if profile.source == 'staff':
+            self._dump(profile, report)
+            response['X-Profile-Id'] = profile.id
+
+        sql, minio = report['sql'], report['minio']
+        response['Server-Timing'] = ', '.join([
+            f"total;dur={report['duration_ms']}",
+            f'db;dur={sql["time_ms"]};desc="{sql["count"]} queries, {sql["duplicates"]} duplicates"',
+            f'minio;dur={minio["time_ms"]};desc="{minio["count"]} calls"',
+        ])
+        return response
+
+    def _dump(self, profile, report):
+        """Ghi báo cáo (và kết quả cProfile) ra REQUEST_PROFILING_DIR"""
+        directory = settings.REQUEST_PROFILING_DIR
+        if not directory:
+            return
+        try:
+            os.makedirs(directory, exist_ok=True)
+            base = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}_{profile.id}")
+            if profile.profiler is not None:
+                profile.profiler.dump_stats(base + '.prof')
+                report['cprofile'] = base + '.prof'
+            with open(base + '.json', 'w') as f:
+                json.dump(report, f, indent=2)
+        except OSError as e:
+            logger.warning(f"Cannot write request profile: {e}")
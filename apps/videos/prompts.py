@@ -0,0 +1,233 @@
+"""
+Engine render prompt từ PromptTemplate
+
+Template được parse 1 lần thành format string (cache theo id + updated_at),
+mỗi lần render chỉ là 1 lượt str.format_map thay cho nhiều lần str.replace.
+Placeholder có dạng {ten_bien}; các cặp ngoặc khác được giữ nguyên như text,
+kể cả {{ten_bien}} (ngoặc kép là escape, không phải placeholder).
+"""
+import math
+import re
+import threading
+from collections import OrderedDict
+
+
+# Placeholder hỗ trợ -> mô tả (hiển thị ở màn hình sửa template)
+PLACEHOLDERS = OrderedDict([
+    ('youtube_link', 'Link YouTube'),
+    ('youtube_title', 'Tiêu đề video YouTube'),
+    ('youtube_description', 'Mô tả video YouTube'),
+    ('youtube_tags', 'Tags video YouTube (phân cách bằng dấu phẩy)'),
+    ('video_title', 'Tiêu đề video profile'),
+    ('video_notes', 'Ghi chú của video profile'),
+    ('video_duration', 'Độ dài video (giây)'),
+    ('segment_index', 'Số thứ tự segment (bắt đầu từ 1)'),
+    ('start_time', 'Thời gian bắt đầu segment (giây)'),
+    ('end_time', 'Thời gian kết thúc segment (giây)'),
+    ('segment_duration', 'Độ dài segment (giây)'),
+    ('start_timecode', 'Thời gian bắt đầu dạng hh:mm:ss'),
+    ('end_timecode', 'Thời gian kết thúc dạng hh:mm:ss'),
+])
+
+# Quét từ trái sang phải: '{{' / '}}' là escape (giữ nguyên), chỉ {ten_bien}
+# đứng riêng mới là placeholder (group 1)
+PLACEHOLDER_RE = re.compile(r'\{\{|\}\}|\{([A-Za-z_][A-Za-z0-9_]*)\}')
+
+# Số template đã compile giữ trong cache (mỗi process)
+COMPILED_CACHE_SIZE = 1024
+
+
+class _Values(dict):
+    """Biến không có giá trị được render thành chuỗi rỗng"""
+
+    def __missing__(self, key):
+        return ''
+
+
+class CompiledPrompt:
+    """Template đã parse: format string chỉ chứa các placeholder hợp lệ"""
+
+    __slots__ = ('source', 'format_string', 'placeholders', 'unknown')
+
+    def __init__(self, source):
+        self.source = source
+        self.placeholders = []
+        self.unknown = []
+        parts = []
+        last = 0
+        for match in PLACEHOLDER_RE.finditer(source):
+            name = match.group(1)
+            parts.append(_escape(source[last:match.start()]))
+            if name is None:
+                # Ngoặc escape: giữ nguyên như text
+                parts.append(_escape(match.group(0)))
+            elif name in PLACEHOLDERS:
+                parts.append('{' + name + '}')
+                if name not in self.placeholders:
+                    self.placeholders.append(name)
+            else:
+                # Placeholder không hỗ trợ: giữ nguyên text như trước
+                parts.append(_escape(match.group(0)))
+                if name not in self.unknown:
+                    self.unknown.append(name)
+            last = match.end()
+        parts.append(_escape(source[last:]))
+        self.format_string = ''.join(parts)
+
+    def render(self, values):
+        """
+        Render prompt
+
+        Args:
+            values: dict tên placeholder -> giá trị (thiếu = chuỗi rỗng)
+
+        Returns:
+            str: Prompt
+        """
+        if not self.placeholders:
+            return self.source
+        return self.format_string.format_map(_Values(values))
+
+
+def _escape(text):
+    return text.replace('{', '{{').replace('}', '}}')
+
+
+_compiled_cache = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def compile_template(template):
+    """
+    Lấy template đã compile (cache theo id + updated_at của PromptTemplate,
+    hoặc theo nội dung nếu truyền string)
+
+    Args:
+        template: PromptTemplate instance hoặc template string
+
+    Returns:
+        CompiledPrompt
+    """
+    if isinstance(template, str):
+        key = ('text', template)
+        source = template
+    else:
+        key = (template.pk, template.updated_at)
+        source = template.template_content
+
+    with _compiled_lock:
+        compiled = _compiled_cache.get(key)
+        if compiled is not None:
+            _compiled_cache.move_to_end(key)
+            return compiled
+
+    compiled = CompiledPrompt(source or '')
+    with _compiled_lock:
+        _compiled_cache[key] = compiled
+        while len(_compiled_cache) > COMPILED_CACHE_SIZE:
+            _compiled_cache.popitem(last=False)
+    return compiled
+
+
+def find_unknown_placeholders(content):
+    """
+    Các placeholder không được hỗ trợ trong nội dung template
+
+    Returns:
+        list: Tên placeholder (theo thứ tự xuất hiện, không trùng)
+    """
+    return CompiledPrompt(content or '').unknown
+
+
+def format_timecode(seconds):
+    """Đổi số giây sang hh:mm:ss(.mmm)"""
+    if seconds is None:
+        return ''
+    seconds = float(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if secs == int(secs):
+        return f"{int(hours):02d}:{int(minutes):02d}:{int(secs):02d}"
+    return f"{int(hours):02d}:{int(minutes):02d}:{secs:06.3f}"
+
+
+def _number(value):
+    if value is None:
+        return ''
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+def _segment_number(segment, name, kind):
+    """Giá trị số trong dict segment (vd: từ JSON của API), None nếu bỏ trống"""
+    value = segment.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        value = kind(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid segment {name}: {value!r}")
+    if not math.isfinite(value):
+        raise ValueError(f"Invalid segment {name}: {value!r}")
+    return value
+
+
+def build_prompt_values(video=None, segment=None, **extra):
+    """
+    Giá trị các placeholder cho 1 video/segment
+
+    Args:
+        video: VideoProfile (tùy chọn)
+        segment: Segment hoặc dict segment (tùy chọn)
+        **extra: Giá trị ghi đè, vd: youtube_link, youtube_title, youtube_tags
+
+    Returns:
+        dict: Tên placeholder -> chuỗi
+
+    Raises:
+        ValueError: dict segment có position/start_time/end_time không phải số
+    """
+    values = {}
+    if video is not None:
+        values['youtube_link'] = video.youtube_link or ''
+        values['video_title'] = video.title or ''
+        values['video_notes'] = video.notes or ''
+        values['video_duration'] = _number(video.duration)
+
+    if segment is not None:
+        if isinstance(segment, dict):
+            position = _segment_number(segment, 'position', int)
+            start_time = _segment_number(segment, 'start_time', float)
+            end_time = _segment_number(segment, 'end_time', float)
+        else:
+            position, start_time, end_time = segment.position, segment.start_time, segment.end_time
+        values['segment_index'] = '' if position is None else str(position + 1)
+        values['start_time'] = _number(start_time)
+        values['end_time'] = _number(end_time)
+        values['start_timecode'] = format_timecode(start_time)
+        values['end_timecode'] = format_timecode(end_time)
+        if start_time is not None and end_time is not None:
+            values['segment_duration'] = _number(end_time - start_time)
+
+    for name, value in extra.items():
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ', '.join(str(item) for item in value)
+        values[name] = _number(value) if isinstance(value, (int, float)) else str(value)
+    return values
+
+
+def render_prompt(template, video=None, segment=None, **extra):
+    """
+    Render prompt từ template cho 1 video/segment
+
+    Args:
+        template: PromptTemplate instance hoặc template string
+        video: VideoProfile (tùy chọn)
+        segment: Segment hoặc dict segment (tùy chọn)
+        **extra: Giá trị placeholder ghi đè
+
+    Returns:
+        str: Prompt
+    """
+    return compile_template(template).render(build_prompt_values(video, segment, **extra))
@@ -0,0 +1,22 @@
+"""
+Xóa cache dữ liệu tham chiếu khi PromptTemplate/User thay đổi
+"""
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import invalidate_prompt_templates, invalidate_user_choices
+from .models import PromptTemplate
+
+
+@receiver([post_save, post_delete], sender=PromptTemplate)
+def prompt_template_changed(sender, **kwargs):
+    invalidate_prompt_templates()
+
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, update_fields=None, **kwargs):
+    # Đăng nhập chỉ ghi last_login, không ảnh hưởng dropdown
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_user_choices()
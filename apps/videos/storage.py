@@ -0,0 +1,154 @@
+"""
+Object store trên filesystem local, dùng thay Minio khi benchmark/dev không có Minio
+
+Chỉ cài đặt các method của minio.Minio mà MinioClient sử dụng. Mỗi bucket là
+1 thư mục con của root, object name là đường dẫn tương đối trong bucket.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+
+import urllib3
+from minio.datatypes import Object
+from minio.error import S3Error
+
+
+class _FileResponse:
+    """Response giả lập urllib3 cho get_object (read/stream/close/release_conn)"""
+
+    def __init__(self, path, offset=0, length=0):
+        self._file = open(path, 'rb')
+        self._file.seek(offset)
+        self._remaining = length if length else os.path.getsize(path) - offset
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def stream(self, amt=1024 ** 2):
+        while self._remaining > 0:
+            data = self.read(amt)
+            if not data:
+                break
+            yield data
+
+    def close(self):
+        self._file.close()
+
+    def release_conn(self):
+        pass
+
+
+class FilesystemObjectStore:
+    """Thay thế minio.Minio bằng thư mục local (settings.MINIO_FILESYSTEM_ROOT)"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+        # MinioClient.http_pool_stats đọc pool của client; filesystem không có pool nào
+        self._http = urllib3.PoolManager()
+
+    def _path(self, bucket_name, object_name):
+        bucket = os.path.join(self.root, bucket_name)
+        path = os.path.abspath(os.path.join(bucket, object_name))
+        if not path.startswith(bucket + os.sep):
+            raise ValueError(f"Invalid object name: {object_name}")
+        return path
+
+    def _existing_path(self, bucket_name, object_name):
+        path = self._path(bucket_name, object_name)
+        if not os.path.isfile(path):
+            raise S3Error(
+                'NoSuchKey', 'Object does not exist', object_name, None, None, None,
+                bucket_name=bucket_name, object_name=object_name
+            )
+        return path
+
+    def _write(self, path, write):
+        """Ghi vào file tạm cùng thư mục rồi rename, giống object store (không thấy object dở dang)"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def bucket_exists(self, bucket_name):
+        return os.path.isdir(os.path.join(self.root, bucket_name))
+
+    def make_bucket(self, bucket_name):
+        os.makedirs(os.path.join(self.root, bucket_name), exist_ok=True)
+
+    def fput_object(self, bucket_name, object_name, file_path, content_type=None, **kwargs):
+        def write(f):
+            with open(file_path, 'rb') as source:
+                shutil.copyfileobj(source, f, 1024 ** 2)
+        self._write(self._path(bucket_name, object_name), write)
+
+    def put_object(self, bucket_name, object_name, data, length, content_type=None, part_size=0, **kwargs):
+        def write(f):
+            remaining = length
+            while remaining != 0:
+                chunk = data.read(1024 ** 2 if remaining < 0 else min(remaining, 1024 ** 2))
+                if not chunk:
+                    break
+                f.write(chunk)
+                if remaining > 0:
+                    remaining -= len(chunk)
+        self._write(self._path(bucket_name, object_name), write)
+
+    def fget_object(self, bucket_name, object_name, file_path, **kwargs):
+        shutil.copyfile(self._existing_path(bucket_name, object_name), file_path)
+
+    def get_object(self, bucket_name, object_name, offset=0, length=0, request_headers=None, **kwargs):
+        path = self._existing_path(bucket_name, object_name)
+        if request_headers and request_headers.get('If-Match'):
+            if request_headers['If-Match'] != self._etag(path):
+                raise S3Error(
+                    'PreconditionFailed', 'ETag does not match', object_name, None, None, None,
+                    bucket_name=bucket_name, object_name=object_name
+                )
+        return _FileResponse(path, offset, length)
+
+    def _etag(self, path):
+        stat = os.stat(path)
+        return hashlib.md5(f"{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+
+    def stat_object(self, bucket_name, object_name, **kwargs):
+        path = self._existing_path(bucket_name, object_name)
+        stat = os.stat(path)
+        return Object(
+            bucket_name,
+            object_name,
+            last_modified=datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+            etag=self._etag(path),
+            size=stat.st_size,
+        )
+
+    def presigned_get_object(self, bucket_name, object_name, expires=None, **kwargs):
+        # ffmpeg/ffprobe đọc trực tiếp đường dẫn local
+        return self._path(bucket_name, object_name)
+
+    def remove_object(self, bucket_name, object_name, **kwargs):
+        path = self._path(bucket_name, object_name)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def list_objects(self, bucket_name, prefix=None, recursive=False, **kwargs):
+        bucket = os.path.join(self.root, bucket_name)
+        prefix = prefix or ''
+        names = []
+        for directory, _, files in os.walk(bucket):
+            for name in files:
+                object_name = os.path.relpath(os.path.join(directory, name), bucket).replace(os.sep, '/')
+                if object_name.startswith(prefix) and not name.endswith('.part'):
+                    names.append(object_name)
+        return [self.stat_object(bucket_name, object_name) for object_name in sorted(names)]
@@ -0,0 +1,192 @@
+"""
+Test bulk segments: kiểm tra dữ liệu trước khi ghi, conflict theo version, CSV
+"""
+import json
+
+from django.test import TestCase, RequestFactory
+
+from apps.videos import views
+from apps.videos.bulk import BulkValidationError, apply_segment_changes, parse_segments_csv, parse_time
+from apps.videos.models import VideoProfile, Segment
+
+
+class ApplySegmentChangesTests(TestCase):
+
+    def setUp(self):
+        self.video = VideoProfile.objects.create(title='video', duration=60)
+        self.segments = [
+            Segment.objects.create(video=self.video, position=i, start_time=i * 10, end_time=i * 10 + 5)
+            for i in range(3)
+        ]
+        VideoProfile.refresh_segment_counters(self.video.pk)
+
+    def _positions(self):
+        return list(self.video.segments.order_by('position').values_list('start_time', flat=True))
+
+    def test_invalid_rows_reject_whole_batch(self):
+        create = [
+            {'start_time': 1, 'end_time': 2},
+            {'start_time': 5, 'end_time': 4},
+            {'start_time': 'abc', 'end_time': 4},
+            {'start_time': -1, 'end_time': 4},
+            {'start_time': 61, 'end_time': 70},
+            'not an object',
+        ]
+        update = [{'start_time': 1}, {'id': str(self.segments[0].pk), 'start_time': 9, 'end_time': 3}]
+
+        with self.assertRaises(BulkValidationError) as ctx:
+            apply_segment_changes(self.video, create=create, update=update, delete=[self.segments[2].pk])
+
+        errors = ctx.exception.errors
+        self.assertEqual(
+            [(error['op'], error['row']) for error in errors],
+            [('create', 1), ('create', 2), ('create', 3), ('create', 4), ('create', 5), ('update', 0), ('update', 1)]
+        )
+        self.assertEqual(errors[-1]['id'], str(self.segments[0].pk))
+        # Không có thay đổi nào được ghi, kể cả phần delete hợp lệ
+        self.assertEqual(self._positions(), [0, 10, 20])
+
+    def test_create_update_delete_in_one_call(self):
+        first, second, third = self.segments
+
+        result = apply_segment_changes(
+            self.video,
+            create=[{'start_time': '00:50', 'end_time': 55, 'prompt': 'new'}],
+            update=[{'id': str(third.pk), 'version': third.version, 'prompt': 'edited'}],
+            delete=[second.pk]
+        )
+
+        self.assertEqual(result['deleted'], 1)
+        self.assertEqual(result['updated'], [{'id': str(third.pk), 'version': third.version + 1}])
+        self.assertEqual([item['position'] for item in result['created']], [2])
+        # Vị trí được đánh lại liên tục sau khi xóa
+        self.assertEqual(self._positions(), [0, 20, 50])
+        self.assertEqual(Segment.objects.get(pk=third.pk).prompt, 'edited')
+        self.assertEqual(VideoProfile.objects.get(pk=self.video.pk).total_segments, 3)
+
+    def test_stale_version_is_reported_as_conflict(self):
+        segment = self.segments[0]
+        Segment.objects.filter(pk=segment.pk).update(version=segment.version + 1)
+
+        result = apply_segment_changes(
+            self.video,
+            update=[
+                {'id': str(segment.pk), 'version': segment.version, 'prompt': 'lost'},
+                {'id': str(self.segments[1].pk), 'prompt': 'kept'},
+            ]
+        )
+
+        self.assertEqual(result['conflicts'], [{'id': str(segment.pk), 'error': 'Version mismatch'}])
+        self.assertEqual(Segment.objects.get(pk=segment.pk).prompt, '')
+        self.assertEqual(Segment.objects.get(pk=self.segments[1].pk).prompt, 'kept')
+
+    def test_unknown_segment_is_reported_as_conflict(self):
+        other = VideoProfile.objects.create(title='other')
+        foreign = Segment.objects.create(video=other, position=0, start_time=0, end_time=1)
+
+        result = apply_segment_changes(self.video, update=[{'id': str(foreign.pk), 'prompt': 'x'}])
+
+        self.assertEqual(result['conflicts'], [{'id': str(foreign.pk), 'error': 'Segment not found'}])
+        self.assertEqual(Segment.objects.get(pk=foreign.pk).prompt, '')
+
+    def test_partial_update_validated_against_stored_values(self):
+        first, second, third = self.segments
+
+        with self.assertRaises(BulkValidationError) as ctx:
+            apply_segment_changes(
+                self.video,
+                update=[
+                    {'id': str(first.pk), 'prompt': 'ok'},
+                    # end_time đang lưu là 15
+                    {'id': str(second.pk), 'start_time': 50},
+                ],
+                delete=[third.pk]
+            )
+
+        self.assertEqual(
+            ctx.exception.errors,
+            [{'op': 'update', 'row': 1, 'id': str(second.pk), 'error': 'Start time must be less than end time'}]
+        )
+        # Rollback cả phần delete và update hợp lệ
+        self.assertEqual(self._positions(), [0, 10, 20])
+        self.assertEqual(Segment.objects.get(pk=first.pk).prompt, '')
+
+    def test_end_time_checked_against_duration(self):
+        with self.assertRaises(BulkValidationError) as ctx:
+            apply_segment_changes(
+                self.video,
+                create=[{'start_time': 50, 'end_time': 61}],
+                update=[{'id': str(self.segments[2].pk), 'end_time': 75}]
+            )
+
+        errors = ctx.exception.errors
+        self.assertEqual([(error['op'], error['row']) for error in errors], [('create', 0), ('update', 0)])
+        self.assertTrue(all('exceeds video duration' in error['error'] for error in errors))
+
+    def test_invalid_version_is_a_row_error(self):
+        with self.assertRaises(BulkValidationError) as ctx:
+            apply_segment_changes(self.video, update=[{'id': str(self.segments[0].pk), 'version': 'abc', 'prompt': 'x'}])
+
+        self.assertEqual(ctx.exception.errors[0]['error'], 'Invalid version')
+
+
+class ParseSegmentsCsvTests(TestCase):
+
+    def test_with_header(self):
+        rows = parse_segments_csv('prompt,start_time,end_time,extra\nhello,1,2,x\n\n,,\n')
+        self.assertEqual(rows, [{'prompt': 'hello', 'start_time': '1', 'end_time': '2'}])
+
+    def test_without_header_uses_default_columns(self):
+        rows = parse_segments_csv('00:01,00:02.5,a prompt\n')
+        self.assertEqual(rows, [{'start_time': '00:01', 'end_time': '00:02.5', 'prompt': 'a prompt'}])
+
+    def test_parse_time(self):
+        self.assertEqual(parse_time('01:02:03.5'), 3723.5)
+        self.assertEqual(parse_time(' 12.5 '), 12.5)
+        self.assertIsNone(parse_time(''))
+        with self.assertRaises(ValueError):
+            parse_time('1:xx')
+
+
+class BulkSegmentsViewTests(TestCase):
+
+    def setUp(self):
+        self.video = VideoProfile.objects.create(title='video', duration=60)
+        self.factory = RequestFactory()
+
+    def _post(self, body, content_type='application/json', **query):
+        url = f'/videos/api/videos/{self.video.pk}/segments/bulk/'
+        if query:
+            url += '?' + '&'.join(f'{key}={value}' for key, value in query.items())
+        request = self.factory.post(url, body, content_type=content_type)
+        response = views.bulk_segments(request, pk=self.video.pk)
+        return response.status_code, json.loads(response.content)
+
+    def test_validation_errors_return_400(self):
+        status, data = self._post(json.dumps({'create': [{'start_time': 5, 'end_time': 1}]}))
+
+        self.assertEqual(status, 400)
+        self.assertEqual(data['errors'][0]['row'], 0)
+        self.assertFalse(self.video.segments.exists())
+
+        segment = Segment.objects.create(video=self.video, position=0, start_time=0, end_time=1)
+        status, data = self._post(json.dumps({'update': [{'id': str(segment.pk), 'version': 'x'}]}))
+        self.assertEqual(status, 400)
+        self.assertEqual(data['errors'][0]['error'], 'Invalid version')
+
+    def test_malformed_body_returns_400(self):
+        status, _ = self._post('{not json')
+        self.assertEqual(status, 400)
+
+        status, _ = self._post(json.dumps({'delete': ['not-a-uuid']}))
+        self.assertEqual(status, 400)
+
+    def test_csv_replace(self):
+        Segment.objects.create(video=self.video, position=0, start_time=0, end_time=1)
+
+        status, data = self._post('start_time,end_time,prompt\n1,2,a\n3,4,b\n', content_type='text/csv', replace=1)
+
+        self.assertEqual(status, 200)
+        self.assertEqual(data['deleted'], 1)
+        self.assertEqual(data['total_segments'], 2)
+        self.assertEqual(list(self.video.segments.order_by('position').values_list('prompt', flat=True)), ['a', 'b'])
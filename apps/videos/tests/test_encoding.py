@@ -0,0 +1,66 @@
+"""
+Test encoding profile: tham số ffmpeg/MoviePy, chọn profile theo tên
+"""
+from django.test import SimpleTestCase, override_settings
+
+from apps.videos.encoding import EncodingProfile, get_encoding_profile, get_encoding_profile_choices
+
+
+class EncodingProfileTests(SimpleTestCase):
+
+    def test_video_args_crf_and_scale(self):
+        profile = EncodingProfile('p', preset='veryfast', crf=30, max_height=480, threads=2)
+
+        self.assertEqual(
+            profile.video_args(),
+            ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', 30, '-threads', 2, '-vf', "scale=-2:'min(480,ih)'"]
+        )
+        # Phần đầu/cuối của smart cut phải giữ nguyên độ phân giải gốc
+        self.assertNotIn('-vf', profile.video_args(scale=False))
+
+    def test_bitrate_replaces_crf(self):
+        profile = EncodingProfile('p', crf=23, video_bitrate='4M')
+
+        self.assertEqual(profile.video_args(), ['-c:v', 'libx264', '-preset', 'medium', '-b:v', '4M'])
+        self.assertIsNone(profile.moviepy_params()['ffmpeg_params'])
+
+    def test_audio_args(self):
+        self.assertEqual(
+            EncodingProfile('p', audio_bitrate='192k', audio_sample_rate=48000).audio_args(),
+            ['-c:a', 'aac', '-b:a', '192k', '-ar', 48000]
+        )
+        self.assertEqual(EncodingProfile('p', audio_sample_rate=None).audio_args(), ['-c:a', 'aac'])
+
+    def test_moviepy_params(self):
+        params = EncodingProfile('p', preset='slow', crf=18, max_height=720, audio_bitrate='128k').moviepy_params()
+
+        self.assertEqual(params, {
+            'codec': 'libx264',
+            'preset': 'slow',
+            'bitrate': None,
+            'threads': None,
+            'audio_codec': 'aac',
+            'audio_bitrate': '128k',
+            'audio_fps': 44100,
+            'ffmpeg_params': ['-crf', '18', '-vf', "scale=-2:'min(720,ih)'"],
+        })
+
+
+@override_settings(
+    VIDEO_ENCODING_PROFILE='balanced',
+    VIDEO_ENCODING_PROFILES={'archival': {'crf': 16}, 'custom': {'label': 'Custom', 'preset': 'fast'}}
+)
+class GetEncodingProfileTests(SimpleTestCase):
+
+    def test_named_profile_with_settings_override(self):
+        profile = get_encoding_profile('archival')
+
+        self.assertEqual((profile.name, profile.preset, profile.crf), ('archival', 'slow', 16))
+        self.assertEqual(get_encoding_profile('custom').preset, 'fast')
+        self.assertIn(('custom', 'Custom'), get_encoding_profile_choices())
+
+    def test_default_and_unknown_names(self):
+        self.assertEqual(get_encoding_profile().name, 'balanced')
+        with self.assertLogs('apps.videos.encoding', 'WARNING'):
+            profile = get_encoding_profile('nope')
+        self.assertEqual((profile.name, profile.crf), ('balanced', 23))
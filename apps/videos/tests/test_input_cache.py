@@ -0,0 +1,163 @@
+"""
+Test disk cache video input: hit/miss, thứ tự evict (LRU), entry đang dùng
+"""
+import os
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from apps.videos.input_cache import InputVideoCache
+
+
+class FakeObjectStore:
+    """Minio giả: object name -> bytes, đếm số lần download"""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.downloads = []
+
+    def stat_file(self, object_name):
+        data = self.objects.get(object_name)
+        if data is None:
+            return None
+        return SimpleNamespace(size=len(data), etag=str(hash(data)))
+
+    def download_file(self, object_name, file_path):
+        self.downloads.append(object_name)
+        with open(file_path, 'wb') as f:
+            f.write(self.objects[object_name])
+        return True
+
+
+class InputVideoCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix='input_cache_test_')
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.store = FakeObjectStore({name: name.encode() * 10 for name in ('a', 'b', 'c', 'd')})
+        self.store.objects['big'] = b'x' * 100
+
+    def _cache(self, max_bytes=25):
+        return InputVideoCache(self.store, cache_dir=self.cache_dir, max_bytes=max_bytes)
+
+    def _load(self, cache, name, age=None):
+        """Mở rồi đóng entry; age (giây) đặt lại mtime để cố định thứ tự LRU"""
+        with cache.open(name) as path:
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), self.store.objects[name])
+        if age is not None:
+            key = cache._entry_key(name, self.store.stat_file(name).etag)
+            when = time.time() - age
+            os.utime(cache._entry_path(key), (when, when))
+        return path
+
+    def _cached_names(self, cache):
+        keys = {key for _, _, key in cache._entries()}
+        return sorted(
+            name for name in self.store.objects
+            if cache._entry_key(name, self.store.stat_file(name).etag) in keys
+        )
+
+    def _lock_files(self):
+        return sorted(
+            name for name in os.listdir(self.cache_dir)
+            if name.endswith(InputVideoCache.LOCK_SUFFIX) and name != InputVideoCache.GLOBAL_LOCK
+        )
+
+    def test_miss_then_hit(self):
+        cache = self._cache()
+
+        self._load(cache, 'a')
+        self.assertEqual(cache.last_fetch, {'cache': 'miss', 'bytes': 10})
+        self._load(cache, 'a')
+        self.assertEqual(cache.last_fetch, {'cache': 'hit', 'bytes': 0})
+
+        self.assertEqual(self.store.downloads, ['a'])
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries'], stats['bytes']), (1, 1, 1, 10))
+
+    def test_missing_object(self):
+        with self.assertRaises(FileNotFoundError):
+            with self._cache().open('nope'):
+                pass
+
+    def test_evicts_least_recently_used(self):
+        cache = self._cache()
+        self._load(cache, 'a', age=30)
+        self._load(cache, 'b', age=20)
+        # Hit cập nhật mtime: a trở thành mới nhất, b là entry cũ nhất
+        self._load(cache, 'a')
+
+        self._load(cache, 'c')
+
+        self.assertEqual(self._cached_names(cache), ['a', 'c'])
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_eviction_removes_lock_files(self):
+        cache = self._cache(max_bytes=10)
+        for name in ('a', 'b', 'c', 'd'):
+            self._load(cache, name, age=0)
+
+        self.assertEqual(self._cached_names(cache), ['d'])
+        self.assertEqual(len(self._lock_files()), 1)
+
+    def test_entry_in_use_is_not_evicted(self):
+        cache = self._cache(max_bytes=20)
+        other = self._cache(max_bytes=20)
+
+        with cache.open('a') as path:
+            os.utime(path, (0, 0))
+            self._load(other, 'b', age=10)
+            # a là entry cũ nhất nhưng đang được đọc: b bị evict thay
+            self._load(other, 'c')
+            self.assertTrue(os.path.exists(path))
+
+        self.assertEqual(self._cached_names(cache), ['a', 'c'])
+
+    def test_uncached_download_is_not_an_entry(self):
+        cache = self._cache()
+        other = self._cache()
+
+        with cache.open('big') as path:
+            self.assertEqual(cache.last_fetch, {'cache': 'bypass', 'bytes': 100})
+            self.assertEqual(cache._entries(), [])
+            # Evict toàn bộ cache trong lúc file tạm đang được đọc
+            self._load(other, 'a')
+            other._evict(other.max_bytes)
+            self.assertTrue(os.path.exists(path))
+
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(cache.stats()['bypass'], 1)
+
+    def test_retries_when_entry_evicted_before_use(self):
+        cache = self._cache()
+        download_entry = cache._download_entry
+        calls = []
+
+        def download_then_evict(object_name, entry_path):
+            download_entry(object_name, entry_path)
+            calls.append(entry_path)
+            if len(calls) == 1:
+                # Evictor chen vào đúng lúc exclusive lock được hạ về shared lock
+                os.remove(entry_path)
+
+        with mock.patch.object(cache, '_download_entry', side_effect=download_then_evict):
+            path = self._load(cache, 'a')
+
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(os.path.exists(path))
+
+    def test_failed_download_leaves_no_files(self):
+        cache = self._cache()
+
+        with mock.patch.object(self.store, 'download_file', return_value=False):
+            with self.assertRaises(IOError):
+                with cache.open('a'):
+                    pass
+
+        self.assertEqual(cache._entries(), [])
+        self.assertEqual(self._lock_files(), [])
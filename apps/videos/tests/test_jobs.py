@@ -0,0 +1,304 @@
+"""
+Test job queue: claim/lease, ghi kết quả chỉ khi còn giữ lease, reclaim
+"""
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.videos import jobs
+from apps.videos.models import VideoProfile, Segment, ProcessingJob
+
+
+def _fake_processor(**methods):
+    """VideoProcessor giả (không cần Minio/ffmpeg), methods: tên -> side_effect"""
+    processor = mock.Mock()
+    processor.last_metrics = {}
+    for name, side_effect in methods.items():
+        getattr(processor, name).side_effect = side_effect
+    return mock.patch.object(jobs, 'VideoProcessor', return_value=processor)
+
+
+@override_settings(VIDEO_WORKER_NODE='node-a', VIDEO_WORKER_NODE_CONCURRENCY=2, VIDEO_JOB_LEASE_SECONDS=60)
+class ClaimJobTests(TestCase):
+
+    def setUp(self):
+        self.video = VideoProfile.objects.create(title='video', minio_input_link='inputs/a.mp4')
+
+    def test_claims_oldest_queued_job_and_sets_lease(self):
+        first = jobs.enqueue_preview_job(self.video)
+        jobs.enqueue_thumbnails_job(self.video)
+
+        job = jobs.claim_next_job('node-a:1')
+
+        self.assertEqual(job.pk, first.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'running')
+        self.assertEqual(job.worker_id, 'node-a:1')
+        self.assertEqual(job.node, 'node-a')
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.lease_expires_at, timezone.now())
+
+    def test_returns_none_when_queue_empty(self):
+        self.assertIsNone(jobs.claim_next_job('node-a:1'))
+
+    def test_respects_node_concurrency(self):
+        for _ in range(3):
+            jobs.enqueue_preview_job(self.video)
+
+        self.assertIsNotNone(jobs.claim_next_job('node-a:1'))
+        self.assertIsNotNone(jobs.claim_next_job('node-a:2'))
+        self.assertIsNone(jobs.claim_next_job('node-a:3'))
+        # Node khác vẫn nhận được job
+        self.assertIsNotNone(jobs.claim_next_job('node-b:1', node='node-b'))
+
+    def test_heartbeat_only_extends_own_running_jobs(self):
+        job = jobs.enqueue_preview_job(self.video)
+        jobs.claim_next_job('node-a:1')
+
+        self.assertEqual(jobs.heartbeat_jobs('node-a:2', [job.pk]), 0)
+        self.assertEqual(jobs.heartbeat_jobs('node-a:1', [job.pk]), 1)
+
+
+class RunJobTests(TestCase):
+
+    def setUp(self):
+        self.video = VideoProfile.objects.create(title='video', minio_input_link='inputs/a.mp4', status='draft')
+        self.segment = Segment.objects.create(video=self.video, position=0, start_time=1, end_time=3)
+
+    def _running_job(self, job, worker_id='w1'):
+        ProcessingJob.objects.filter(pk=job.pk).update(
+            status='running', worker_id=worker_id, attempts=1,
+            lease_expires_at=timezone.now() + timedelta(minutes=5)
+        )
+        return job
+
+    def _steal(self, job):
+        """Giả lập lease bị thu hồi (reclaim_expired_jobs) trong lúc job đang chạy"""
+        ProcessingJob.objects.filter(pk=job.pk).update(status='queued', worker_id=None)
+
+    def test_segment_result_written_while_holding_lease(self):
+        job = self._running_job(jobs.enqueue_segment_job(self.video, 0, 1, 3, segment=self.segment))
+        output = {'output_link': 'outputs/0.mp4', 'cut_mode': 'copy'}
+
+        with _fake_processor(process_segment=lambda *args, **kwargs: dict(output)):
+            self.assertEqual(jobs.run_job(job.pk, 'w1'), 'done')
+
+        self.segment.refresh_from_db()
+        self.assertEqual(self.segment.status, 'completed')
+        self.assertEqual(self.segment.minio_output_link, 'outputs/0.mp4')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.result['segment_version'], self.segment.version)
+        self.assertEqual(VideoProfile.objects.get(pk=self.video.pk).status, 'completed')
+
+    def test_lost_lease_discards_result(self):
+        job = self._running_job(jobs.enqueue_segment_job(self.video, 0, 1, 3, segment=self.segment))
+        version = self.segment.version
+
+        def process(*args, **kwargs):
+            self._steal(job)
+            return {'output_link': 'outputs/0.mp4', 'cut_mode': 'copy'}
+
+        with _fake_processor(process_segment=process):
+            self.assertEqual(jobs.run_job(job.pk, 'w1'), 'lost')
+
+        self.segment.refresh_from_db()
+        self.assertEqual(self.segment.version, version)
+        self.assertIsNone(self.segment.minio_output_link)
+        self.assertEqual(ProcessingJob.objects.get(pk=job.pk).status, 'queued')
+
+    def test_lost_lease_on_failure_does_not_mark_video_failed(self):
+        job = self._running_job(jobs.enqueue_segment_job(self.video, 0, 1, 3, segment=self.segment))
+
+        def process(*args, **kwargs):
+            self._steal(job)
+            return None
+
+        with _fake_processor(process_segment=process):
+            self.assertEqual(jobs.run_job(job.pk, 'w1'), 'lost')
+
+        self.assertEqual(VideoProfile.objects.get(pk=self.video.pk).status, 'draft')
+        self.assertEqual(ProcessingJob.objects.get(pk=job.pk).status, 'queued')
+
+    def test_failure_marks_segment_and_video_failed(self):
+        job = self._running_job(jobs.enqueue_segment_job(self.video, 0, 1, 3, segment=self.segment))
+
+        with _fake_processor(process_segment=lambda *args, **kwargs: None):
+            self.assertEqual(jobs.run_job(job.pk, 'w1'), 'failed')
+
+        self.assertEqual(Segment.objects.get(pk=self.segment.pk).status, 'failed')
+        self.assertEqual(VideoProfile.objects.get(pk=self.video.pk).status, 'failed')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertTrue(job.error)
+
+    def test_all_segments_results_matched_by_segment_id(self):
+        second = Segment.objects.create(video=self.video, position=1, start_time=4, end_time=6)
+        job = self._running_job(jobs.enqueue_all_segments_job(self.video))
+
+        def process_all(input_path, segments, cut_mode=None):
+            return [
+                {'segment_index': position, 'success': position == 0, 'output_link': f'outputs/{position}.mp4',
+                 'cut_mode': 'copy', 'error': None}
+                for position, start_time, end_time in segments
+            ]
+
+        with _fake_processor(process_all_segments=process_all):
+            self.assertEqual(jobs.run_job(job.pk, 'w1'), 'done')
+
+        self.assertEqual(Segment.objects.get(pk=self.segment.pk).status, 'completed')
+        self.assertEqual(Segment.objects.get(pk=second.pk).status, 'failed')
+        self.assertEqual(VideoProfile.objects.get(pk=self.video.pk).status, 'failed')
+        results = ProcessingJob.objects.get(pk=job.pk).result['results']
+        self.assertEqual({item['segment_id'] for item in results}, {str(self.segment.pk), str(second.pk)})
+
+    def test_job_reclaimed_before_start_is_skipped(self):
+        job = self._running_job(jobs.enqueue_segment_job(self.video, 0, 1, 3, segment=self.segment), 'w2')
+
+        with _fake_processor() as processor_class:
+            self.assertEqual(jobs.run_job(job.pk, 'w1'), 'lost')
+
+        processor_class.return_value.process_segment.assert_not_called()
+        self.assertEqual(Segment.objects.get(pk=self.segment.pk).status, 'pending')
+
+    def test_stale_run_does_not_mark_finished_segment_processing(self):
+        job = self._running_job(jobs.enqueue_segment_job(self.video, 0, 1, 3, segment=self.segment))
+        stale = ProcessingJob.objects.select_related('video').get(pk=job.pk)
+        # Lease hết hạn, job được reclaim, chạy lại (attempt 2) và đã xong
+        ProcessingJob.objects.filter(pk=job.pk).update(attempts=2, status='done')
+        Segment.objects.filter(pk=self.segment.pk).update(status='completed')
+
+        processor = mock.Mock()
+        processor.process_segment.return_value = {'output_link': 'outputs/0.mp4', 'cut_mode': 'copy'}
+        jobs._run_segment_job(stale, processor)
+
+        self.assertEqual(Segment.objects.get(pk=self.segment.pk).status, 'completed')
+
+
+class ReclaimJobTests(TestCase):
+
+    def setUp(self):
+        self.video = VideoProfile.objects.create(title='video', minio_input_link='inputs/a.mp4', status='processing')
+        self.segment = Segment.objects.create(
+            video=self.video, position=0, start_time=1, end_time=3, status='processing'
+        )
+
+    def _expired_job(self, attempts):
+        job = jobs.enqueue_segment_job(self.video, 0, 1, 3, segment=self.segment)
+        ProcessingJob.objects.filter(pk=job.pk).update(
+            status='running', worker_id='w1', node='node-a', attempts=attempts,
+            lease_expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        return job
+
+    def test_expired_job_is_requeued(self):
+        job = self._expired_job(attempts=1)
+
+        self.assertEqual(jobs.reclaim_expired_jobs(max_attempts=3), (1, 0))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'queued')
+        self.assertIsNone(job.worker_id)
+        self.assertEqual(Segment.objects.get(pk=self.segment.pk).status, 'processing')
+
+    def test_gives_up_after_max_attempts_and_fails_segments(self):
+        job = self._expired_job(attempts=3)
+
+        self.assertEqual(jobs.reclaim_expired_jobs(max_attempts=3), (0, 1))
+
+        self.assertEqual(ProcessingJob.objects.get(pk=job.pk).status, 'failed')
+        self.assertEqual(Segment.objects.get(pk=self.segment.pk).status, 'failed')
+        self.assertEqual(VideoProfile.objects.get(pk=self.video.pk).status, 'failed')
+
+    def test_live_lease_is_not_reclaimed(self):
+        job = self._expired_job(attempts=1)
+        jobs.heartbeat_jobs('w1', [job.pk])
+
+        self.assertEqual(jobs.reclaim_expired_jobs(max_attempts=3), (0, 0))
+
+    def test_release_worker_jobs_only_touches_own_jobs(self):
+        job = self._expired_job(attempts=1)
+
+        self.assertEqual(jobs.release_worker_jobs('w2', [job.pk], 'pool broken', max_attempts=3), (0, 0))
+        self.assertEqual(jobs.release_worker_jobs('w1', [job.pk], 'pool broken', max_attempts=3), (1, 0))
+        self.assertEqual(ProcessingJob.objects.get(pk=job.pk).status, 'queued')
+
+    def test_crashed_job_fails_processing_segments(self):
+        job = jobs.enqueue_segment_job(self.video, 0, 1, 3, segment=self.segment)
+        ProcessingJob.objects.filter(pk=job.pk).update(status='running', worker_id='w1', attempts=1)
+
+        self.assertFalse(jobs.fail_crashed_job(job.pk, 'w2', 'Worker crashed'))
+        self.assertEqual(Segment.objects.get(pk=self.segment.pk).status, 'processing')
+
+        self.assertTrue(jobs.fail_crashed_job(job.pk, 'w1', 'Worker crashed'))
+        self.assertEqual(ProcessingJob.objects.get(pk=job.pk).status, 'failed')
+        self.assertEqual(Segment.objects.get(pk=self.segment.pk).status, 'failed')
+        self.assertEqual(VideoProfile.objects.get(pk=self.video.pk).status, 'failed')
+
+
+class SegmentEditedDuringJobTests(TestCase):
+    """Sửa thời gian segment trong lúc job cắt đang chạy: kết quả cũ không được đè lên"""
+
+    def setUp(self):
+        self.video = VideoProfile.objects.create(title='video', minio_input_link='inputs/a.mp4', duration=60)
+        self.segment = Segment.objects.create(video=self.video, position=0, start_time=1, end_time=3)
+
+    def _running_job(self, job):
+        ProcessingJob.objects.filter(pk=job.pk).update(
+            status='running', worker_id='w1', attempts=1,
+            lease_expires_at=timezone.now() + timedelta(minutes=5)
+        )
+        return job
+
+    def _edit_times(self, segment, start_time, end_time):
+        """Người dùng lưu form trong lúc worker đang cắt"""
+        segment.refresh_from_db()
+        result = self.video.sync_segments([
+            {'id': str(s.pk), 'version': s.version, 'start_time': start_time, 'end_time': end_time}
+            if s.pk == segment.pk else {'id': str(s.pk)}
+            for s in self.video.segments.order_by('position')
+        ])
+        self.assertEqual(result['conflicts'], [])
+
+    def test_segment_job_keeps_edited_times(self):
+        job = self._running_job(jobs.enqueue_segment_job(self.video, 0, 1, 3, segment=self.segment))
+
+        def process(*args, **kwargs):
+            self._edit_times(self.segment, 5, 8)
+            return {'output_link': 'outputs/0.mp4', 'cut_mode': 'copy'}
+
+        with _fake_processor(process_segment=process):
+            self.assertEqual(jobs.run_job(job.pk, 'w1'), 'done')
+
+        self.segment.refresh_from_db()
+        self.assertEqual((self.segment.start_time, self.segment.end_time), (5, 8))
+        self.assertIsNone(self.segment.minio_output_link)
+        self.assertEqual(self.segment.status, 'pending')
+        self.assertTrue(ProcessingJob.objects.get(pk=job.pk).result['stale'])
+
+    def test_all_segments_job_drops_only_edited_results(self):
+        second = Segment.objects.create(video=self.video, position=1, start_time=4, end_time=6)
+        job = self._running_job(jobs.enqueue_all_segments_job(self.video))
+
+        def process_all(input_path, segments, cut_mode=None):
+            self._edit_times(second, 10, 12)
+            return [
+                {'segment_index': position, 'success': True, 'output_link': f'outputs/{position}.mp4',
+                 'cut_mode': 'copy', 'error': None}
+                for position, start_time, end_time in segments
+            ]
+
+        with _fake_processor(process_all_segments=process_all):
+            self.assertEqual(jobs.run_job(job.pk, 'w1'), 'done')
+
+        first = Segment.objects.get(pk=self.segment.pk)
+        self.assertEqual((first.status, first.minio_output_link), ('completed', 'outputs/0.mp4'))
+        second.refresh_from_db()
+        self.assertEqual((second.start_time, second.end_time), (10, 12))
+        self.assertEqual((second.status, second.minio_output_link), ('pending', None))
+
+        results = {item['segment_id']: item for item in ProcessingJob.objects.get(pk=job.pk).result['results']}
+        self.assertTrue(results[str(second.pk)]['stale'])
+        self.assertFalse(results[str(self.segment.pk)].get('stale'))
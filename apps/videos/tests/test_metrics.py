@@ -0,0 +1,56 @@
+"""
+Test metrics Prometheus: text format, cộng dồn số liệu từ nhiều process
+"""
+import json
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.videos import metrics
+
+
+class RenderTests(SimpleTestCase):
+
+    def setUp(self):
+        metrics._registry.reset()
+        self.addCleanup(metrics._registry.reset)
+
+    @override_settings(METRICS_DIR='')
+    def test_text_format(self):
+        metrics.observe('video_encode_fps', 30, kind='segment')
+        metrics.observe('video_encode_fps', 7, kind='segment')
+        metrics.inc('video_jobs_finished_total', 2, kind='segment', status='done')
+
+        text = metrics.render(gauges=[
+            ('video_jobs_queued', 'Queued jobs', [({'kind': 'a"b\\c'}, 3)]),
+        ])
+        lines = text.splitlines()
+
+        self.assertTrue(text.endswith('\n'))
+        self.assertIn('# TYPE video_encode_fps histogram', lines)
+        self.assertIn('video_encode_fps_bucket{kind="segment",le="5.0"} 0', lines)
+        self.assertIn('video_encode_fps_bucket{kind="segment",le="10.0"} 1', lines)
+        self.assertIn('video_encode_fps_bucket{kind="segment",le="50.0"} 2', lines)
+        self.assertIn('video_encode_fps_bucket{kind="segment",le="+Inf"} 2', lines)
+        self.assertIn('video_encode_fps_sum{kind="segment"} 37.0', lines)
+        self.assertIn('video_encode_fps_count{kind="segment"} 2', lines)
+        self.assertIn('video_jobs_finished_total{kind="segment",status="done"} 2', lines)
+        self.assertIn('# TYPE video_jobs_queued gauge', lines)
+        self.assertIn('video_jobs_queued{kind="a\\"b\\\\c"} 3', lines)
+        # Metric chưa có số liệu vẫn có HELP/TYPE
+        self.assertIn('# TYPE minio_request_errors_total counter', lines)
+
+    def test_sums_files_of_all_processes(self):
+        metrics_dir = tempfile.mkdtemp(prefix='metrics_test_')
+        self.addCleanup(shutil.rmtree, metrics_dir, ignore_errors=True)
+        key = metrics._registry._key('minio_request_errors_total', {'op': 'get'})
+        with open(os.path.join(metrics_dir, 'other_1.json'), 'w') as f:
+            json.dump({key: 4}, f)
+
+        with override_settings(METRICS_DIR=metrics_dir):
+            metrics.inc('minio_request_errors_total', op='get')
+            text = metrics.render()
+
+        self.assertIn('minio_request_errors_total{op="get"} 5\n', text)
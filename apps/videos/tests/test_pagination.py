@@ -0,0 +1,119 @@
+"""
+Test keyset pagination: cursor đi tới/lùi, thứ tự ổn định khi trùng giá trị
+"""
+import uuid
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.videos.models import VideoProfile, video_progress_expression
+from apps.videos.pagination import keyset_paginate, _keyset_filter, _encode_cursor, _decode_cursor
+
+
+NEWEST_FIRST = [('created_at', True), ('id', True)]
+CONVERTERS = {'created_at': parse_datetime}
+
+
+@override_settings(LIST_PAGE_SIZE=4, LIST_MAX_PAGE_SIZE=10)
+class KeysetPaginateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        base = timezone.now()
+        videos = VideoProfile.objects.bulk_create(
+            VideoProfile(title=f'video {i}', total_segments=i % 3, processed_segments=i % 2 if i % 3 else 0)
+            for i in range(11)
+        )
+        # Nhiều video trùng created_at: thứ tự phải phân xử bằng id
+        for i, video in enumerate(videos):
+            VideoProfile.objects.filter(pk=video.pk).update(created_at=base - timedelta(minutes=i // 3))
+
+    def _walk(self, queryset, ordering, converters=CONVERTERS):
+        """Đi hết các trang bằng next_cursor, rồi quay lại bằng previous_cursor"""
+        pages = [keyset_paginate(queryset, ordering, converters=converters)]
+        while pages[-1].has_next:
+            pages.append(keyset_paginate(queryset, ordering, cursor=pages[-1].next_cursor, converters=converters))
+        forward = [video.pk for page in pages for video in page]
+
+        backward = []
+        page = pages[-1]
+        while page.has_previous:
+            page = keyset_paginate(queryset, ordering, cursor=page.previous_cursor, converters=converters)
+            backward = [video.pk for video in page] + backward
+        backward += [video.pk for video in pages[-1]]
+        return pages, forward, backward
+
+    def test_walks_all_rows_in_order(self):
+        queryset = VideoProfile.objects.all()
+        pages, forward, backward = self._walk(queryset, NEWEST_FIRST)
+
+        expected = list(queryset.order_by('-created_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+        self.assertEqual([len(page) for page in pages], [4, 4, 3])
+        self.assertFalse(pages[0].has_previous)
+        self.assertFalse(pages[-1].has_next)
+
+    def test_ascending_ordering(self):
+        queryset = VideoProfile.objects.all()
+        _, forward, backward = self._walk(queryset, [('created_at', False), ('id', False)])
+
+        expected = list(queryset.order_by('created_at', 'id').values_list('pk', flat=True))
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+
+    def test_leading_sort_column_with_ties(self):
+        queryset = VideoProfile.objects.all()
+        for descending in (True, False):
+            ordering = [('total_segments', descending)] + [(field, descending) for field, _ in NEWEST_FIRST]
+            _, forward, backward = self._walk(queryset, ordering)
+
+            prefix = '-' if descending else ''
+            expected = list(
+                queryset.order_by(f'{prefix}total_segments', f'{prefix}created_at', f'{prefix}id')
+                .values_list('pk', flat=True)
+            )
+            self.assertEqual(forward, expected)
+            self.assertEqual(backward, expected)
+
+    def test_annotated_progress_ordering(self):
+        queryset = VideoProfile.objects.annotate(progress=video_progress_expression())
+        ordering = [('progress', True)] + NEWEST_FIRST
+        _, forward, _ = self._walk(queryset, ordering, dict(CONVERTERS, progress=float))
+
+        expected = list(queryset.order_by('-progress', '-created_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(forward, expected)
+
+    def test_invalid_cursor_returns_first_page(self):
+        queryset = VideoProfile.objects.all()
+        first = keyset_paginate(queryset, NEWEST_FIRST, converters=CONVERTERS)
+
+        for cursor in ('not-a-cursor', _encode_cursor(['2024-01-01T00:00:00+00:00'], 'next')):
+            page = keyset_paginate(queryset, NEWEST_FIRST, cursor=cursor, converters=CONVERTERS)
+            self.assertEqual([video.pk for video in page], [video.pk for video in first])
+            self.assertFalse(page.has_previous)
+
+
+class CursorTests(TestCase):
+
+    def test_cursor_round_trip(self):
+        cursor = _encode_cursor([3, 'abc'], 'prev')
+        self.assertNotIn('=', cursor)
+        self.assertEqual(_decode_cursor(cursor), ([3, 'abc'], 'prev'))
+
+    def test_bad_cursor_direction(self):
+        self.assertEqual(_decode_cursor(_encode_cursor([1], 'sideways')), (None, None))
+
+    def test_filter_adds_leading_range_bound(self):
+        """Điều kiện thừa trên cột đầu để Postgres bắt đầu index scan từ cursor"""
+        where = str(VideoProfile.objects.filter(
+            _keyset_filter(NEWEST_FIRST, [timezone.now(), uuid.uuid4()], reverse=False)
+        ).query)
+        self.assertIn('"created_at" <=', where)
+
+        where = str(VideoProfile.objects.filter(
+            _keyset_filter(NEWEST_FIRST, [timezone.now(), uuid.uuid4()], reverse=True)
+        ).query)
+        self.assertIn('"created_at" >=', where)
@@ -0,0 +1,112 @@
+"""
+Test đọc metadata MP4 từ box moov (file MP4 tổng hợp, không cần ffprobe)
+"""
+import struct
+
+from django.test import SimpleTestCase
+
+from apps.videos.probe import ProbeError, parse_moov, probe_mp4
+
+
+def box(box_type, *children):
+    payload = b''.join(children)
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def header_timing(box_type, timescale, duration, version=0):
+    """mvhd/mdhd: version/flags, creation/modification time, timescale, duration"""
+    if version == 1:
+        return box(box_type, struct.pack('>B3xQQIQ', 1, 0, 0, timescale, duration))
+    return box(box_type, struct.pack('>B3xIIII', 0, 0, 0, timescale, duration))
+
+
+def track(handler, fourcc, timescale, duration, sample_counts=(), size=None, mdhd_version=0):
+    sample_entry = struct.pack('>I4s', 8, fourcc)
+    if size:
+        # VisualSampleEntry: reserved/data_reference_index/pre_defined, rồi width/height
+        sample_entry = struct.pack('>I4s24xHH50x', 86, fourcc, *size)
+    return box(
+        b'trak',
+        box(b'tkhd', bytes(76)),
+        box(
+            b'mdia',
+            header_timing(b'mdhd', timescale, duration, mdhd_version),
+            box(b'hdlr', struct.pack('>8x4s12x', handler.encode())),
+            box(b'minf', box(
+                b'stbl',
+                box(b'stsd', struct.pack('>4xI', 1), sample_entry),
+                box(b'stts', struct.pack('>4xI', len(sample_counts)),
+                    *(struct.pack('>II', count, 512) for count in sample_counts)),
+            )),
+        ),
+    )
+
+
+def moov(mvhd_duration=10000):
+    return box(
+        b'moov',
+        header_timing(b'mvhd', 1000, mvhd_duration),
+        track('vide', b'avc1', 12800, 128000, sample_counts=(200, 50), size=(1920, 1080)),
+        track('soun', b'mp4a', 44100, 441000, mdhd_version=1),
+    )
+
+
+class ParseMoovTests(SimpleTestCase):
+
+    def test_reads_video_and_audio_tracks(self):
+        self.assertEqual(parse_moov(moov()), {
+            'duration': 10.0,
+            'width': 1920,
+            'height': 1080,
+            'fps': 25.0,
+            'video_codec': 'h264',
+            'audio_codec': 'aac',
+        })
+
+    def test_duration_falls_back_to_video_track(self):
+        self.assertEqual(parse_moov(moov(mvhd_duration=0))['duration'], 10.0)
+
+    def test_missing_moov(self):
+        with self.assertRaises(ProbeError):
+            parse_moov(box(b'free', b'x' * 8))
+
+
+class ProbeMp4Tests(SimpleTestCase):
+
+    def _reader(self, data):
+        reads = []
+
+        def read_range(offset, length):
+            reads.append((offset, length))
+            return data[offset:offset + length]
+        return read_range, reads
+
+    def test_faststart_file_reads_head_once(self):
+        data = box(b'ftyp', b'isom') + moov() + box(b'mdat', b'\0' * 1000)
+        read_range, reads = self._reader(data)
+
+        info = probe_mp4(read_range, len(data))
+
+        self.assertEqual(len(reads), 1)
+        self.assertEqual((info['duration'], info['file_size']), (10.0, len(data)))
+        self.assertEqual(info['bitrate'], int(len(data) * 8 / 10))
+
+    def test_moov_after_large_mdat(self):
+        # mdat dùng size 64 bit (size=1), lớn hơn phần đầu file đọc lần đầu
+        mdat_payload = b'\0' * (300 * 1024)
+        mdat = struct.pack('>I4sQ', 1, b'mdat', 16 + len(mdat_payload)) + mdat_payload
+        data = box(b'ftyp', b'isom') + mdat + moov()
+        read_range, reads = self._reader(data)
+
+        info = probe_mp4(read_range, len(data))
+
+        self.assertEqual(info['video_codec'], 'h264')
+        # Chỉ đọc header của box sau mdat rồi đọc moov, không đọc phần mdat
+        self.assertEqual(sum(length for _, length in reads[1:]), 16 + len(moov()))
+
+    def test_not_an_mp4(self):
+        data = b'\x00\x00\x00\x02garbage'
+        read_range, _ = self._reader(data)
+
+        with self.assertRaises(ProbeError):
+            probe_mp4(read_range, len(data))
@@ -0,0 +1,122 @@
+"""
+Test engine render prompt: placeholder, ngoặc escape, giá trị segment
+"""
+import json
+
+from django.test import SimpleTestCase, TestCase, RequestFactory
+
+from apps.videos import views
+from apps.videos.models import VideoProfile, PromptTemplate, Segment
+from apps.videos.prompts import (
+    CompiledPrompt, build_prompt_values, compile_template, find_unknown_placeholders, format_timecode, render_prompt
+)
+
+
+class CompiledPromptTests(SimpleTestCase):
+
+    def test_renders_known_placeholders(self):
+        prompt = render_prompt('Video {video_title}: {youtube_link}', youtube_link='https://youtu.be/x')
+        self.assertEqual(prompt, 'Video : https://youtu.be/x')
+
+    def test_unknown_placeholders_kept_as_text(self):
+        compiled = CompiledPrompt('{youtube_link} {foo} {foo} {bar}')
+        self.assertEqual(compiled.placeholders, ['youtube_link'])
+        self.assertEqual(compiled.unknown, ['foo', 'bar'])
+        self.assertEqual(compiled.render({'youtube_link': 'L'}), 'L {foo} {foo} {bar}')
+
+    def test_double_braces_are_literal(self):
+        source = 'JSON: {{"a": 1}} {{youtube_link}} {youtube_link} {{{youtube_link}}}'
+        compiled = CompiledPrompt(source)
+        self.assertEqual(compiled.placeholders, ['youtube_link'])
+        self.assertEqual(compiled.unknown, [])
+        self.assertEqual(
+            compiled.render({'youtube_link': 'L'}),
+            'JSON: {{"a": 1}} {{youtube_link}} L {{L}}'
+        )
+
+    def test_double_braces_without_placeholders(self):
+        self.assertEqual(render_prompt('{{video_title}} {x'), '{{video_title}} {x')
+        self.assertEqual(find_unknown_placeholders('{{nope}} {nope}'), ['nope'])
+
+    def test_stray_braces(self):
+        self.assertEqual(render_prompt('} {youtube_link} {', youtube_link='L'), '} L {')
+
+    def test_compile_cache_by_content(self):
+        self.assertIs(compile_template('{youtube_link}'), compile_template('{youtube_link}'))
+
+
+class BuildPromptValuesTests(SimpleTestCase):
+
+    def test_dict_segment_values_are_coerced(self):
+        values = build_prompt_values(segment={'position': '1', 'start_time': '61.5', 'end_time': 75})
+        self.assertEqual(values['segment_index'], '2')
+        self.assertEqual(values['start_time'], '61.5')
+        self.assertEqual(values['end_time'], '75')
+        self.assertEqual(values['segment_duration'], '13.5')
+        self.assertEqual(values['start_timecode'], format_timecode(61.5))
+
+    def test_dict_segment_empty_values(self):
+        values = build_prompt_values(segment={'position': None, 'start_time': '', 'end_time': 3})
+        self.assertEqual(values['segment_index'], '')
+        self.assertEqual(values['start_time'], '')
+        self.assertNotIn('segment_duration', values)
+
+    def test_dict_segment_invalid_values(self):
+        for segment in ({'start_time': 'abc'}, {'end_time': [1]}, {'position': '1.5'}, {'start_time': 'inf'}):
+            with self.subTest(segment=segment), self.assertRaises(ValueError):
+                build_prompt_values(segment=segment)
+
+    def test_extra_values(self):
+        values = build_prompt_values(youtube_tags=['a', 'b'], youtube_title=None, video_duration=12.0)
+        self.assertEqual(values['youtube_tags'], 'a, b')
+        self.assertNotIn('youtube_title', values)
+        self.assertEqual(values['video_duration'], '12')
+
+
+class PromptModelTests(TestCase):
+
+    def test_segment_instance_values(self):
+        video = VideoProfile.objects.create(title='Clip', notes='n', duration=90)
+        segment = Segment.objects.create(video=video, position=0, start_time=3723.5, end_time=3730)
+        template = PromptTemplate.objects.create(
+            name='t', template_content='{video_title} #{segment_index} {start_timecode}-{end_timecode}'
+        )
+
+        self.assertEqual(
+            render_prompt(template, video, segment),
+            f'Clip #1 {format_timecode(3723.5)}-{format_timecode(3730)}'
+        )
+
+
+class GeneratePromptViewTests(TestCase):
+
+    def setUp(self):
+        self.template = PromptTemplate.objects.create(
+            name='t', template_content='{{raw}} {video_title} {segment_index} {start_time}-{end_time}'
+        )
+        self.video = VideoProfile.objects.create(title='Clip')
+
+    def _post(self, **body):
+        body.setdefault('template_id', str(self.template.pk))
+        request = RequestFactory().post('/videos/api/generate-prompt/', json.dumps(body), content_type='application/json')
+        response = views.generate_prompt(request)
+        return response.status_code, json.loads(response.content)
+
+    def test_renders_video_and_segment(self):
+        status, data = self._post(
+            video_id=str(self.video.pk), segment={'position': 2, 'start_time': '1.5', 'end_time': 4}
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(data['prompt'], '{{raw}} Clip 3 1.5-4')
+
+    def test_invalid_segment_returns_400(self):
+        status, data = self._post(segment={'start_time': 'abc', 'end_time': 4})
+        self.assertEqual(status, 400)
+        self.assertIn('start_time', data['error'])
+
+        status, _ = self._post(segment=[1, 2])
+        self.assertEqual(status, 400)
+
+    def test_missing_template_returns_400(self):
+        status, _ = self._post(template_id=None)
+        self.assertEqual(status, 400)
@@ -0,0 +1,65 @@
+"""
+Test đồng bộ segments từ form: optimistic locking theo version, đếm lại counters
+"""
+from django.test import TestCase
+
+from apps.videos.models import VideoProfile, Segment
+
+
+class SyncSegmentsTests(TestCase):
+
+    def setUp(self):
+        self.video = VideoProfile.objects.create(title='video', duration=60)
+        self.first = Segment.objects.create(video=self.video, position=0, start_time=0, end_time=5)
+        self.second = Segment.objects.create(video=self.video, position=1, start_time=10, end_time=15)
+
+    def _item(self, segment, **values):
+        return dict({'id': str(segment.pk), 'version': segment.version}, **values)
+
+    def test_stale_version_is_a_conflict(self):
+        # Worker vừa ghi output sau khi form được mở
+        Segment.objects.filter(pk=self.first.pk).update(
+            minio_output_link='outputs/0.mp4', version=self.first.version + 1
+        )
+
+        result = self.video.sync_segments([
+            self._item(self.first, start_time=1, end_time=4),
+            self._item(self.second, prompt='edited'),
+        ])
+
+        self.assertEqual(result['conflicts'], [0])
+        self.assertEqual(result['updated'], 1)
+        first = Segment.objects.get(pk=self.first.pk)
+        self.assertEqual((first.start_time, first.minio_output_link), (0, 'outputs/0.mp4'))
+        self.assertEqual(Segment.objects.get(pk=self.second.pk).prompt, 'edited')
+
+    def test_unchanged_rows_are_not_written(self):
+        result = self.video.sync_segments([self._item(self.first, start_time=0), self._item(self.second)])
+
+        self.assertEqual((result['updated'], result['conflicts']), (0, []))
+        self.assertEqual(Segment.objects.get(pk=self.first.pk).version, self.first.version)
+
+    def test_create_delete_and_counters(self):
+        result = self.video.sync_segments([
+            self._item(self.second, minio_output_link='outputs/1.mp4'),
+            {'start_time': 20, 'end_time': 25},
+        ])
+
+        self.assertEqual((result['created'], result['updated'], result['deleted'], result['moved']), (1, 1, 1, 1))
+        self.assertEqual(Segment.objects.get(pk=self.second.pk).status, 'completed')
+        self.assertEqual((self.video.total_segments, self.video.processed_segments), (2, 1))
+        video = VideoProfile.objects.get(pk=self.video.pk)
+        self.assertEqual((video.total_segments, video.processed_segments), (2, 1))
+
+
+class RefreshSegmentCountersTests(TestCase):
+
+    def test_counts_segments_with_output(self):
+        video = VideoProfile.objects.create(title='video', total_segments=9, processed_segments=9)
+        for position, link in enumerate(['outputs/0.mp4', '', None]):
+            Segment.objects.create(video=video, position=position, start_time=position, end_time=position + 1,
+                                   minio_output_link=link)
+
+        self.assertEqual(VideoProfile.refresh_segment_counters(video.pk), (3, 1))
+        video.refresh_from_db()
+        self.assertEqual((video.total_segments, video.processed_segments), (3, 1))
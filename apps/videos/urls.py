@@ -11,19 +11,29 @@ urlpatterns = [
     path('<uuid:pk>/edit/', views.video_edit, name='video_edit'),
     path('<uuid:pk>/delete/', views.video_delete, name='video_delete'),
     # path('<uuid:pk>/process/', views.video_process, name='video_process'),
-    path('<uuid:pk>/preview/', views.video_preview, name='video_preview'),
+    path('<uuid:pk>/preview/index.m3u8', views.video_preview_playlist, name='video_preview_playlist'),
+    path('<uuid:pk>/thumbnails.vtt', views.video_thumbnails_vtt, name='video_thumbnails_vtt'),
     
     # Prompt Template URLs
     path('prompts/', views.prompt_list, name='prompt_list'),
     path('prompts/create/', views.prompt_create, name='prompt_create'),
-    path('prompts/<int:pk>/', views.prompt_detail, name='prompt_detail'),
-    path('prompts/<int:pk>/edit/', views.prompt_edit, name='prompt_edit'),
-    path('prompts/<int:pk>/delete/', views.prompt_delete, name='prompt_delete'),
+    path('prompts/<uuid:pk>/', views.prompt_detail, name='prompt_detail'),
+    path('prompts/<uuid:pk>/edit/', views.prompt_edit, name='prompt_edit'),
+    path('prompts/<uuid:pk>/delete/', views.prompt_delete, name='prompt_delete'),
     
-    # Prompt Generator URL
-    path('prompts/generate/', views.prompt_generate, name='prompt_generate'),
-    
-    # Video Processing URLs
-    path('<uuid:pk>/cut/', views.video_cut, name='video_cut'),
-    path('<uuid:pk>/download/', views.video_download, name='video_download'),
+    # AJAX/API URLs
+    path('api/generate-prompt/', views.generate_prompt, name='api_generate_prompt'),
+    path('api/generate-prompts/', views.generate_prompts_batch, name='api_generate_prompts_batch'),
+    path('api/process-segment/', views.process_video_segment, name='api_process_segment'),
+    path('api/process-all-segments/', views.process_all_segments, name='api_process_all_segments'),
+    path('api/jobs/<uuid:job_id>/', views.job_status, name='api_job_status'),
+    path('api/videos/<uuid:pk>/jobs/', views.video_jobs, name='api_video_jobs'),
+    path('api/videos/<uuid:pk>/progress/', views.video_progress_stream, name='api_video_progress'),
+    path('api/videos/<uuid:pk>/preview/', views.regenerate_preview, name='api_regenerate_preview'),
+    path('api/videos/<uuid:pk>/thumbnails/', views.regenerate_thumbnails, name='api_regenerate_thumbnails'),
+    path('api/videos/<uuid:pk>/segments/bulk/', views.bulk_segments, name='api_bulk_segments'),
+    path('api/videos/<uuid:pk>/segments/process/', views.process_segments_bulk, name='api_process_segments_bulk'),
+    path('api/add-segment/', views.add_segment, name='api_add_segment'),
+    path('api/delete-segment/', views.delete_segment, name='api_delete_segment'),
+    path('api/system/pools/', views.pool_stats, name='api_pool_stats'),
 ]
\ No newline at end of file
@@ -2,16 +2,126 @@
 Utility functions for Minio and MoviePy operations
 """
 import os
+import json
+import math
+import shutil
+import socket
+import subprocess
 import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import certifi
+import urllib3
+from urllib3.connection import HTTPConnection
 from minio import Minio
 from minio.error import S3Error
+from minio.helpers import MAX_MULTIPART_COUNT, MIN_PART_SIZE
 from django.conf import settings
 from moviepy.editor import VideoFileClip
+from moviepy.config import get_setting
+from proglog import ProgressBarLogger
 import logging
 
+from .encoding import get_encoding_profile
+from .input_cache import InputVideoCache
+from .probe import probe_mp4, ProbeError
+from .prompts import render_prompt
+from .storage import FilesystemObjectStore
+from . import metrics, profiling
+
 logger = logging.getLogger(__name__)
 
 
+def build_minio_http_client():
+    """
+    Tạo urllib3.PoolManager cho Minio client theo settings
+    
+    Pool size tối thiểu bằng settings.MINIO_TRANSFER_THREADS để upload/download
+    song song dùng lại connection; bật TCP keep-alive cho connection rảnh.
+    
+    Returns:
+        urllib3.PoolManager
+    """
+    socket_options = list(HTTPConnection.default_socket_options)
+    if settings.MINIO_HTTP_TCP_KEEPALIVE > 0:
+        socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            socket_options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, settings.MINIO_HTTP_TCP_KEEPALIVE))
+            socket_options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, settings.MINIO_HTTP_TCP_KEEPALIVE))
+    
+    return urllib3.PoolManager(
+        maxsize=max(settings.MINIO_HTTP_POOL_SIZE, settings.MINIO_TRANSFER_THREADS),
+        block=settings.MINIO_HTTP_POOL_BLOCK,
+        timeout=urllib3.util.Timeout(
+            connect=settings.MINIO_HTTP_CONNECT_TIMEOUT,
+            read=settings.MINIO_HTTP_READ_TIMEOUT
+        ),
+        retries=urllib3.Retry(
+            total=settings.MINIO_HTTP_RETRIES,
+            backoff_factor=settings.MINIO_HTTP_BACKOFF_FACTOR,
+            status_forcelist=[500, 502, 503, 504]
+        ),
+        cert_reqs='CERT_REQUIRED',
+        ca_certs=os.environ.get('SSL_CERT_FILE') or certifi.where(),
+        socket_options=socket_options,
+    )
+
+
+def get_temp_video_dir():
+    """Thư mục tạm cho xử lý video (settings.TEMP_VIDEO_DIR)"""
+    os.makedirs(settings.TEMP_VIDEO_DIR, exist_ok=True)
+    return settings.TEMP_VIDEO_DIR
+
+
+def preview_object_prefix(minio_input_path):
+    """Prefix trên Minio chứa proxy/HLS preview, nằm cạnh file input"""
+    return f"{os.path.splitext(minio_input_path)[0]}_preview"
+
+
+def thumbnails_object_prefix(minio_input_path):
+    """Prefix trên Minio chứa sprite sheet thumbnail, nằm cạnh file input"""
+    return f"{os.path.splitext(minio_input_path)[0]}_thumbnails"
+
+
+def _vtt_timestamp(seconds):
+    """Thời điểm dạng HH:MM:SS.mmm cho WebVTT"""
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    return f"{hours:02d}:{minutes:02d}:{millis // 1000:02d}.{millis % 1000:03d}"
+
+
+def build_thumbnails_vtt(index, sprite_urls=None):
+    """
+    Tạo index WebVTT (media fragment #xywh=) từ index JSON của sprite sheet
+    
+    Args:
+        index: Dict index (interval, duration, width, height, columns, rows, count, sprites)
+        sprite_urls: URL thay cho tên file sprite (vd: presigned URL), None = tên file tương đối
+    
+    Returns:
+        str: Nội dung file .vtt
+    """
+    sprites = sprite_urls or index['sprites']
+    per_sheet = index['columns'] * index['rows']
+    lines = ['WEBVTT', '']
+    for i in range(index['count']):
+        start = i * index['interval']
+        end = min(start + index['interval'], index['duration']) if index['duration'] else start + index['interval']
+        sheet, cell = divmod(i, per_sheet)
+        row, column = divmod(cell, index['columns'])
+        lines.append(f"{_vtt_timestamp(start)} --> {_vtt_timestamp(max(end, start + 0.001))}")
+        lines.append(
+            f"{sprites[sheet]}#xywh={column * index['width']},{row * index['height']},"
+            f"{index['width']},{index['height']}"
+        )
+        lines.append('')
+    return '\n'.join(lines)
+
+
 class MinioClient:
     """Singleton Minio Client"""
     
@@ -25,13 +135,24 @@ class MinioClient:
     
     def _initialize(self):
         """Initialize Minio client"""
-        self.client = Minio(
-            settings.MINIO_ENDPOINT,
-            access_key=settings.MINIO_ACCESS_KEY,
-            secret_key=settings.MINIO_SECRET_KEY,
-            secure=settings.MINIO_USE_SSL
-        )
+        if settings.MINIO_BACKEND == 'filesystem':
+            client = FilesystemObjectStore(settings.MINIO_FILESYSTEM_ROOT)
+        else:
+            client = Minio(
+                settings.MINIO_ENDPOINT,
+                access_key=settings.MINIO_ACCESS_KEY,
+                secret_key=settings.MINIO_SECRET_KEY,
+                secure=settings.MINIO_USE_SSL,
+                region=settings.MINIO_REGION,
+                http_client=build_minio_http_client()
+            )
+        self.client = _InstrumentedClient(client)
         self.bucket_name = settings.MINIO_BUCKET
+        
+        # Cache presigned URL: (object_name, expires) -> (url, reuse_until), LRU
+        self._presigned_cache = OrderedDict()
+        self._presigned_lock = threading.Lock()
+        self._presigned_stats = {'hits': 0, 'misses': 0}
         self._ensure_bucket_exists()
     
     def _ensure_bucket_exists(self):
@@ -43,26 +164,52 @@ class MinioClient:
         except S3Error as e:
             logger.error(f"Error creating bucket: {e}")
     
-    def upload_file(self, file_path, object_name):
+    def _part_size(self, object_size):
+        """Part size theo settings, tăng lên nếu file cần quá MAX_MULTIPART_COUNT part"""
+        part_size = max(settings.MINIO_PART_SIZE, MIN_PART_SIZE)
+        min_part_size = math.ceil(object_size / MAX_MULTIPART_COUNT)
+        if part_size < min_part_size:
+            part_size = math.ceil(min_part_size / MIN_PART_SIZE) * MIN_PART_SIZE
+        return part_size
+    
+    def _log_transfer(self, action, object_name, size, started):
+        """Log tốc độ truyền (MB/s) của 1 lần upload/download"""
+        elapsed = max(time.monotonic() - started, 1e-6)
+        logger.info(
+            f"{action} {object_name}: {size / 1024 ** 2:.1f} MB in {elapsed:.2f}s "
+            f"({size / 1024 ** 2 / elapsed:.1f} MB/s)"
+        )
+    
+    def upload_file(self, file_path, object_name, content_type='application/octet-stream'):
         """
         Upload file lên Minio
         
+        File lớn hơn 1 part được upload multipart, các part upload song song
+        (settings.MINIO_PART_SIZE, settings.MINIO_TRANSFER_THREADS).
+        
         Args:
             file_path: Đường dẫn file local
             object_name: Tên object trên Minio
+            content_type: Content type của object
         
         Returns:
             str: Object name nếu thành công, None nếu thất bại
         """
+        started = time.monotonic()
         try:
+            size = os.path.getsize(file_path)
             self.client.fput_object(
                 self.bucket_name,
                 object_name,
                 file_path,
+                content_type=content_type,
+                part_size=self._part_size(size),
+                num_parallel_uploads=max(1, settings.MINIO_TRANSFER_THREADS),
             )
-            logger.info(f"Uploaded {file_path} to {object_name}")
+            self.invalidate_presigned_url(object_name)
+            self._log_transfer('Uploaded', object_name, size, started)
             return object_name
-        except S3Error as e:
+        except (S3Error, OSError, ValueError) as e:
             logger.error(f"Error uploading file: {e}")
             return None
     
@@ -70,6 +217,9 @@ class MinioClient:
         """
         Download file từ Minio
         
+        Object lớn hơn 1 part được tải bằng nhiều ranged GET song song, ghi
+        thẳng vào đúng vị trí trong file đích.
+        
         Args:
             object_name: Tên object trên Minio
             file_path: Đường dẫn lưu file local
@@ -77,39 +227,262 @@ class MinioClient:
         Returns:
             str: File path nếu thành công, None nếu thất bại
         """
+        started = time.monotonic()
         try:
-            self.client.fget_object(
+            stat = self.client.stat_object(self.bucket_name, object_name)
+            part_size = self._part_size(stat.size)
+            threads = max(1, settings.MINIO_TRANSFER_THREADS)
+            
+            if threads == 1 or stat.size <= part_size:
+                self.client.fget_object(
+                    self.bucket_name,
+                    object_name,
+                    file_path,
+                )
+            else:
+                self._download_parallel(object_name, file_path, stat, part_size, threads)
+            
+            self._log_transfer('Downloaded', object_name, stat.size, started)
+            return file_path
+        except (S3Error, OSError) as e:
+            logger.error(f"Error downloading file: {e}")
+            return None
+    
+    def _download_parallel(self, object_name, file_path, stat, part_size, threads):
+        """Tải object theo từng part (ranged GET) bằng thread pool rồi ghép vào file"""
+        temp_path = f"{file_path}.part"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        
+        def download_part(offset):
+            length = min(part_size, stat.size - offset)
+            # If-Match: các part phải cùng 1 phiên bản object
+            response = self.client.get_object(
                 self.bucket_name,
                 object_name,
-                file_path,
+                offset=offset,
+                length=length,
+                request_headers={'If-Match': stat.etag},
             )
-            logger.info(f"Downloaded {object_name} to {file_path}")
-            return file_path
+            try:
+                position = offset
+                for chunk in response.stream(1024 ** 2):
+                    os.pwrite(fd, chunk, position)
+                    position += len(chunk)
+            finally:
+                response.close()
+                response.release_conn()
+            if position - offset != length:
+                raise IOError(f"Short read at offset {offset}: {position - offset}/{length} bytes")
+        
+        try:
+            os.ftruncate(fd, stat.size)
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                # list() để raise lỗi của part đầu tiên bị lỗi
+                list(executor.map(download_part, range(0, stat.size, part_size)))
+            os.close(fd)
+            fd = None
+            os.replace(temp_path, file_path)
+        finally:
+            if fd is not None:
+                os.close(fd)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def upload_stream(self, stream, object_name, content_type='video/mp4'):
+        """
+        Upload dữ liệu từ stream chưa biết trước độ dài (vd: stdout của ffmpeg)
+        
+        Dữ liệu được gom thành từng part (settings.MINIO_PART_SIZE) và upload
+        multipart, không cần ghi ra file tạm.
+        
+        Args:
+            stream: File-like object có read(size)
+            object_name: Tên object trên Minio
+            content_type: Content type của object
+        
+        Returns:
+            str: Object name nếu thành công, None nếu thất bại
+        """
+        started = time.monotonic()
+        reader = _CountingReader(stream)
+        try:
+            self.client.put_object(
+                self.bucket_name,
+                object_name,
+                reader,
+                length=-1,
+                part_size=max(settings.MINIO_PART_SIZE, MIN_PART_SIZE),
+                content_type=content_type,
+            )
+            self.invalidate_presigned_url(object_name)
+            self._log_transfer('Uploaded stream', object_name, reader.bytes_read, started)
+            return object_name
+        except (S3Error, OSError, ValueError) as e:
+            logger.error(f"Error uploading stream: {e}")
+            return None
+    
+    def stat_file(self, object_name):
+        """
+        Lấy thông tin object (size, etag, ...) trên Minio
+        
+        Args:
+            object_name: Tên object trên Minio
+        
+        Returns:
+            Object: Thông tin object nếu tồn tại, None nếu lỗi
+        """
+        try:
+            return self.client.stat_object(self.bucket_name, object_name)
         except S3Error as e:
-            logger.error(f"Error downloading file: {e}")
+            logger.error(f"Error getting object info: {e}")
             return None
     
-    def get_presigned_url(self, object_name, expires=3600):
+    def get_object_range(self, object_name, offset, length):
+        """
+        Đọc 1 đoạn byte của object (ranged GET), không download cả file
+        
+        Args:
+            object_name: Tên object trên Minio
+            offset: Vị trí byte bắt đầu
+            length: Số byte cần đọc
+        
+        Returns:
+            bytes: Dữ liệu đọc được, None nếu lỗi
+        """
+        response = None
+        try:
+            response = self.client.get_object(
+                self.bucket_name,
+                object_name,
+                offset=offset,
+                length=length
+            )
+            return response.read()
+        except S3Error as e:
+            logger.error(f"Error reading object range: {e}")
+            return None
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
+    
+    def read_file(self, object_name):
+        """
+        Đọc toàn bộ nội dung object nhỏ (vd: playlist HLS)
+        
+        Returns:
+            bytes: Nội dung object, None nếu lỗi
+        """
+        response = None
+        try:
+            response = self.client.get_object(self.bucket_name, object_name)
+            return response.read()
+        except S3Error as e:
+            logger.error(f"Error reading object: {e}")
+            return None
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
+    
+    def get_presigned_url(self, object_name, expires=None):
         """
         Lấy presigned URL cho object
         
+        URL được cache theo (object, expires) và dùng lại cho tới khi chỉ còn
+        settings.MINIO_PRESIGNED_URL_SAFETY_MARGIN giây là hết hạn. Khi đã cấu
+        hình MINIO_REGION thì việc ký không cần request nào tới Minio.
+        
         Args:
             object_name: Tên object trên Minio
-            expires: Thời gian hết hạn (giây)
+            expires: Thời gian hết hạn (giây), mặc định settings.MINIO_PRESIGNED_URL_EXPIRES
         
         Returns:
             str: Presigned URL
         """
+        expires = expires or settings.MINIO_PRESIGNED_URL_EXPIRES
+        key = (object_name, expires)
+        now = time.monotonic()
+        
+        with self._presigned_lock:
+            cached = self._presigned_cache.get(key)
+            if cached and cached[1] > now:
+                self._presigned_cache.move_to_end(key)
+                self._presigned_stats['hits'] += 1
+            else:
+                cached = None
+                self._presigned_stats['misses'] += 1
+        metrics.inc('minio_presigned_cache_requests_total', result='hit' if cached else 'miss')
+        if cached:
+            return cached[0]
+        
         try:
             url = self.client.presigned_get_object(
                 self.bucket_name,
                 object_name,
-                expires=expires
+                expires=timedelta(seconds=expires)
             )
-            return url
         except S3Error as e:
             logger.error(f"Error generating presigned URL: {e}")
             return None
+        
+        # Margin không vượt quá nửa thời hạn để URL ngắn hạn vẫn được cache
+        margin = min(settings.MINIO_PRESIGNED_URL_SAFETY_MARGIN, expires // 2)
+        with self._presigned_lock:
+            self._presigned_cache[key] = (url, now + expires - margin)
+            self._presigned_cache.move_to_end(key)
+            while len(self._presigned_cache) > settings.MINIO_PRESIGNED_URL_CACHE_SIZE:
+                self._presigned_cache.popitem(last=False)
+        return url
+    
+    def invalidate_presigned_url(self, object_name):
+        """Xóa các presigned URL đã cache của object (khi object bị ghi đè/xóa)"""
+        with self._presigned_lock:
+            for key in [key for key in self._presigned_cache if key[0] == object_name]:
+                del self._presigned_cache[key]
+    
+    def presigned_cache_stats(self):
+        """
+        Thống kê cache presigned URL
+        
+        Returns:
+            dict: hits, misses, size, max_size
+        """
+        with self._presigned_lock:
+            return {
+                **self._presigned_stats,
+                'size': len(self._presigned_cache),
+                'max_size': settings.MINIO_PRESIGNED_URL_CACHE_SIZE,
+            }
+    
+    def http_pool_stats(self):
+        """
+        Thống kê các HTTP connection pool của Minio client
+        
+        Returns:
+            list: Mỗi pool (host) gồm maxsize, số connection đã mở, số request,
+                số connection đang rảnh và đang được dùng
+        """
+        stats = []
+        pools = self.client._http.pools
+        with pools.lock:
+            items = list(pools._container.items())
+        for key, pool in items:
+            queue = pool.pool
+            if queue is None:
+                continue
+            # Queue của pool chứa connection rảnh và slot rỗng (None) cho connection chưa mở/đang dùng
+            slots = list(queue.queue)
+            stats.append({
+                'host': f"{key.key_scheme}://{key.key_host}:{key.key_port}",
+                'maxsize': queue.maxsize,
+                'block': pool.block,
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests,
+                'idle_connections': sum(1 for conn in slots if conn is not None),
+                'in_use': queue.maxsize - len(slots),
+            })
+        return stats
     
     def delete_file(self, object_name):
         """
@@ -123,6 +496,7 @@ class MinioClient:
         """
         try:
             self.client.remove_object(self.bucket_name, object_name)
+            self.invalidate_presigned_url(object_name)
             logger.info(f"Deleted {object_name}")
             return True
         except S3Error as e:
@@ -147,21 +521,226 @@ class MinioClient:
             return []
 
 
+class _InstrumentedClient:
+    """Bọc minio.Minio, ghi latency/lỗi của từng loại request vào metrics (và profile của request)"""
+    
+    def __init__(self, client):
+        self._client = client
+    
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        
+        def call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            except Exception:
+                metrics.inc('minio_request_errors_total', operation=name)
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                metrics.observe('minio_request_duration_seconds', elapsed, operation=name)
+                profiling.record_minio_call(name, elapsed)
+        
+        return call
+
+
+class _CountingReader:
+    """Bọc stream để đếm số byte đã đọc (dùng cho log tốc độ upload stream)"""
+    
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes_read = 0
+    
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+class _MoviePyProgressLogger(ProgressBarLogger):
+    """Logger cho MoviePy, chuyển tiến độ ghi frame thành fraction 0..1"""
+    
+    def __init__(self, on_progress):
+        super().__init__()
+        self.on_progress = on_progress
+    
+    def bars_callback(self, bar, attr, value, old_value=None):
+        if bar == 't' and attr == 'index':
+            total = self.bars[bar].get('total')
+            if total:
+                self.on_progress(value / total)
+
+
 class VideoProcessor:
     """Video processing utilities using MoviePy"""
     
-    def __init__(self):
+    CUT_MODE_REENCODE = 'reencode'
+    CUT_MODE_COPY = 'copy'
+    CUT_MODE_SMART = 'smart'
+    CUT_MODES = (CUT_MODE_REENCODE, CUT_MODE_COPY, CUT_MODE_SMART)
+    
+    # Codec/container có thể cắt bằng stream copy
+    STREAM_COPY_CODECS = ('h264',)
+    STREAM_COPY_FORMATS = ('mov', 'mp4', 'm4a', '3gp')
+    
+    # Sai số thời gian (giây) khi so sánh keyframe với mốc cắt
+    KEYFRAME_EPSILON = 0.001
+    
+    # Profile H.264 theo ffprobe -> giá trị -profile:v của libx264
+    H264_PROFILES = {
+        'constrained baseline': 'baseline',
+        'baseline': 'baseline',
+        'main': 'main',
+        'high': 'high',
+        'high 10': 'high10',
+        'high 4:2:2': 'high422',
+        'high 4:4:4 predictive': 'high444',
+    }
+    
+    # Các thuộc tính stream video của output smart cut phải khớp với input
+    SMART_CUT_MATCH_FIELDS = ('codec_name', 'profile', 'level', 'pix_fmt', 'width', 'height', 'time_base')
+    
+    STAGE_DOWNLOAD = 'download'
+    STAGE_ENCODE = 'encode'
+    STAGE_UPLOAD = 'upload'
+    
+    def __init__(self, progress_callback=None, encoding_profile=None):
+        """
+        Args:
+            progress_callback: Hàm callback(stage, percent) nhận tiến độ xử lý,
+                stage là download/encode/upload, percent từ 0 đến 100
+            encoding_profile: Tên encoding profile khi re-encode,
+                None = settings.VIDEO_ENCODING_PROFILE
+        """
+        self.encoding = get_encoding_profile(encoding_profile)
         self.minio_client = MinioClient()
+        self.input_cache = InputVideoCache(self.minio_client)
+        self.progress_callback = progress_callback
+        # (offset, scale) để quy đổi tiến độ của 1 đoạn sang tiến độ cả batch
+        self._progress_scope = (0.0, 1.0)
+        # Số liệu từng stage của lần process_segment/process_all_segments gần nhất
+        self.last_metrics = {}
+    
+    def _report(self, stage, fraction):
+        """Gửi tiến độ (fraction 0..1 trong scope hiện tại) cho callback"""
+        if not self.progress_callback:
+            return
+        offset, scale = self._progress_scope
+        percent = min(100.0, max(0.0, (offset + fraction * scale) * 100))
+        try:
+            self.progress_callback(stage, round(percent, 1))
+        except Exception as e:
+            logger.warning(f"Progress callback failed: {e}")
     
-    def cut_video(self, input_path, output_path, start_time, end_time):
+    def _moviepy_logger(self):
+        """Logger cho MoviePy write_videofile, None nếu không cần báo tiến độ"""
+        if not self.progress_callback:
+            return None
+        return _MoviePyProgressLogger(lambda fraction: self._report(self.STAGE_ENCODE, fraction))
+    
+    def _record_stage(self, stage, started, cut_mode, bytes_moved=None, frames=None, **info):
+        """
+        Ghi thời gian (và bytes, số frame) của 1 stage vào last_metrics và Prometheus metrics
+        
+        Gọi nhiều lần cho cùng stage (vd: upload từng segment của batch) thì cộng dồn.
+        """
+        seconds = time.perf_counter() - started
+        entry = self.last_metrics.setdefault(stage, {'seconds': 0.0})
+        entry['seconds'] = round(entry['seconds'] + seconds, 4)
+        entry.update(info)
+        metrics.observe('video_stage_duration_seconds', seconds, stage=stage, cut_mode=cut_mode)
+        
+        if bytes_moved is not None:
+            entry['bytes'] = entry.get('bytes', 0) + bytes_moved
+            if entry['seconds']:
+                entry['mb_per_second'] = round(entry['bytes'] / 1024 ** 2 / entry['seconds'], 2)
+            metrics.inc('video_stage_bytes_total', bytes_moved, stage=stage)
+        
+        if frames:
+            entry['frames'] = entry.get('frames', 0) + frames
+            if seconds:
+                entry['fps'] = round(entry['frames'] / entry['seconds'], 1)
+                metrics.observe('video_encode_fps', frames / seconds, cut_mode=cut_mode)
+    
+    def _probe_local(self, path):
+        """Metadata của file MP4 local (đọc moov), None nếu không đọc được"""
+        try:
+            with open(path, 'rb') as f:
+                def read_range(offset, length):
+                    f.seek(offset)
+                    return f.read(length)
+                return probe_mp4(read_range, os.path.getsize(path))
+        except (OSError, ProbeError):
+            return None
+    
+    def _count_frames(self, path):
+        """Số frame video của file MP4 local (đọc moov), None nếu không đọc được"""
+        info = self._probe_local(path)
+        if info and info['fps'] and info['duration']:
+            return round(info['fps'] * info['duration'])
+        return None
+    
+    def cut_video(self, input_path, output_path, start_time, end_time, mode=None):
         """
         Cắt video từ start_time đến end_time
         
+        Các chế độ cắt:
+            - reencode: decode và encode lại toàn bộ bằng MoviePy theo encoding profile
+            - copy: copy nguyên stream đã nén, không encode lại. Điểm bắt đầu
+              được làm tròn về keyframe gần nhất phía trước start_time
+            - smart: chỉ encode lại phần GOP dở dang ở đầu và cuối đoạn cắt,
+              phần giữa (từ keyframe đến keyframe) được copy nguyên
+        
+        Chế độ copy/smart chỉ áp dụng cho H.264 trong MP4/MOV; các trường hợp
+        khác (hoặc khi ffmpeg lỗi) sẽ tự động chuyển về reencode.
+        
         Args:
             input_path: Đường dẫn video đầu vào
             output_path: Đường dẫn video đầu ra
             start_time: Thời gian bắt đầu (giây)
             end_time: Thời gian kết thúc (giây)
+            mode: Chế độ cắt, mặc định lấy từ settings.VIDEO_CUT_MODE
+        
+        Returns:
+            str: Chế độ cắt thực tế đã áp dụng nếu thành công, None nếu thất bại
+        """
+        mode = mode or settings.VIDEO_CUT_MODE
+        if mode not in self.CUT_MODES:
+            logger.error(f"Unknown cut mode: {mode}")
+            return None
+        
+        if mode != self.CUT_MODE_REENCODE:
+            try:
+                media = self._probe_media(input_path)
+                if not self._can_stream_copy(media):
+                    logger.info(f"Input is not H.264/MP4, falling back to reencode: {input_path}")
+                else:
+                    start_time, end_time = self._clamp_time_range(
+                        start_time, end_time, media['duration']
+                    )
+                    logger.info(f"Cutting video from {start_time}s to {end_time}s (mode={mode})")
+                    
+                    if mode == self.CUT_MODE_COPY:
+                        self._cut_stream_copy(input_path, output_path, start_time, end_time)
+                    else:
+                        mode = self._cut_smart(input_path, output_path, start_time, end_time, media)
+                    
+                    logger.info(f"Video cut successfully: {output_path}")
+                    return mode
+                    
+            except (OSError, ValueError, subprocess.CalledProcessError) as e:
+                logger.warning(f"Stream copy cut failed, falling back to reencode: {e}")
+        
+        if self._cut_reencode(input_path, output_path, start_time, end_time):
+            return self.CUT_MODE_REENCODE
+        return None
+    
+    def _cut_reencode(self, input_path, output_path, start_time, end_time):
+        """
+        Cắt video bằng MoviePy, encode lại toàn bộ theo encoding profile
         
         Returns:
             bool: True nếu thành công, False nếu thất bại
@@ -173,12 +752,7 @@ class VideoProcessor:
             video = VideoFileClip(input_path)
             
             # Validate time range
-            if start_time < 0:
-                start_time = 0
-            if end_time > video.duration:
-                end_time = video.duration
-            if start_time >= end_time:
-                raise ValueError(f"Invalid time range: {start_time}s to {end_time}s")
+            start_time, end_time = self._clamp_time_range(start_time, end_time, video.duration)
             
             # Cut video
             cut_clip = video.subclip(start_time, end_time)
@@ -186,11 +760,11 @@ class VideoProcessor:
             # Write output
             cut_clip.write_videofile(
                 output_path,
-                codec='libx264',
-                audio_codec='aac',
-                temp_audiofile='temp-audio.m4a',
+                # Audio tạm theo từng output (trong TEMP_VIDEO_DIR): nhiều job chạy song song
+                temp_audiofile=os.path.splitext(output_path)[0] + '-audio.m4a',
                 remove_temp=True,
-                logger=None
+                logger=self._moviepy_logger(),
+                **self.encoding.moviepy_params()
             )
             
             # Clean up
@@ -204,48 +778,480 @@ class VideoProcessor:
             logger.error(f"Error cutting video: {e}")
             return False
     
-    def process_segment(self, minio_input_path, start_time, end_time, segment_index):
+    def _clamp_time_range(self, start_time, end_time, duration):
+        """Giới hạn khoảng thời gian trong độ dài video"""
+        if start_time < 0:
+            start_time = 0
+        if duration and end_time > duration:
+            end_time = duration
+        if start_time >= end_time:
+            raise ValueError(f"Invalid time range: {start_time}s to {end_time}s")
+        return start_time, end_time
+    
+    def _run_ffmpeg(self, args, duration=None):
+        """
+        Chạy ffmpeg (binary của MoviePy) với danh sách tham số
+        
+        Args:
+            args: Danh sách tham số
+            duration: Độ dài output (giây) để tính tiến độ encode, None = không báo
+        """
+        cmd = [get_setting('FFMPEG_BINARY'), '-y', '-v', 'error'] + [str(a) for a in args]
+        
+        if not self.progress_callback or not duration:
+            subprocess.run(cmd, check=True, capture_output=True)
+            return
+        
+        # -progress ghi key=value ra stdout, out_time_us là vị trí đã xử lý
+        cmd[1:1] = ['-progress', 'pipe:1', '-nostats']
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            if key == 'out_time_us' and value.lstrip('-').isdigit():
+                self._report(self.STAGE_ENCODE, int(value) / 1e6 / duration)
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, cmd, stderr=stderr)
+    
+    def _run_ffprobe(self, args):
+        """Chạy ffprobe và trả về stdout"""
+        cmd = [settings.FFPROBE_BINARY, '-v', 'error'] + [str(a) for a in args]
+        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        return result.stdout
+    
+    def _probe_media(self, input_path):
+        """
+        Đọc thông tin container và stream bằng ffprobe (không decode)
+        
+        Returns:
+            dict: format_name, duration, video (stream video đầu tiên),
+                audio (stream audio đầu tiên hoặc None)
+        """
+        output = self._run_ffprobe([
+            '-show_entries',
+            'format=format_name,duration:'
+            'stream=codec_type,codec_name,profile,level,width,height,pix_fmt,'
+            'r_frame_rate,time_base,sample_rate,channels',
+            '-of', 'json',
+            input_path,
+        ])
+        data = json.loads(output)
+        streams = data.get('streams', [])
+        fmt = data.get('format', {})
+        
+        return {
+            'format_name': fmt.get('format_name', ''),
+            'duration': float(fmt.get('duration') or 0),
+            'video': next((s for s in streams if s.get('codec_type') == 'video'), None),
+            'audio': next((s for s in streams if s.get('codec_type') == 'audio'), None),
+        }
+    
+    def _can_stream_copy(self, media):
+        """Kiểm tra input có cắt được bằng stream copy không"""
+        video = media.get('video')
+        if not video or video.get('codec_name') not in self.STREAM_COPY_CODECS:
+            return False
+        formats = media.get('format_name', '').split(',')
+        return any(f in self.STREAM_COPY_FORMATS for f in formats)
+    
+    def _probe_keyframes(self, input_path, start_time, end_time):
+        """
+        Lấy danh sách thời điểm keyframe của stream video trong khoảng cắt
+        
+        Chỉ demux packet (không decode) nên rất nhanh. ffprobe seek về keyframe
+        trước start_time nên kết quả luôn chứa keyframe <= start_time.
+        
+        Returns:
+            list: Thời điểm các keyframe (giây), tăng dần
+        """
+        output = self._run_ffprobe([
+            '-select_streams', 'v:0',
+            '-read_intervals', f"{start_time}%{end_time}",
+            '-show_entries', 'packet=pts_time,flags',
+            '-of', 'csv=p=0',
+            input_path,
+        ])
+        keyframes = []
+        for line in output.splitlines():
+            parts = line.strip().split(',')
+            if len(parts) < 2 or 'K' not in parts[1]:
+                continue
+            try:
+                keyframes.append(float(parts[0]))
+            except ValueError:
+                continue
+        return sorted(keyframes)
+    
+    def _cut_stream_copy(self, input_path, output_path, start_time, end_time):
+        """Cắt bằng stream copy: không decode/encode, chỉ copy packet"""
+        self._run_ffmpeg([
+            '-ss', start_time,
+            '-i', input_path,
+            '-t', end_time - start_time,
+            '-map', '0:v:0', '-map', '0:a:0?',
+            '-c', 'copy',
+            '-avoid_negative_ts', 'make_zero',
+            '-movflags', '+faststart',
+            output_path,
+        ], duration=end_time - start_time)
+    
+    def _encode_fragment(self, input_path, output_path, start_time, end_time, media):
+        """
+        Encode lại 1 đoạn ngắn với tham số khớp stream gốc để có thể
+        ghép (concat) với phần được stream copy
+        
+        Chỉ lấy preset/CRF/thread từ encoding profile; codec luôn là H.264,
+        profile/level/pix_fmt/timescale, độ phân giải và audio giữ như stream gốc.
+        """
+        video = media['video']
+        audio = media.get('audio')
+        
+        # Phần giữa là H.264 copy nguyên, codec của encoding profile có thể khác
+        video_args = self.encoding.video_args(scale=False)
+        video_args[video_args.index('-c:v') + 1] = 'libx264'
+        
+        args = [
+            '-ss', start_time,
+            '-i', input_path,
+            '-t', end_time - start_time,
+            '-map', '0:v:0', '-map', '0:a:0?',
+            *video_args,
+            '-pix_fmt', video.get('pix_fmt') or 'yuv420p',
+        ]
+        
+        profile = self.H264_PROFILES.get((video.get('profile') or '').lower())
+        if profile:
+            args += ['-profile:v', profile]
+        
+        # ffprobe trả level dạng số nguyên (vd: 31 = 3.1), <= 0 là không rõ
+        level = video.get('level')
+        if isinstance(level, int) and level > 0:
+            args += ['-level:v', f"{level // 10}.{level % 10}"]
+        
+        if video.get('r_frame_rate') and video['r_frame_rate'] != '0/0':
+            args += ['-r', video['r_frame_rate']]
+        
+        time_base = video.get('time_base', '')
+        if '/' in time_base:
+            args += ['-video_track_timescale', time_base.split('/')[1]]
+        
+        if audio:
+            args += ['-c:a', 'aac']
+            if audio.get('sample_rate'):
+                args += ['-ar', audio['sample_rate']]
+            if audio.get('channels'):
+                args += ['-ac', audio['channels']]
+        
+        args.append(output_path)
+        self._run_ffmpeg(args, duration=end_time - start_time)
+    
+    def _cut_smart(self, input_path, output_path, start_time, end_time, media):
+        """
+        Smart cut: encode lại phần đầu [start, k1) và phần cuối [k2, end),
+        copy nguyên phần giữa [k1, k2) với k1/k2 là keyframe đầu tiên/cuối cùng
+        nằm trong khoảng cắt
+        
+        Returns:
+            str: Chế độ cắt đã áp dụng ('smart', hoặc 'reencode' nếu đoạn cắt
+                không chứa trọn GOP nào)
+        
+        Raises:
+            ValueError, subprocess.CalledProcessError: Output không khớp stream
+                gốc hoặc ffmpeg/ffprobe lỗi; caller chuyển sang reencode
+        """
+        eps = self.KEYFRAME_EPSILON
+        keyframes = self._probe_keyframes(input_path, start_time, end_time)
+        inner = [k for k in keyframes if start_time - eps <= k <= end_time - eps]
+        
+        if not inner:
+            # Không có keyframe nào trong đoạn cắt, không thể copy
+            if not self._cut_reencode(input_path, output_path, start_time, end_time):
+                raise ValueError("Reencode fallback failed")
+            return self.CUT_MODE_REENCODE
+        
+        k1 = inner[0]
+        later = [k for k in inner if k > k1 + eps]
+        k2 = later[-1] if later else end_time
+        
+        work_dir = tempfile.mkdtemp(prefix='smartcut_', dir=get_temp_video_dir())
+        try:
+            parts = []
+            
+            if k1 - start_time > eps:
+                head = os.path.join(work_dir, 'head.mp4')
+                self._encode_fragment(input_path, head, start_time, k1, media)
+                parts.append(head)
+            
+            middle = os.path.join(work_dir, 'middle.mp4')
+            self._cut_stream_copy(input_path, middle, k1, k2)
+            parts.append(middle)
+            
+            if end_time - k2 > eps:
+                tail = os.path.join(work_dir, 'tail.mp4')
+                self._encode_fragment(input_path, tail, k2, end_time, media)
+                parts.append(tail)
+            
+            if len(parts) == 1:
+                shutil.move(middle, output_path)
+                return self.CUT_MODE_SMART
+            
+            list_file = os.path.join(work_dir, 'parts.txt')
+            with open(list_file, 'w') as f:
+                for part in parts:
+                    f.write(f"file '{part}'\n")
+            
+            self._run_ffmpeg([
+                '-f', 'concat', '-safe', '0',
+                '-i', list_file,
+                '-c', 'copy',
+                '-movflags', '+faststart',
+                output_path,
+            ])
+            self._verify_smart_cut(output_path, media, end_time - start_time)
+            return self.CUT_MODE_SMART
+            
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    def _verify_smart_cut(self, output_path, media, duration):
+        """
+        Probe output sau khi concat: stream video phải khớp input (codec,
+        profile, level, pix_fmt, kích thước, time base), audio không bị mất
+        và độ dài đúng (sai số 2 frame)
+        
+        Raises:
+            ValueError: Output không khớp; cut_video/cut_video_batch sẽ
+                chuyển sang reencode
+        """
+        output = self._probe_media(output_path)
+        source_video = media['video']
+        output_video = output.get('video') or {}
+        
+        mismatched = [
+            f"{field}={output_video.get(field)!r} (expected {source_video[field]!r})"
+            for field in self.SMART_CUT_MATCH_FIELDS
+            if source_video.get(field) not in (None, '') and output_video.get(field) != source_video[field]
+        ]
+        if media.get('audio') and not output.get('audio'):
+            mismatched.append("audio stream missing")
+        
+        tolerance = 0.1
+        try:
+            num, den = source_video.get('r_frame_rate', '').split('/')
+            tolerance = max(tolerance, 2 * int(den) / int(num))
+        except (ValueError, ZeroDivisionError):
+            pass
+        if abs(output['duration'] - duration) > tolerance:
+            mismatched.append(f"duration={output['duration']:.3f}s (expected {duration:.3f}s)")
+        
+        if mismatched:
+            raise ValueError(f"Smart cut output does not match source: {', '.join(mismatched)}")
+    
+    def cut_video_batch(self, input_path, cuts, mode=None):
+        """
+        Cắt nhiều đoạn từ cùng 1 video input trong 1 lần quét
+        
+        - reencode: mở 1 decoder MoviePy duy nhất, lần lượt ghi các đoạn
+          theo thứ tự thời gian
+        - copy: 1 lệnh ffmpeg duy nhất đọc input 1 lần và ghi ra tất cả output
+        - smart: dùng chung kết quả probe, mỗi đoạn smart cut riêng
+        
+        Args:
+            input_path: Đường dẫn video đầu vào
+            cuts: List các tuple (start_time, end_time, output_path)
+            mode: Chế độ cắt, mặc định lấy từ settings.VIDEO_CUT_MODE
+        
+        Returns:
+            list: Chế độ cắt đã áp dụng cho từng đoạn (cùng thứ tự với cuts),
+                None với đoạn bị lỗi
+        """
+        mode = mode or settings.VIDEO_CUT_MODE
+        if mode not in self.CUT_MODES:
+            logger.error(f"Unknown cut mode: {mode}")
+            return [None] * len(cuts)
+        
+        results = [None] * len(cuts)
+        # Xử lý theo thứ tự thời gian để decoder chỉ đọc tiến
+        order = sorted(range(len(cuts)), key=lambda i: cuts[i][0])
+        pending = order
+        
+        if mode != self.CUT_MODE_REENCODE:
+            try:
+                media = self._probe_media(input_path)
+                if not self._can_stream_copy(media):
+                    logger.info(f"Input is not H.264/MP4, falling back to reencode: {input_path}")
+                elif mode == self.CUT_MODE_COPY:
+                    self._cut_stream_copy_batch(input_path, [cuts[i] for i in order], media)
+                    for i in order:
+                        results[i] = self.CUT_MODE_COPY
+                    pending = []
+                else:
+                    pending = []
+                    for position, i in enumerate(order):
+                        self._progress_scope = (position / len(order), 1 / len(order))
+                        start_time, end_time, output_path = cuts[i]
+                        try:
+                            start_time, end_time = self._clamp_time_range(
+                                start_time, end_time, media['duration']
+                            )
+                            results[i] = self._cut_smart(
+                                input_path, output_path, start_time, end_time, media
+                            )
+                        except (OSError, ValueError, subprocess.CalledProcessError) as e:
+                            logger.warning(f"Smart cut failed, falling back to reencode: {e}")
+                            pending.append(i)
+                        
+            except (OSError, ValueError, subprocess.CalledProcessError) as e:
+                logger.warning(f"Stream copy batch cut failed, falling back to reencode: {e}")
+            finally:
+                self._progress_scope = (0.0, 1.0)
+        
+        if pending:
+            reencoded = self._cut_reencode_batch(input_path, [cuts[i] for i in pending])
+            for i, ok in zip(pending, reencoded):
+                results[i] = self.CUT_MODE_REENCODE if ok else None
+        
+        return results
+    
+    def _cut_reencode_batch(self, input_path, cuts):
         """
-        Xử lý 1 segment: download từ Minio, cắt video, upload lại
+        Re-encode nhiều đoạn bằng 1 VideoFileClip duy nhất
+        
+        Returns:
+            list: True/False cho từng đoạn
+        """
+        results = []
+        video = None
+        try:
+            video = VideoFileClip(input_path)
+            for position, (start_time, end_time, output_path) in enumerate(cuts):
+                self._progress_scope = (position / len(cuts), 1 / len(cuts))
+                try:
+                    logger.info(f"Cutting video from {start_time}s to {end_time}s")
+                    start_time, end_time = self._clamp_time_range(start_time, end_time, video.duration)
+                    cut_clip = video.subclip(start_time, end_time)
+                    cut_clip.write_videofile(
+                        output_path,
+                        temp_audiofile=os.path.splitext(output_path)[0] + '-audio.m4a',
+                        remove_temp=True,
+                        logger=self._moviepy_logger(),
+                        **self.encoding.moviepy_params()
+                    )
+                    # Không close subclip: subclip dùng chung reader với video gốc
+                    results.append(True)
+                except Exception as e:
+                    logger.error(f"Error cutting video: {e}")
+                    results.append(False)
+        except Exception as e:
+            logger.error(f"Error opening video: {e}")
+        finally:
+            self._progress_scope = (0.0, 1.0)
+            if video:
+                video.close()
+        
+        return results + [False] * (len(cuts) - len(results))
+    
+    def _cut_stream_copy_batch(self, input_path, cuts, media):
+        """
+        Stream copy nhiều đoạn trong 1 lệnh ffmpeg (đọc input đúng 1 lần)
+        
+        Điểm bắt đầu của mỗi đoạn được làm tròn về keyframe phía trước, giống
+        như khi cắt từng đoạn bằng copy.
+        """
+        args = ['-i', input_path]
+        for start_time, end_time, output_path in cuts:
+            start_time, end_time = self._clamp_time_range(start_time, end_time, media['duration'])
+            keyframes = [
+                k for k in self._probe_keyframes(input_path, start_time, end_time)
+                if k <= start_time + self.KEYFRAME_EPSILON
+            ]
+            seek = keyframes[-1] if keyframes else start_time
+            args += [
+                '-ss', seek,
+                '-to', end_time,
+                '-map', '0:v:0', '-map', '0:a:0?',
+                '-c', 'copy',
+                '-avoid_negative_ts', 'make_zero',
+                '-movflags', '+faststart',
+                output_path,
+            ]
+        self._run_ffmpeg(args, duration=max(end for _, end, _ in cuts))
+    
+    def process_segment(self, minio_input_path, start_time, end_time, segment_index, cut_mode=None,
+                        streaming=None):
+        """
+        Xử lý 1 segment: lấy input từ cache (download từ Minio nếu cần), cắt video, upload lại
         
         Args:
             minio_input_path: Đường dẫn file input trên Minio
             start_time: Thời gian bắt đầu (giây)
             end_time: Thời gian kết thúc (giây)
             segment_index: Index của segment
+            cut_mode: Chế độ cắt (reencode/copy/smart), None = mặc định
+            streaming: Cắt streaming Minio -> Minio không dùng file tạm,
+                None = theo settings.VIDEO_STREAMING_CUT
         
         Returns:
-            str: Đường dẫn output trên Minio nếu thành công, None nếu thất bại
+            dict: {'output_link', 'cut_mode'} nếu thành công, None nếu thất bại
         """
-        temp_input = None
+        streaming = settings.VIDEO_STREAMING_CUT if streaming is None else streaming
+        mode = cut_mode or settings.VIDEO_CUT_MODE
+        self.last_metrics = {}
+        
+        # Smart cut cần ghép nhiều file local nên luôn đi qua cache
+        if streaming and mode != self.CUT_MODE_SMART:
+            result = self._process_segment_streaming(
+                minio_input_path, start_time, end_time, segment_index, mode
+            )
+            if result:
+                return result
+            logger.warning("Streaming cut failed, falling back to cached input")
+            self.last_metrics = {}
+        
         temp_output = None
         
         try:
-            # Create temporary files
-            with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as f:
-                temp_input = f.name
-            with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as f:
+            with tempfile.NamedTemporaryFile(suffix='.mp4', dir=get_temp_video_dir(), delete=False) as f:
                 temp_output = f.name
             
-            # Download input video from Minio
-            logger.info(f"Downloading input video: {minio_input_path}")
-            if not self.minio_client.download_file(minio_input_path, temp_input):
-                raise Exception("Failed to download input video")
-            
-            # Cut video
-            if not self.cut_video(temp_input, temp_output, start_time, end_time):
+            # Lấy input video từ cache (download từ Minio nếu chưa có)
+            logger.info(f"Fetching input video: {minio_input_path}")
+            self._report(self.STAGE_DOWNLOAD, 0)
+            stage_started = time.perf_counter()
+            with self.input_cache.open(minio_input_path) as input_path:
+                fetch = self.input_cache.last_fetch or {}
+                self._record_stage(
+                    self.STAGE_DOWNLOAD, stage_started, mode, bytes_moved=fetch.get('bytes'), cache=fetch.get('cache')
+                )
+                self._report(self.STAGE_DOWNLOAD, 1)
+                
+                # Cut video
+                self._report(self.STAGE_ENCODE, 0)
+                stage_started = time.perf_counter()
+                applied_mode = self.cut_video(input_path, temp_output, start_time, end_time, cut_mode)
+            if not applied_mode:
                 raise Exception("Failed to cut video")
+            self._record_stage(
+                self.STAGE_ENCODE, stage_started, mode, frames=self._count_frames(temp_output),
+                applied_mode=applied_mode, encoding_profile=self.encoding.name
+            )
             
             # Generate output path on Minio
-            base_name = os.path.splitext(os.path.basename(minio_input_path))[0]
-            output_name = f"outputs/{base_name}_segment_{segment_index}_{start_time}_{end_time}.mp4"
+            output_name = self._output_object_name(minio_input_path, segment_index, start_time, end_time)
             
             # Upload output video to Minio
             logger.info(f"Uploading output video: {output_name}")
+            self._report(self.STAGE_UPLOAD, 0)
+            stage_started = time.perf_counter()
             if not self.minio_client.upload_file(temp_output, output_name):
                 raise Exception("Failed to upload output video")
+            self._record_stage(self.STAGE_UPLOAD, stage_started, mode, bytes_moved=os.path.getsize(temp_output))
+            self._report(self.STAGE_UPLOAD, 1)
             
-            return output_name
+            return {
+                'output_link': output_name,
+                'cut_mode': applied_mode,
+            }
             
         except Exception as e:
             logger.error(f"Error processing segment: {e}")
@@ -253,64 +1259,527 @@ class VideoProcessor:
             
         finally:
             # Clean up temporary files
-            if temp_input and os.path.exists(temp_input):
-                os.remove(temp_input)
             if temp_output and os.path.exists(temp_output):
                 os.remove(temp_output)
     
-    def get_video_duration(self, minio_path):
+    def _process_segment_streaming(self, minio_input_path, start_time, end_time, segment_index, mode):
         """
-        Lấy độ dài video (giây)
+        Cắt 1 segment không qua file tạm
+        
+        ffmpeg đọc input qua presigned URL (seek bằng HTTP range nên chỉ tải
+        phần moov và các đoạn cần cắt), ghi fragmented MP4 ra stdout, stdout
+        được upload thẳng lên Minio bằng multipart upload.
+        
+        Returns:
+            dict: {'output_link', 'cut_mode'} nếu thành công, None nếu thất bại
+        """
+        try:
+            url = self.minio_client.get_presigned_url(minio_input_path)
+            if not url:
+                raise IOError(f"Cannot get presigned URL for {minio_input_path}")
+            
+            media = self._probe_media(url)
+            start_time, end_time = self._clamp_time_range(start_time, end_time, media['duration'])
+            if mode == self.CUT_MODE_COPY and not self._can_stream_copy(media):
+                logger.info(f"Input is not H.264/MP4, falling back to reencode: {minio_input_path}")
+                mode = self.CUT_MODE_REENCODE
+            
+            args = [
+                '-ss', start_time,
+                '-i', url,
+                '-t', end_time - start_time,
+                '-map', '0:v:0', '-map', '0:a:0?',
+            ]
+            if mode == self.CUT_MODE_COPY:
+                args += ['-c', 'copy', '-avoid_negative_ts', 'make_zero']
+            else:
+                args += [*self.encoding.video_args(), '-pix_fmt', 'yuv420p', *self.encoding.audio_args()]
+            # Fragmented MP4: ghi tuần tự được, không cần seek lại để ghi moov
+            args += [
+                '-movflags', 'frag_keyframe+empty_moov+default_base_moof',
+                '-f', 'mp4', 'pipe:1',
+            ]
+            
+            output_name = self._output_object_name(minio_input_path, segment_index, start_time, end_time)
+            logger.info(
+                f"Streaming cut {minio_input_path} from {start_time}s to {end_time}s "
+                f"(mode={mode}) to {output_name}"
+            )
+            self._report(self.STAGE_ENCODE, 0)
+            stage_started = time.perf_counter()
+            frames, size = self._stream_ffmpeg_to_minio(args, output_name, duration=end_time - start_time)
+            # Đọc input, encode và upload chạy đồng thời nên chỉ đo được chung 1 stage
+            self._record_stage(
+                self.STAGE_ENCODE, stage_started, mode, frames=frames, applied_mode=mode, streaming=True,
+                encoding_profile=self.encoding.name
+            )
+            self.last_metrics[self.STAGE_UPLOAD] = {'bytes': size}
+            metrics.inc('video_stage_bytes_total', size, stage=self.STAGE_UPLOAD)
+            self._report(self.STAGE_UPLOAD, 1)
+            
+            return {
+                'output_link': output_name,
+                'cut_mode': mode,
+            }
+            
+        except Exception as e:
+            logger.error(f"Error in streaming cut: {e}")
+            return None
+    
+    def _stream_ffmpeg_to_minio(self, args, object_name, duration):
+        """
+        Chạy ffmpeg ghi ra stdout và upload stdout lên Minio
+        
+        Tiến độ encode được đọc từ -progress (ghi ra stderr cùng log lỗi).
+        Nếu ffmpeg lỗi thì object đã upload (không hoàn chỉnh) sẽ bị xóa.
+        
+        Returns:
+            tuple: (số frame đã encode, số byte đã upload)
+        """
+        cmd = (
+            [get_setting('FFMPEG_BINARY'), '-y', '-v', 'error', '-nostats', '-progress', 'pipe:2']
+            + [str(a) for a in args]
+        )
+        process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        errors = []
+        progress = {'frames': None}
+        
+        def read_stderr():
+            for raw in process.stderr:
+                line = raw.decode(errors='replace').strip()
+                key, sep, value = line.partition('=')
+                if sep and key == 'out_time_us':
+                    if value.lstrip('-').isdigit():
+                        self._report(self.STAGE_ENCODE, int(value) / 1e6 / duration)
+                elif sep and key == 'frame':
+                    if value.isdigit():
+                        progress['frames'] = int(value)
+                elif not sep:
+                    errors.append(line)
+        
+        stderr_thread = threading.Thread(target=read_stderr, daemon=True)
+        stderr_thread.start()
+        uploaded = None
+        reader = _CountingReader(process.stdout)
+        try:
+            uploaded = self.minio_client.upload_stream(reader, object_name)
+        finally:
+            if process.poll() is None and not uploaded:
+                process.kill()
+            returncode = process.wait()
+            stderr_thread.join()
+            process.stdout.close()
+        
+        if returncode != 0:
+            if uploaded:
+                self.minio_client.delete_file(object_name)
+            raise subprocess.CalledProcessError(returncode, cmd, stderr='\n'.join(errors))
+        if not uploaded:
+            raise IOError(f"Failed to upload stream to {object_name}")
+        return progress['frames'], reader.bytes_read
+    
+    def process_all_segments(self, minio_input_path, segments, cut_mode=None):
+        """
+        Xử lý tất cả segments của 1 video: lấy input 1 lần, cắt tất cả trong
+        1 lần quét, upload từng output
         
         Args:
-            minio_path: Đường dẫn file trên Minio
+            minio_input_path: Đường dẫn file input trên Minio
+            segments: List các tuple (segment_index, start_time, end_time)
+            cut_mode: Chế độ cắt (reencode/copy/smart), None = mặc định
         
         Returns:
-            float: Độ dài video (giây), None nếu lỗi
+            list: Kết quả cho từng segment, mỗi phần tử là dict gồm
+                segment_index, success, output_link, cut_mode, error
         """
-        temp_file = None
+        results = [
+            {
+                'segment_index': index,
+                'success': False,
+                'output_link': None,
+                'cut_mode': None,
+                'error': None,
+            }
+            for index, _, _ in segments
+        ]
+        self.last_metrics = {}
+        if not segments:
+            return results
+        
+        mode = cut_mode or settings.VIDEO_CUT_MODE
+        work_dir = tempfile.mkdtemp(prefix='batch_', dir=get_temp_video_dir())
         try:
-            with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as f:
-                temp_file = f.name
+            cuts = [
+                (start_time, end_time, os.path.join(work_dir, f"segment_{index}.mp4"))
+                for index, start_time, end_time in segments
+            ]
             
-            if not self.minio_client.download_file(minio_path, temp_file):
-                return None
+            logger.info(f"Fetching input video: {minio_input_path}")
+            self._report(self.STAGE_DOWNLOAD, 0)
+            stage_started = time.perf_counter()
+            with self.input_cache.open(minio_input_path) as input_path:
+                fetch = self.input_cache.last_fetch or {}
+                self._record_stage(
+                    self.STAGE_DOWNLOAD, stage_started, mode, bytes_moved=fetch.get('bytes'), cache=fetch.get('cache')
+                )
+                self._report(self.STAGE_DOWNLOAD, 1)
+                self._report(self.STAGE_ENCODE, 0)
+                stage_started = time.perf_counter()
+                applied_modes = self.cut_video_batch(input_path, cuts, cut_mode)
+            frames = sum(
+                self._count_frames(output_path) or 0
+                for (_, _, output_path), applied_mode in zip(cuts, applied_modes) if applied_mode
+            )
+            self._record_stage(
+                self.STAGE_ENCODE, stage_started, mode, frames=frames, segments=len(cuts),
+                encoding_profile=self.encoding.name
+            )
             
-            video = VideoFileClip(temp_file)
-            duration = video.duration
-            video.close()
+            for position, (index, start_time, end_time) in enumerate(segments):
+                self._report(self.STAGE_UPLOAD, position / len(segments))
+                result = results[position]
+                output_path = cuts[position][2]
+                applied_mode = applied_modes[position]
+                
+                if not applied_mode:
+                    result['error'] = 'Failed to cut video'
+                    continue
+                
+                output_name = self._output_object_name(minio_input_path, index, start_time, end_time)
+                logger.info(f"Uploading output video: {output_name}")
+                stage_started = time.perf_counter()
+                if not self.minio_client.upload_file(output_path, output_name):
+                    result['error'] = 'Failed to upload output video'
+                    continue
+                self._record_stage(self.STAGE_UPLOAD, stage_started, mode, bytes_moved=os.path.getsize(output_path))
+                
+                result.update(success=True, output_link=output_name, cut_mode=applied_mode)
+            
+            self._report(self.STAGE_UPLOAD, 1)
+            
+        except Exception as e:
+            logger.error(f"Error processing segments: {e}")
+            for result in results:
+                if not result['success'] and not result['error']:
+                    result['error'] = str(e)
+                    
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        
+        return results
+    
+    def generate_preview(self, minio_input_path, duration=None):
+        """
+        Tạo preview cho editor: proxy MP4 độ phân giải thấp và HLS (chunk
+        ngắn) từ proxy, upload cạnh input trên Minio
+        
+        Proxy encode theo settings.VIDEO_PREVIEW_ENCODING_PROFILE, keyframe
+        đặt đúng mỗi VIDEO_PREVIEW_HLS_SEGMENT giây để HLS chỉ cần stream copy.
+        
+        Args:
+            minio_input_path: Đường dẫn file input trên Minio
+            duration: Độ dài video (giây) để báo tiến độ encode, None = không báo
+        
+        Returns:
+            dict: {'proxy_link', 'hls_link', 'hls_segments'} nếu thành công, None nếu thất bại
+        """
+        self.last_metrics = {}
+        profile = get_encoding_profile(settings.VIDEO_PREVIEW_ENCODING_PROFILE)
+        segment_seconds = settings.VIDEO_PREVIEW_HLS_SEGMENT
+        prefix = preview_object_prefix(minio_input_path)
+        work_dir = tempfile.mkdtemp(prefix='preview_', dir=get_temp_video_dir())
+        try:
+            proxy_path = os.path.join(work_dir, 'proxy.mp4')
+            hls_dir = os.path.join(work_dir, 'hls')
+            os.makedirs(hls_dir)
+            
+            self._report(self.STAGE_DOWNLOAD, 0)
+            stage_started = time.perf_counter()
+            with self.input_cache.open(minio_input_path) as input_path:
+                fetch = self.input_cache.last_fetch or {}
+                self._record_stage(
+                    self.STAGE_DOWNLOAD, stage_started, 'preview', bytes_moved=fetch.get('bytes'),
+                    cache=fetch.get('cache')
+                )
+                self._report(self.STAGE_DOWNLOAD, 1)
+                
+                logger.info(f"Encoding preview proxy of {minio_input_path} (profile={profile.name})")
+                self._report(self.STAGE_ENCODE, 0)
+                stage_started = time.perf_counter()
+                self._run_ffmpeg([
+                    '-i', input_path,
+                    '-map', '0:v:0', '-map', '0:a:0?',
+                    *profile.video_args(),
+                    '-pix_fmt', 'yuv420p',
+                    '-force_key_frames', f"expr:gte(t,n_forced*{segment_seconds})",
+                    *profile.audio_args(),
+                    '-movflags', '+faststart',
+                    proxy_path,
+                ], duration=duration)
             
-            return duration
+            self._run_ffmpeg([
+                '-i', proxy_path,
+                '-c', 'copy',
+                '-f', 'hls',
+                '-hls_time', segment_seconds,
+                '-hls_playlist_type', 'vod',
+                '-hls_segment_filename', os.path.join(hls_dir, 'seg_%05d.ts'),
+                os.path.join(hls_dir, 'index.m3u8'),
+            ])
+            self._record_stage(
+                self.STAGE_ENCODE, stage_started, 'preview', frames=self._count_frames(proxy_path),
+                encoding_profile=profile.name
+            )
+            
+            self._report(self.STAGE_UPLOAD, 0)
+            stage_started = time.perf_counter()
+            uploads = [(proxy_path, f"{prefix}/proxy.mp4", 'video/mp4')]
+            for name in sorted(os.listdir(hls_dir)):
+                content_type = 'application/vnd.apple.mpegurl' if name.endswith('.m3u8') else 'video/mp2t'
+                uploads.append((os.path.join(hls_dir, name), f"{prefix}/hls/{name}", content_type))
+            # Playlist upload sau cùng để không trỏ tới chunk chưa có
+            uploads.sort(key=lambda item: item[1].endswith('.m3u8'))
+            
+            # Chunk HLS nhỏ và nhiều: upload song song
+            with ThreadPoolExecutor(max_workers=max(1, settings.MINIO_TRANSFER_THREADS)) as executor:
+                uploaded = list(executor.map(
+                    lambda item: self.minio_client.upload_file(*item), uploads[:-1]
+                ))
+            if not all(uploaded) or not self.minio_client.upload_file(*uploads[-1]):
+                raise IOError("Failed to upload preview")
+            self._record_stage(
+                self.STAGE_UPLOAD, stage_started, 'preview',
+                bytes_moved=sum(os.path.getsize(path) for path, _, _ in uploads)
+            )
+            self._report(self.STAGE_UPLOAD, 1)
+            
+            return {
+                'proxy_link': f"{prefix}/proxy.mp4",
+                'hls_link': f"{prefix}/hls/index.m3u8",
+                'hls_segments': len(uploads) - 2,
+            }
             
         except Exception as e:
-            logger.error(f"Error getting video duration: {e}")
+            logger.error(f"Error generating preview: {e}")
             return None
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    def generate_thumbnails(self, minio_input_path, duration=None, width=None, height=None):
+        """
+        Tạo sprite sheet thumbnail cho timeline của editor, upload cạnh input trên Minio
+        
+        Decode input 1 lần: ffmpeg lấy 1 frame mỗi settings.VIDEO_THUMBNAIL_INTERVAL
+        giây, thu nhỏ và ghép thành các sprite JPEG (COLUMNS x ROWS thumbnail),
+        kèm index WebVTT (thumbnails.vtt) và JSON (thumbnails.json).
+        
+        Args:
+            minio_input_path: Đường dẫn file input trên Minio
+            duration: Độ dài video (giây), None = đọc từ file
+            width: Chiều rộng video để giữ tỉ lệ thumbnail, None = 16:9
+            height: Chiều cao video
+        
+        Returns:
+            dict: {'vtt_link', 'index_link', 'info'} nếu thành công, None nếu thất bại
+        """
+        self.last_metrics = {}
+        interval = settings.VIDEO_THUMBNAIL_INTERVAL
+        columns, rows = settings.VIDEO_THUMBNAIL_COLUMNS, settings.VIDEO_THUMBNAIL_ROWS
+        thumb_width = settings.VIDEO_THUMBNAIL_WIDTH
+        # Chiều cao chẵn theo tỉ lệ video; sai tỉ lệ (vd: video xoay) thì thêm viền
+        ratio = height / width if width and height else 9 / 16
+        thumb_height = max(2, int(round(thumb_width * ratio / 2)) * 2)
+        prefix = thumbnails_object_prefix(minio_input_path)
+        work_dir = tempfile.mkdtemp(prefix='thumbnails_', dir=get_temp_video_dir())
+        try:
+            self._report(self.STAGE_DOWNLOAD, 0)
+            stage_started = time.perf_counter()
+            with self.input_cache.open(minio_input_path) as input_path:
+                fetch = self.input_cache.last_fetch or {}
+                self._record_stage(
+                    self.STAGE_DOWNLOAD, stage_started, 'thumbnails', bytes_moved=fetch.get('bytes'),
+                    cache=fetch.get('cache')
+                )
+                self._report(self.STAGE_DOWNLOAD, 1)
+                
+                if not duration:
+                    duration = (self._probe_local(input_path) or {}).get('duration')
+                
+                logger.info(f"Generating thumbnail sprites of {minio_input_path} every {interval}s")
+                self._report(self.STAGE_ENCODE, 0)
+                stage_started = time.perf_counter()
+                self._run_ffmpeg([
+                    '-i', input_path,
+                    '-map', '0:v:0',
+                    '-vf', (
+                        f"fps=1/{interval},"
+                        f"scale={thumb_width}:{thumb_height}:force_original_aspect_ratio=decrease,"
+                        f"pad={thumb_width}:{thumb_height}:(ow-iw)/2:(oh-ih)/2,"
+                        f"tile={columns}x{rows}"
+                    ),
+                    '-q:v', settings.VIDEO_THUMBNAIL_QUALITY,
+                    '-start_number', 0,
+                    os.path.join(work_dir, 'sprite_%03d.jpg'),
+                ], duration=duration)
+                self._record_stage(
+                    self.STAGE_ENCODE, stage_started, 'thumbnails', frames=self._count_frames(input_path)
+                )
+            
+            sprites = sorted(name for name in os.listdir(work_dir) if name.startswith('sprite_'))
+            if not sprites:
+                raise RuntimeError('ffmpeg produced no sprite')
+            # Sheet cuối chỉ lấp 1 phần (phần còn lại là ô đen): số thumbnail lấy theo duration
+            per_sheet = columns * rows
+            count = len(sprites) * per_sheet
+            if duration:
+                count = min(max(math.ceil(duration / interval), (len(sprites) - 1) * per_sheet + 1), count)
+            index = {
+                'interval': interval,
+                'duration': duration,
+                'width': thumb_width,
+                'height': thumb_height,
+                'columns': columns,
+                'rows': rows,
+                'count': count,
+                'sprites': sprites,
+            }
+            with open(os.path.join(work_dir, 'thumbnails.json'), 'w') as f:
+                json.dump(index, f)
+            with open(os.path.join(work_dir, 'thumbnails.vtt'), 'w') as f:
+                f.write(build_thumbnails_vtt(index))
+            
+            self._report(self.STAGE_UPLOAD, 0)
+            stage_started = time.perf_counter()
+            uploads = [(os.path.join(work_dir, name), f"{prefix}/{name}", 'image/jpeg') for name in sprites]
+            # Index upload sau cùng để không trỏ tới sprite chưa có
+            with ThreadPoolExecutor(max_workers=max(1, settings.MINIO_TRANSFER_THREADS)) as executor:
+                uploaded = list(executor.map(lambda item: self.minio_client.upload_file(*item), uploads))
+            uploads += [
+                (os.path.join(work_dir, 'thumbnails.json'), f"{prefix}/thumbnails.json", 'application/json'),
+                (os.path.join(work_dir, 'thumbnails.vtt'), f"{prefix}/thumbnails.vtt", 'text/vtt'),
+            ]
+            if not all(uploaded) or not all(self.minio_client.upload_file(*item) for item in uploads[-2:]):
+                raise IOError("Failed to upload thumbnails")
+            self._record_stage(
+                self.STAGE_UPLOAD, stage_started, 'thumbnails',
+                bytes_moved=sum(os.path.getsize(path) for path, _, _ in uploads)
+            )
+            self._report(self.STAGE_UPLOAD, 1)
+            
+            return {
+                'vtt_link': f"{prefix}/thumbnails.vtt",
+                'index_link': f"{prefix}/thumbnails.json",
+                # Như index JSON nhưng sprites là object name trên Minio
+                'info': dict(index, sprites=[f"{prefix}/{name}" for name in sprites]),
+            }
             
+        except Exception as e:
+            logger.error(f"Error generating thumbnails: {e}")
+            return None
         finally:
-            if temp_file and os.path.exists(temp_file):
-                os.remove(temp_file)
-
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    def _output_object_name(self, minio_input_path, segment_index, start_time, end_time):
+        """Tên object output trên Minio cho 1 segment"""
+        base_name = os.path.splitext(os.path.basename(minio_input_path))[0]
+        return f"outputs/{base_name}_segment_{segment_index}_{start_time}_{end_time}.mp4"
+    
+    def probe_video(self, minio_path):
+        """
+        Đọc metadata video (duration, resolution, fps, codecs, bitrate)
+        
+        Chỉ đọc box moov bằng ranged GET trên Minio (cả file faststart lẫn
+        file có moov ở cuối). Nếu không parse được (không phải MP4/MOV) thì
+        dùng ffprobe đọc trực tiếp qua presigned URL, vẫn không download cả file.
+        
+        Args:
+            minio_path: Đường dẫn file trên Minio
+        
+        Returns:
+            dict: duration, width, height, fps, video_codec, audio_codec,
+                bitrate, file_size; None nếu lỗi
+        """
+        stat = self.minio_client.stat_file(minio_path)
+        if stat is None:
+            return None
+        
+        def read_range(offset, length):
+            data = self.minio_client.get_object_range(minio_path, offset, length)
+            if data is None:
+                raise ProbeError(f"Failed to read range {offset}+{length}")
+            return data
+        
+        try:
+            info = probe_mp4(read_range, stat.size)
+            if info['duration']:
+                return info
+            logger.warning(f"moov of {minio_path} has no duration, falling back to ffprobe")
+        except ProbeError as e:
+            logger.warning(f"Header probe failed for {minio_path} ({e}), falling back to ffprobe")
+        
+        try:
+            return self._probe_url(minio_path, stat.size)
+        except Exception as e:
+            logger.error(f"Error probing video: {e}")
+            return None
+    
+    def _probe_url(self, minio_path, file_size):
+        """Đọc metadata bằng ffprobe qua presigned URL (ffprobe tự dùng HTTP range)"""
+        url = self.minio_client.get_presigned_url(minio_path)
+        if not url:
+            raise IOError(f"Cannot get presigned URL for {minio_path}")
+        
+        media = self._probe_media(url)
+        video = media.get('video') or {}
+        audio = media.get('audio') or {}
+        
+        fps = None
+        if video.get('r_frame_rate'):
+            num, _, den = video['r_frame_rate'].partition('/')
+            if float(den or 1):
+                fps = round(float(num) / float(den or 1), 3)
+        
+        duration = media['duration'] or None
+        return {
+            'duration': duration,
+            'width': video.get('width'),
+            'height': video.get('height'),
+            'fps': fps,
+            'video_codec': video.get('codec_name'),
+            'audio_codec': audio.get('codec_name'),
+            'file_size': file_size,
+            'bitrate': int(file_size * 8 / duration) if duration else None,
+        }
+    
+    def get_video_duration(self, minio_path):
+        """
+        Lấy độ dài video (giây), chỉ đọc header của file
+        
+        Args:
+            minio_path: Đường dẫn file trên Minio
+        
+        Returns:
+            float: Độ dài video (giây), None nếu lỗi
+        """
+        info = self.probe_video(minio_path)
+        return info['duration'] if info else None
 
-def generate_prompt_from_template(template, youtube_link):
+def generate_prompt_from_template(template, youtube_link, video=None, segment=None, **values):
     """
     Generate prompt từ template và youtube link
     
     Args:
         template: PromptTemplate instance hoặc template string
         youtube_link: Link YouTube
+        video: VideoProfile (tùy chọn) để điền {video_title}, {video_duration}, ...
+        segment: Segment hoặc dict segment (tùy chọn) để điền {start_time}, {end_time}, ...
+        **values: Giá trị placeholder khác, vd: youtube_title, youtube_tags
     
     Returns:
         str: Generated prompt
     """
-    from apps.videos.models import PromptTemplate
-    
-    if isinstance(template, PromptTemplate):
-        template_content = template.template_content
-    else:
-        template_content = str(template)
-    
-    # Replace placeholder
-    prompt = template_content.replace('{youtube_link}', youtube_link or '')
+    # Render 1 lượt tất cả placeholder bằng template đã compile (xem prompts.py)
+    prompt = render_prompt(template, video, segment, youtube_link=youtube_link or None, **values)
     
     # Có thể thêm logic xử lý khác ở đây (gọi AI, v.v.)
     
@@ -3,23 +3,64 @@ Views for Video Profile Management System
 """
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.http import JsonResponse
+from django.core.exceptions import ValidationError
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, F, Min, Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, HttpResponseNotAllowed, Http404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.views.decorators.http import require_http_methods
-from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+import asyncio
+import csv
+import hmac
 import json
 import logging
+import os
+import posixpath
+import time
 
-from .models import VideoProfile, PromptTemplate
-from .utils import MinioClient, VideoProcessor, generate_prompt_from_template
+from .models import VideoProfile, PromptTemplate, Segment, ProcessingJob, video_progress_expression
+from .utils import MinioClient, VideoProcessor, build_thumbnails_vtt, generate_prompt_from_template
+from .jobs import (
+    enqueue_segment_job, enqueue_segment_jobs, enqueue_all_segments_job, enqueue_preview_job, enqueue_thumbnails_job
+)
+from .bulk import apply_segment_changes, parse_segments_csv, generate_segment_prompts, BulkValidationError
+from .pagination import keyset_paginate, get_page_size
+from .prompts import PLACEHOLDERS
+from .cache import get_active_prompt_templates, get_user_choices, get_fragment_version
+from .encoding import get_encoding_profiles, get_encoding_profile_choices
+from .input_cache import InputVideoCache
+from . import metrics
 
 logger = logging.getLogger(__name__)
 
 
 # ============ VIDEO PROFILE VIEWS ============
 
+def _query_string_without_cursor(request):
+    """Query string hiện tại (filter, sort, page_size) để ghép vào link phân trang"""
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    return params.urlencode()
+
+
+VIDEO_PROGRESS_FILTERS = [
+    ('empty', 'Chưa có segment'),
+    ('not_started', 'Chưa xử lý'),
+    ('partial', 'Đang xử lý dở'),
+    ('done', 'Đã xử lý xong'),
+]
+
 def video_list(request):
-    """Màn hình Quản lý video - Danh sách tất cả video profiles"""
-    videos = VideoProfile.objects.all().select_related('assigned_user', 'prompt_template')
+    """Màn hình Quản lý video - Danh sách video profiles (keyset pagination)"""
+    # Chỉ load các cột hiển thị trên danh sách
+    videos = VideoProfile.objects.select_related('assigned_user').only(
+        'id', 'title', 'youtube_link', 'status', 'created_at',
+        'total_segments', 'processed_segments',
+        'assigned_user', 'assigned_user__username'
+    )
     
     # Filter by status if provided
     status_filter = request.GET.get('status')
@@ -31,16 +72,128 @@ def video_list(request):
     if user_filter:
         videos = videos.filter(assigned_user_id=user_filter)
     
+    # Filter by progress (dùng bộ đếm trên VideoProfile, không load segments)
+    progress_filter = request.GET.get('progress')
+    if progress_filter == 'empty':
+        videos = videos.filter(total_segments=0)
+    elif progress_filter == 'not_started':
+        videos = videos.filter(total_segments__gt=0, processed_segments=0)
+    elif progress_filter == 'partial':
+        videos = videos.filter(processed_segments__gt=0, processed_segments__lt=F('total_segments'))
+    elif progress_filter == 'done':
+        videos = videos.filter(total_segments__gt=0, processed_segments=F('total_segments'))
+    
+    # Ordering khớp các index của VideoProfile (xem Meta.indexes): (created_at, id)
+    # giảm dần; khi sort theo tiến độ/số segments thì created_at, id cùng chiều với
+    # cột sort để index đọc xuôi/ngược được cho cả 2 chiều
+    sort = request.GET.get('sort')
+    if sort not in ('progress', '-progress', 'segments', '-segments'):
+        sort = None
+    descending = not sort or sort.startswith('-')
+    ordering = [('created_at', descending), ('id', descending)]
+    converters = {'created_at': parse_datetime}
+    if sort in ('progress', '-progress'):
+        # Video chưa có segment có progress -1 (luôn đứng cuối khi sắp giảm dần)
+        videos = videos.annotate(progress=video_progress_expression())
+        ordering.insert(0, ('progress', descending))
+        converters['progress'] = float
+    elif sort in ('segments', '-segments'):
+        ordering.insert(0, ('total_segments', descending))
+    
+    page = keyset_paginate(
+        videos,
+        ordering,
+        cursor=request.GET.get('cursor'),
+        page_size=get_page_size(request),
+        converters=converters
+    )
+    
     context = {
-        'videos': videos,
+        'videos': page,
+        'page': page,
+        'query_string': _query_string_without_cursor(request),
         'status_choices': VideoProfile.STATUS_CHOICES,
+        'selected_status': status_filter,
+        'progress_choices': VIDEO_PROGRESS_FILTERS,
+        'selected_progress': progress_filter,
+        'selected_sort': sort,
     }
     return render(request, 'videos/video_list.html', context)
 
 
 def video_detail(request, pk):
     """Xem chi tiết video profile - redirect đến video_edit"""
-    return redirect('video_edit', pk=pk)
+    return redirect('videos:video_edit', pk=pk)
+
+
+def _probe_video_metadata(video):
+    """
+    Đọc metadata video input (chỉ header) và lưu vào video profile
+    
+    Args:
+        video: VideoProfile instance (đã lưu)
+    
+    Returns:
+        bool: True nếu đọc được metadata
+    """
+    info = None
+    probed_at = None
+    if video.minio_input_link:
+        info = VideoProcessor().probe_video(video.minio_input_link)
+        probed_at = timezone.now()
+        if info is None:
+            logger.warning(f"Cannot probe metadata of {video.minio_input_link}")
+    
+    video.save(update_fields=video.set_metadata(info, probed_at))
+    return info is not None
+
+
+def _schedule_preview(video):
+    """
+    Xóa preview (proxy/HLS, sprite thumbnail) của input cũ và tạo job cho
+    input hiện tại (theo settings.VIDEO_PREVIEW_ENABLED, VIDEO_THUMBNAILS_ENABLED)
+    
+    Args:
+        video: VideoProfile instance (đã lưu)
+    
+    Returns:
+        list: Các ProcessingJob vừa tạo
+    """
+    update_fields = []
+    if any(getattr(video, field) for field in VideoProfile.PREVIEW_FIELDS):
+        update_fields += video.clear_preview()
+    if any(getattr(video, field) for field in VideoProfile.THUMBNAIL_FIELDS):
+        update_fields += video.clear_thumbnails()
+    if update_fields:
+        video.save(update_fields=update_fields)
+    
+    jobs = []
+    if video.minio_input_link and settings.VIDEO_PREVIEW_ENABLED:
+        jobs.append(enqueue_preview_job(video))
+    if video.minio_input_link and settings.VIDEO_THUMBNAILS_ENABLED:
+        jobs.append(enqueue_thumbnails_job(video))
+    return jobs
+
+
+def _thumbnails_payload(info, minio_client):
+    """
+    Index sprite sheet cho editor, sprite thay bằng presigned URL
+    
+    Args:
+        info: VideoProfile.thumbnails_info
+        minio_client: MinioClient
+    
+    Returns:
+        dict: interval, duration, width, height, columns, rows, count, sprites (URL)
+    """
+    return dict(info, sprites=[minio_client.get_presigned_url(sprite) for sprite in info['sprites']])
+
+
+def _check_time_range(video, start_time, end_time):
+    """Trả về lỗi nếu đoạn cắt nằm ngoài độ dài video (khi đã biết duration)"""
+    if video.duration is not None and start_time >= video.duration:
+        return f'Start time {start_time} exceeds video duration {video.duration:.3f}'
+    return None
 
 
 def video_create(request):
@@ -54,11 +207,16 @@ def video_create(request):
             assigned_user_id = request.POST.get('assigned_user')
             prompt_template_id = request.POST.get('prompt_template')
             notes = request.POST.get('notes', '')
+            cut_mode = request.POST.get('cut_mode') or 'reencode'
+            encoding_profile = request.POST.get('encoding_profile') or None
             
             # Validate
             if not title:
                 messages.error(request, 'Tiêu đề là bắt buộc')
-                return redirect('video_create')
+                return redirect('videos:video_create')
+            if encoding_profile and encoding_profile not in get_encoding_profiles():
+                messages.error(request, f'Encoding profile không hợp lệ: {encoding_profile}')
+                return redirect('videos:video_create')
             
             # Tạo video profile
             video = VideoProfile.objects.create(
@@ -68,23 +226,32 @@ def video_create(request):
                 assigned_user_id=assigned_user_id if assigned_user_id else None,
                 prompt_template_id=prompt_template_id if prompt_template_id else None,
                 notes=notes,
-                segments=[],
+                cut_mode=cut_mode,
+                encoding_profile=encoding_profile,
                 status='draft'
             )
             
+            if video.minio_input_link:
+                _probe_video_metadata(video)
+                _schedule_preview(video)
+            
             messages.success(request, f'Đã tạo video profile: {video.title}')
-            return redirect('video_edit', pk=video.id)
+            return redirect('videos:video_edit', pk=video.id)
             
         except Exception as e:
             logger.error(f"Error creating video: {e}")
             messages.error(request, f'Lỗi khi tạo video: {str(e)}')
-            return redirect('video_create')
+            return redirect('videos:video_create')
     
     # GET request
-    from django.contrib.auth.models import User
     context = {
-        'users': User.objects.all(),
-        'prompt_templates': PromptTemplate.objects.filter(is_active=True),
+        'users': get_user_choices(),
+        'prompt_templates': get_active_prompt_templates(),
+        'reference_cache_version': get_fragment_version(),
+        'reference_cache_timeout': settings.REFERENCE_CACHE_TIMEOUT,
+        'cut_mode_choices': VideoProfile.CUT_MODE_CHOICES,
+        'encoding_profile_choices': get_encoding_profile_choices(),
+        'default_encoding_profile': settings.VIDEO_ENCODING_PROFILE,
     }
     return render(request, 'videos/video_form.html', context)
 
@@ -97,6 +264,7 @@ def video_edit(request, pk):
     if request.method == 'POST':
         try:
             # Update basic fields
+            old_input_link = video.minio_input_link
             video.title = request.POST.get('title', video.title)
             video.youtube_link = request.POST.get('youtube_link', '').strip() or None
             video.minio_input_link = request.POST.get('minio_input_link', '').strip() or None
@@ -108,38 +276,105 @@ def video_edit(request, pk):
             prompt_template_id = request.POST.get('prompt_template')
             video.prompt_template_id = prompt_template_id if prompt_template_id else None
             
-            # Update segments from JSON
+            video.cut_mode = request.POST.get('cut_mode') or video.cut_mode
+            
+            encoding_profile = request.POST.get('encoding_profile') or None
+            if encoding_profile and encoding_profile not in get_encoding_profiles():
+                messages.error(request, f'Encoding profile không hợp lệ: {encoding_profile}')
+                return redirect('videos:video_edit', pk=pk)
+            video.encoding_profile = encoding_profile
+            
+            # Chỉ ghi các field của form, kèm kiểm tra version (optimistic locking)
+            # để không đè lên thay đổi của người khác hoặc status/bộ đếm do worker ghi
+            version = request.POST.get('version')
+            profile = VideoProfile.objects.filter(pk=pk)
+            if version not in (None, ''):
+                profile = profile.filter(version=int(version))
+            updated = profile.update(
+                **{field: getattr(video, field) for field in VideoProfile.FORM_FIELDS},
+                version=F('version') + 1,
+                updated_at=timezone.now()
+            )
+            if not updated:
+                messages.error(
+                    request,
+                    'Video profile đã được người khác cập nhật, vui lòng tải lại trang trước khi lưu'
+                )
+                return redirect('videos:video_edit', pk=pk)
+            
+            # Update segments from JSON (chỉ ghi các segment thay đổi)
             segments_json = request.POST.get('segments', '[]')
             try:
-                video.segments = json.loads(segments_json)
-            except json.JSONDecodeError:
+                sync = video.sync_segments(json.loads(segments_json))
+                if sync['conflicts']:
+                    messages.warning(
+                        request,
+                        'Không lưu được segment '
+                        + ', '.join(str(position + 1) for position in sync['conflicts'])
+                        + ' vì đã bị thay đổi ở nơi khác (vd: vừa cắt xong), vui lòng kiểm tra lại'
+                    )
+            except (json.JSONDecodeError, TypeError, ValueError, AttributeError):
                 messages.warning(request, 'Không thể parse segments JSON, giữ nguyên dữ liệu cũ')
             
-            video.save()
+            # Input đổi thì đọc lại metadata; lưu lại form cũng là cách thử lại probe lỗi
+            if video.minio_input_link != old_input_link:
+                _probe_video_metadata(video)
+                _schedule_preview(video)
+            elif video.probe_failed:
+                _probe_video_metadata(video)
+            
             messages.success(request, 'Đã cập nhật video profile')
-            return redirect('video_edit', pk=pk)
+            return redirect('videos:video_edit', pk=pk)
             
         except Exception as e:
             logger.error(f"Error updating video: {e}")
             messages.error(request, f'Lỗi khi cập nhật video: {str(e)}')
     
-    # Generate presigned URLs for preview
+    # Video cũ chưa có metadata: đọc 1 lần (chỉ header) rồi lưu lại
+    if video.minio_input_link and video.probed_at is None:
+        _probe_video_metadata(video)
+    
+    # Job preview/thumbnail đang chạy để editor theo dõi; GET không tạo job,
+    # job được tạo khi lưu input mới hoặc qua API tạo lại
+    active_jobs = {}
+    if video.minio_input_link:
+        for job in video.jobs.filter(
+            kind__in=('preview', 'thumbnails'),
+            status__in=('queued', 'running'),
+            params__minio_input_link=video.minio_input_link
+        ).only('id', 'kind').order_by('created_at'):
+            active_jobs[job.kind] = str(job.id)
+    
+    # Generate presigned URLs for preview: editor xem proxy/HLS, input gốc chỉ dùng để cắt
     input_presigned_url = None
+    preview_proxy_url = None
     if video.minio_input_link:
         input_presigned_url = minio_client.get_presigned_url(video.minio_input_link)
+    if video.preview_proxy_link:
+        preview_proxy_url = minio_client.get_presigned_url(video.preview_proxy_link)
+    thumbnails = _thumbnails_payload(video.thumbnails_info, minio_client) if video.thumbnails_info else None
     
     # Generate presigned URLs for output segments
-    for segment in video.segments:
+    segments = [segment.to_dict() for segment in video.segments.all()]
+    for segment in segments:
         if segment.get('minio_output_link'):
             segment['presigned_url'] = minio_client.get_presigned_url(segment['minio_output_link'])
     
-    from django.contrib.auth.models import User
     context = {
         'video': video,
-        'users': User.objects.all(),
-        'prompt_templates': PromptTemplate.objects.filter(is_active=True),
+        'users': get_user_choices(),
+        'prompt_templates': get_active_prompt_templates(),
+        'reference_cache_version': get_fragment_version(),
+        'reference_cache_timeout': settings.REFERENCE_CACHE_TIMEOUT,
         'input_presigned_url': input_presigned_url,
-        'segments_json': json.dumps(video.segments),
+        'preview_proxy_url': preview_proxy_url,
+        'preview_job_id': active_jobs.get('preview'),
+        'thumbnails': thumbnails,
+        'thumbnails_job_id': active_jobs.get('thumbnails'),
+        'segments_json': json.dumps(segments),
+        'cut_mode_choices': VideoProfile.CUT_MODE_CHOICES,
+        'encoding_profile_choices': get_encoding_profile_choices(),
+        'default_encoding_profile': settings.VIDEO_ENCODING_PROFILE,
     }
     return render(request, 'videos/video_form.html', context)
 
@@ -155,9 +390,8 @@ def video_delete(request, pk):
         # minio_client = MinioClient()
         # if video.minio_input_link:
         #     minio_client.delete_file(video.minio_input_link)
-        # for segment in video.segments:
-        #     if segment.get('minio_output_link'):
-        #         minio_client.delete_file(segment['minio_output_link'])
+        # for output_link in video.segments.processed().values_list('minio_output_link', flat=True):
+        #     minio_client.delete_file(output_link)
         
         video.delete()
         messages.success(request, f'Đã xóa video profile: {title}')
@@ -165,14 +399,15 @@ def video_delete(request, pk):
         logger.error(f"Error deleting video: {e}")
         messages.error(request, f'Lỗi khi xóa video: {str(e)}')
     
-    return redirect('video_list')
+    return redirect('videos:video_list')
 
 
 # ============ PROMPT TEMPLATE VIEWS ============
 
 def prompt_list(request):
-    """Màn hình Quản lý prompt - Danh sách tất cả prompts"""
-    prompts = PromptTemplate.objects.all()
+    """Màn hình Quản lý prompt - Danh sách prompts (keyset pagination)"""
+    # template_content có thể rất dài và không hiển thị trên danh sách
+    prompts = PromptTemplate.objects.defer('template_content')
     
     # Filter by category if provided
     category_filter = request.GET.get('category')
@@ -184,8 +419,18 @@ def prompt_list(request):
     if is_active:
         prompts = prompts.filter(is_active=is_active == 'true')
     
+    page = keyset_paginate(
+        prompts,
+        [('created_at', True), ('id', True)],
+        cursor=request.GET.get('cursor'),
+        page_size=get_page_size(request),
+        converters={'created_at': parse_datetime}
+    )
+    
     context = {
-        'prompts': prompts,
+        'prompts': page,
+        'page': page,
+        'query_string': _query_string_without_cursor(request),
         'category_choices': PromptTemplate.CATEGORY_CHOICES,
     }
     return render(request, 'videos/prompt_list.html', context)
@@ -193,7 +438,7 @@ def prompt_list(request):
 
 def prompt_detail(request, pk):
     """Xem chi tiết prompt - redirect đến prompt_edit"""
-    return redirect('prompt_edit', pk=pk)
+    return redirect('videos:prompt_edit', pk=pk)
 
 
 def prompt_create(request):
@@ -209,28 +454,35 @@ def prompt_create(request):
             # Validate
             if not name or not category or not template_content:
                 messages.error(request, 'Tên, thể loại và nội dung template là bắt buộc')
-                return redirect('prompt_create')
+                return redirect('videos:prompt_create')
             
             # Create prompt
-            prompt = PromptTemplate.objects.create(
+            prompt = PromptTemplate(
                 name=name,
                 category=category,
                 template_content=template_content,
                 description=description,
                 is_active=is_active
             )
+            try:
+                prompt.full_clean()
+            except ValidationError as e:
+                messages.error(request, ' '.join(e.messages))
+                return redirect('videos:prompt_create')
+            prompt.save()
             
             messages.success(request, f'Đã tạo prompt template: {prompt.name}')
-            return redirect('prompt_edit', pk=prompt.id)
+            return redirect('videos:prompt_edit', pk=prompt.id)
             
         except Exception as e:
             logger.error(f"Error creating prompt: {e}")
             messages.error(request, f'Lỗi khi tạo prompt: {str(e)}')
-            return redirect('prompt_create')
+            return redirect('videos:prompt_create')
     
     # GET request
     context = {
         'category_choices': PromptTemplate.CATEGORY_CHOICES,
+        'placeholders': PLACEHOLDERS,
     }
     return render(request, 'videos/prompt_form.html', context)
 
@@ -247,10 +499,13 @@ def prompt_edit(request, pk):
             prompt.description = request.POST.get('description', '')
             prompt.is_active = request.POST.get('is_active') == 'on'
             
+            prompt.full_clean()
             prompt.save()
             messages.success(request, 'Đã cập nhật prompt template')
-            return redirect('prompt_edit', pk=pk)
+            return redirect('videos:prompt_edit', pk=pk)
             
+        except ValidationError as e:
+            messages.error(request, ' '.join(e.messages))
         except Exception as e:
             logger.error(f"Error updating prompt: {e}")
             messages.error(request, f'Lỗi khi cập nhật prompt: {str(e)}')
@@ -258,6 +513,7 @@ def prompt_edit(request, pk):
     context = {
         'prompt': prompt,
         'category_choices': PromptTemplate.CATEGORY_CHOICES,
+        'placeholders': PLACEHOLDERS,
     }
     return render(request, 'videos/prompt_form.html', context)
 
@@ -275,7 +531,7 @@ def prompt_delete(request, pk):
         logger.error(f"Error deleting prompt: {e}")
         messages.error(request, f'Lỗi khi xóa prompt: {str(e)}')
     
-    return redirect('prompt_list')
+    return redirect('videos:prompt_list')
 
 
 # ============ AJAX/API VIEWS ============
@@ -292,7 +548,27 @@ def generate_prompt(request):
             return JsonResponse({'error': 'Template ID is required'}, status=400)
         
         template = get_object_or_404(PromptTemplate, pk=template_id)
-        generated_prompt = generate_prompt_from_template(template, youtube_link)
+        
+        # Video/segment (tùy chọn) để điền {video_title}, {start_time}, ...
+        video = None
+        if data.get('video_id'):
+            video = get_object_or_404(
+                VideoProfile.objects.only('id', 'title', 'youtube_link', 'notes', 'duration'),
+                pk=data['video_id']
+            )
+        segment = data.get('segment')
+        if segment is not None and not isinstance(segment, dict):
+            return JsonResponse({'error': 'Segment must be an object'}, status=400)
+        values = {
+            name: data[name]
+            for name in ('youtube_title', 'youtube_description', 'youtube_tags')
+            if data.get(name)
+        }
+        try:
+            generated_prompt = generate_prompt_from_template(template, youtube_link, video, segment, **values)
+        except ValueError as e:
+            # Giá trị segment không hợp lệ (vd: start_time không phải số)
+            return JsonResponse({'error': str(e)}, status=400)
         
         return JsonResponse({
             'success': True,
@@ -304,76 +580,364 @@ def generate_prompt(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@require_http_methods(["POST"])
+def generate_prompts_batch(request):
+    """
+    Generate prompt cho segments của nhiều video trong 1 request (AJAX/API)
+    
+    Body JSON: {"template_id": null, "video_ids": [...], "category": null,
+    "only_empty": false, "dry_run": false}. template_id bỏ trống = dùng template
+    riêng của từng video; không có video_ids/category mà có template_id = các
+    video đang dùng template đó.
+    """
+    try:
+        data = json.loads(request.body or '{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    
+    template = None
+    if data.get('template_id'):
+        template = get_object_or_404(PromptTemplate, pk=data['template_id'])
+    
+    videos = VideoProfile.objects.all()
+    if data.get('video_ids'):
+        videos = videos.filter(pk__in=data['video_ids'])
+    elif data.get('category'):
+        videos = videos.filter(prompt_template__category=data['category'])
+    elif template is not None:
+        videos = videos.filter(prompt_template=template)
+    else:
+        return JsonResponse({'error': 'video_ids, category or template_id is required'}, status=400)
+    
+    started = time.monotonic()
+    try:
+        result = generate_segment_prompts(
+            videos,
+            template=template,
+            only_empty=bool(data.get('only_empty')),
+            dry_run=bool(data.get('dry_run'))
+        )
+    except ValidationError:
+        return JsonResponse({'error': 'Invalid video id'}, status=400)
+    except Exception as e:
+        logger.error(f"Error generating prompts: {e}")
+        return JsonResponse({'error': str(e)}, status=500)
+    
+    return JsonResponse({
+        'success': True,
+        **result,
+        'elapsed': round(time.monotonic() - started, 3),
+    })
+
+
+def _get_video_segment(video, segment_id):
+    """Segment theo id của video, None nếu không có (hoặc id không hợp lệ)"""
+    try:
+        return video.segments.filter(pk=segment_id).first()
+    except ValidationError:
+        return None
+
+
 @require_http_methods(["POST"])
 def process_video_segment(request):
-    """Xử lý cắt video segment (AJAX)"""
+    """Tạo job cắt video segment (AJAX), trả về job id ngay"""
     try:
         data = json.loads(request.body)
         video_id = data.get('video_id')
-        segment_index = data.get('segment_index')
+        segment_id = data.get('segment_id')
         start_time = float(data.get('start_time', 0))
         end_time = float(data.get('end_time', 0))
+        cut_mode = data.get('cut_mode')
         
-        # Validate
-        if not video_id or segment_index is None:
-            return JsonResponse({'error': 'Video ID and segment index are required'}, status=400)
+        # Validate: job luôn gắn với 1 segment đã lưu (theo id, không đoán theo vị trí)
+        if not video_id or not segment_id:
+            return JsonResponse({'error': 'Video ID and segment ID are required'}, status=400)
         
         if start_time >= end_time:
             return JsonResponse({'error': 'Start time must be less than end time'}, status=400)
         
+        if cut_mode and cut_mode not in VideoProcessor.CUT_MODES:
+            return JsonResponse({'error': f'Invalid cut mode: {cut_mode}'}, status=400)
+        
         video = get_object_or_404(VideoProfile, pk=video_id)
         
         if not video.minio_input_link:
             return JsonResponse({'error': 'No input video link'}, status=400)
         
-        # Process segment
-        video.status = 'processing'
-        video.save()
+        error = _check_time_range(video, start_time, end_time)
+        if error:
+            return JsonResponse({'error': error}, status=400)
         
-        processor = VideoProcessor()
-        output_link = processor.process_segment(
-            video.minio_input_link,
-            start_time,
-            end_time,
-            segment_index
-        )
+        segment = _get_video_segment(video, segment_id)
+        if segment is None:
+            return JsonResponse({'error': 'Segment not found'}, status=400)
+        
+        # Lưu start/end vào segment ngay khi tạo job: worker chỉ ghi output nếu
+        # thời gian của segment vẫn khớp khi cắt xong (không bị sửa trong lúc cắt)
+        segment_version = segment.version
+        if (segment.start_time, segment.end_time) != (start_time, end_time):
+            Segment.objects.filter(pk=segment.pk).update(
+                start_time=start_time,
+                end_time=end_time,
+                version=F('version') + 1,
+                updated_at=timezone.now()
+            )
+            segment_version += 1
         
-        if not output_link:
-            video.status = 'failed'
-            video.save()
-            return JsonResponse({'error': 'Failed to process video segment'}, status=500)
+        # Enqueue segment job, worker sẽ xử lý
+        job = enqueue_segment_job(video, segment.position, start_time, end_time, cut_mode, segment=segment)
         
-        # Update segment
-        if segment_index < len(video.segments):
-            video.segments[segment_index]['minio_output_link'] = output_link
-            video.segments[segment_index]['start_time'] = start_time
-            video.segments[segment_index]['end_time'] = end_time
+        VideoProfile.objects.filter(pk=video.pk).update(status='processing', updated_at=timezone.now())
         
-        # Update status
-        if video.get_processed_segments() == video.get_total_segments():
-            video.status = 'completed'
+        return JsonResponse({
+            'success': True,
+            'job_id': str(job.id),
+            'status': job.status,
+            'segment_version': segment_version
+        }, status=202)
         
-        video.save()
+    except Exception as e:
+        logger.error(f"Error processing video segment: {e}")
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@require_http_methods(["POST"])
+def process_all_segments(request):
+    """Tạo job cắt tất cả segments có start/end time của video trong 1 lần (AJAX)"""
+    try:
+        data = json.loads(request.body)
+        video_id = data.get('video_id')
+        cut_mode = data.get('cut_mode')
         
-        # Generate presigned URL for preview
-        minio_client = MinioClient()
-        presigned_url = minio_client.get_presigned_url(output_link)
+        if not video_id:
+            return JsonResponse({'error': 'Video ID is required'}, status=400)
+        
+        if cut_mode and cut_mode not in VideoProcessor.CUT_MODES:
+            return JsonResponse({'error': f'Invalid cut mode: {cut_mode}'}, status=400)
+        
+        video = get_object_or_404(VideoProfile, pk=video_id)
+        
+        if not video.minio_input_link:
+            return JsonResponse({'error': 'No input video link'}, status=400)
+        
+        segments = video.segments.with_time_range()
+        if not segments.exists():
+            return JsonResponse({'error': 'No segments with valid start/end time'}, status=400)
+        
+        if video.duration is not None:
+            segment = segments.filter(start_time__gte=video.duration).first()
+            if segment:
+                error = _check_time_range(video, segment.start_time, segment.end_time)
+                return JsonResponse({'error': f'Segment {segment.position}: {error}'}, status=400)
+        
+        # Enqueue batch job, worker sẽ xử lý
+        job = enqueue_all_segments_job(video, cut_mode)
+        
+        VideoProfile.objects.filter(pk=video.pk).update(status='processing', updated_at=timezone.now())
         
         return JsonResponse({
             'success': True,
-            'output_link': output_link,
-            'presigned_url': presigned_url,
-            'progress': video.get_progress_percentage()
-        })
+            'job_id': str(job.id),
+            'status': job.status
+        }, status=202)
         
     except Exception as e:
-        logger.error(f"Error processing video segment: {e}")
+        logger.error(f"Error processing video segments: {e}")
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@require_http_methods(["GET"])
+def job_status(request, job_id):
+    """Trạng thái của 1 processing job (AJAX)"""
+    job = get_object_or_404(ProcessingJob, pk=job_id)
+    data = job.to_dict()
+    
+    # Presigned URL cho output để preview ngay khi job xong
+    if job.status == 'done' and job.kind == 'preview':
+        data['result']['proxy_url'] = MinioClient().get_presigned_url(job.result['proxy_link'])
+    elif job.status == 'done' and job.kind == 'thumbnails':
+        data['result']['thumbnails'] = _thumbnails_payload(job.result['info'], MinioClient())
+    elif job.status == 'done':
+        minio_client = MinioClient()
+        outputs = [job.result] if job.kind == 'segment' else job.result.get('results', [])
+        for output in outputs:
+            if output.get('output_link'):
+                output['presigned_url'] = minio_client.get_presigned_url(output['output_link'])
+        
+        video = job.video
+        data['progress'] = video.get_progress_percentage()
+    
+    return JsonResponse(data)
+
+
+@require_http_methods(["POST"])
+def regenerate_preview(request, pk):
+    """Tạo lại proxy/HLS preview cho input hiện tại của video (AJAX), preview cũ dùng tới khi job xong"""
+    video = get_object_or_404(VideoProfile, pk=pk)
+    if not video.minio_input_link:
+        return JsonResponse({'error': 'No input video link'}, status=400)
+    
+    job = enqueue_preview_job(video)
+    return JsonResponse({
+        'success': True,
+        'job_id': str(job.id),
+        'status': job.status
+    }, status=202)
+
+
+@require_http_methods(["POST"])
+def regenerate_thumbnails(request, pk):
+    """Tạo lại sprite sheet thumbnail cho input hiện tại của video (AJAX)"""
+    video = get_object_or_404(VideoProfile, pk=pk)
+    if not video.minio_input_link:
+        return JsonResponse({'error': 'No input video link'}, status=400)
+    
+    job = enqueue_thumbnails_job(video)
+    return JsonResponse({
+        'success': True,
+        'job_id': str(job.id),
+        'status': job.status
+    }, status=202)
+
+
+@require_http_methods(["GET"])
+def video_preview_playlist(request, pk):
+    """
+    Playlist HLS preview của video
+    
+    Chunk trên Minio là private nên URL của từng chunk trong playlist được
+    thay bằng presigned URL; player tải chunk thẳng từ Minio.
+    """
+    video = get_object_or_404(VideoProfile.objects.only('id', 'preview_hls_link'), pk=pk)
+    if not video.preview_hls_link:
+        raise Http404('Preview is not ready')
+    
+    minio_client = MinioClient()
+    content = minio_client.read_file(video.preview_hls_link)
+    if content is None:
+        raise Http404('Preview playlist not found')
+    
+    base = posixpath.dirname(video.preview_hls_link)
+    lines = []
+    for line in content.decode().splitlines():
+        if line and not line.startswith('#'):
+            line = minio_client.get_presigned_url(posixpath.join(base, line))
+        lines.append(line)
+    
+    response = HttpResponse('\n'.join(lines) + '\n', content_type='application/vnd.apple.mpegurl')
+    # Presigned URL có hạn nên không cho cache lâu
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@require_http_methods(["GET"])
+def video_thumbnails_vtt(request, pk):
+    """
+    Index WebVTT sprite sheet thumbnail của video (cho player hỗ trợ thumbnail track)
+    
+    Như playlist HLS: sprite trên Minio là private nên dùng presigned URL.
+    """
+    video = get_object_or_404(VideoProfile.objects.only('id', 'thumbnails_info'), pk=pk)
+    if not video.thumbnails_info:
+        raise Http404('Thumbnails are not ready')
+    
+    payload = _thumbnails_payload(video.thumbnails_info, MinioClient())
+    response = HttpResponse(build_thumbnails_vtt(payload), content_type='text/vtt')
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@require_http_methods(["GET"])
+def video_jobs(request, pk):
+    """Danh sách processing jobs của video (AJAX)"""
+    video = get_object_or_404(VideoProfile, pk=pk)
+    jobs = video.jobs.all()
+    
+    status_filter = request.GET.get('status')
+    if status_filter:
+        jobs = jobs.filter(status=status_filter)
+    
+    return JsonResponse({
+        'jobs': [job.to_dict() for job in jobs[:50]]
+    })
+
+
+async def video_progress_stream(request, pk):
+    """
+    Stream tiến độ các processing job của video bằng Server-Sent Events
+    
+    View async (chạy qua core/asgi.py) nên mỗi tab đang mở không chiếm 1 sync
+    worker. Gửi event `progress` khi trạng thái/tiến độ job thay đổi, `idle`
+    khi không còn job nào đang chờ/chạy thì đóng stream.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    
+    if not await VideoProfile.objects.filter(pk=pk).aexists():
+        raise Http404('Video not found')
+    
+    interval = settings.VIDEO_PROGRESS_STREAM_INTERVAL
+    keepalive = settings.VIDEO_PROGRESS_STREAM_KEEPALIVE
+    max_duration = settings.VIDEO_PROGRESS_STREAM_MAX_DURATION
+    since = timezone.now()
+    
+    async def event_stream():
+        last_state = {}
+        started = time.monotonic()
+        last_sent = started
+        
+        yield f"retry: {int(interval * 1000)}\n\n"
+        
+        while time.monotonic() - started < max_duration:
+            jobs = [
+                job async for job in ProcessingJob.objects.filter(
+                    Q(status__in=['queued', 'running']) | Q(finished_at__gte=since),
+                    video_id=pk
+                ).only(
+                    'id', 'video_id', 'kind', 'segment_index', 'status',
+                    'stage', 'progress', 'error'
+                ).order_by('created_at')
+            ]
+            
+            changed = []
+            for job in jobs:
+                state = (job.status, job.stage, job.progress)
+                if last_state.get(job.id) != state:
+                    last_state[job.id] = state
+                    changed.append({
+                        'id': str(job.id),
+                        'kind': job.kind,
+                        'segment_index': job.segment_index,
+                        'status': job.status,
+                        'stage': job.stage,
+                        'progress': job.progress,
+                        'error': job.error,
+                    })
+            
+            if changed:
+                yield f"event: progress\ndata: {json.dumps({'jobs': changed})}\n\n"
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= keepalive:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            
+            if not any(job.status in ('queued', 'running') for job in jobs):
+                yield "event: idle\ndata: {}\n\n"
+                return
+            
+            await asyncio.sleep(interval)
+        
+        # Hết thời gian tối đa: đóng stream, EventSource sẽ tự kết nối lại
+    
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @require_http_methods(["POST"])
 def add_segment(request):
-    """Thêm segment mới vào video (AJAX)"""
+    """Thêm segment mới vào cuối video (AJAX)"""
     try:
         data = json.loads(request.body)
         video_id = data.get('video_id')
@@ -382,21 +946,21 @@ def add_segment(request):
         
         video = get_object_or_404(VideoProfile, pk=video_id)
         
-        new_segment = {
-            'prompt': prompt,
-            'result': result,
-            'minio_output_link': None,
-            'start_time': None,
-            'end_time': None
-        }
-        
-        video.segments.append(new_segment)
-        video.save()
+        with transaction.atomic():
+            video.lock()
+            last = video.segments.order_by('-position').values_list('position', flat=True).first()
+            new_segment = Segment.objects.create(
+                video=video,
+                position=0 if last is None else last + 1,
+                prompt=prompt or '',
+                result=result or ''
+            )
+            VideoProfile.refresh_segment_counters(video.pk)
         
         return JsonResponse({
             'success': True,
-            'segment_index': len(video.segments) - 1,
-            'segment': new_segment
+            'segment_index': new_segment.position,
+            'segment': new_segment.to_dict()
         })
         
     except Exception as e:
@@ -410,26 +974,233 @@ def delete_segment(request):
     try:
         data = json.loads(request.body)
         video_id = data.get('video_id')
-        segment_index = data.get('segment_index')
+        segment_id = data.get('segment_id')
+        if not segment_id:
+            return JsonResponse({'error': 'Segment ID is required'}, status=400)
         
         video = get_object_or_404(VideoProfile, pk=video_id)
         
-        if 0 <= segment_index < len(video.segments):
-            deleted_segment = video.segments.pop(segment_index)
-            video.save()
+        with transaction.atomic():
+            video.lock()
+            segment = _get_video_segment(video, segment_id)
+            if segment is None:
+                return JsonResponse({'error': 'Segment not found'}, status=400)
             
-            return JsonResponse({
-                'success': True,
-                'deleted_segment': deleted_segment
-            })
-        else:
-            return JsonResponse({'error': 'Invalid segment index'}, status=400)
+            deleted_segment = segment.to_dict()
+            segment.delete()
+            # Dồn vị trí các segment phía sau (1 query)
+            video.segments.filter(position__gt=segment.position).update(position=F('position') - 1)
+            VideoProfile.refresh_segment_counters(video.pk)
+        
+        return JsonResponse({
+            'success': True,
+            'deleted_segment': deleted_segment
+        })
         
     except Exception as e:
         logger.error(f"Error deleting segment: {e}")
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@require_http_methods(["POST"])
+def bulk_segments(request, pk):
+    """
+    Thêm/sửa/xóa nhiều segments trong 1 transaction (AJAX/API)
+    
+    Body JSON: {"create": [...], "update": [{"id", "version", ...}], "delete": [id, ...],
+    "csv": "start_time,end_time,prompt...", "replace": false}. Cũng nhận trực tiếp
+    CSV (Content-Type: text/csv) hoặc file CSV upload (field `file`); với CSV,
+    ?replace=1 để thay toàn bộ segments hiện có.
+    """
+    video = get_object_or_404(VideoProfile, pk=pk)
+    
+    try:
+        if request.content_type == 'text/csv':
+            data = {'csv': request.body.decode('utf-8-sig'), 'replace': request.GET.get('replace') == '1'}
+        elif request.FILES.get('file'):
+            data = {
+                'csv': request.FILES['file'].read().decode('utf-8-sig'),
+                'replace': request.POST.get('replace') in ('1', 'true', 'on'),
+            }
+        else:
+            data = json.loads(request.body)
+        
+        create = list(data.get('create') or [])
+        if data.get('csv'):
+            create += parse_segments_csv(data['csv'])
+        delete = list(data.get('delete') or [])
+        if data.get('replace'):
+            delete = [str(segment_id) for segment_id in video.segments.values_list('pk', flat=True)]
+        
+        result = apply_segment_changes(video, create=create, update=data.get('update'), delete=delete)
+        
+    except BulkValidationError as e:
+        return JsonResponse({'error': str(e), 'errors': e.errors}, status=400)
+    except (json.JSONDecodeError, UnicodeDecodeError, csv.Error, ValidationError, TypeError, AttributeError) as e:
+        return JsonResponse({'error': f'Invalid request body: {e}'}, status=400)
+    except Exception as e:
+        logger.error(f"Error in bulk segments: {e}")
+        return JsonResponse({'error': str(e)}, status=500)
+    
+    video.refresh_from_db(fields=['total_segments', 'processed_segments'])
+    return JsonResponse({
+        'success': True,
+        **result,
+        'total_segments': video.total_segments,
+        'processed_segments': video.processed_segments,
+    })
+
+
+@require_http_methods(["POST"])
+def process_segments_bulk(request, pk):
+    """
+    Tạo job cắt cho nhiều segments trong 1 request (AJAX/API)
+    
+    Body JSON: {"segment_ids": [...] (bỏ trống = tất cả segments có start/end time),
+    "cut_mode": null, "batch": false}. Mặc định tạo 1 job/segment để các worker cắt
+    song song; batch=true tạo 1 job cắt tất cả trong 1 lần decode.
+    """
+    try:
+        data = json.loads(request.body or '{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    
+    cut_mode = data.get('cut_mode')
+    if cut_mode and cut_mode not in VideoProcessor.CUT_MODES:
+        return JsonResponse({'error': f'Invalid cut mode: {cut_mode}'}, status=400)
+    
+    video = get_object_or_404(VideoProfile, pk=pk)
+    if not video.minio_input_link:
+        return JsonResponse({'error': 'No input video link'}, status=400)
+    
+    segment_ids = data.get('segment_ids')
+    segments = video.segments.defer('prompt', 'result')
+    if segment_ids:
+        segments = segments.filter(pk__in=segment_ids)
+    else:
+        segments = segments.with_time_range()
+    try:
+        segments = list(segments)
+    except ValidationError:
+        return JsonResponse({'error': 'Invalid segment id'}, status=400)
+    
+    results = []
+    valid = []
+    if segment_ids:
+        found = {str(segment.pk) for segment in segments}
+        results += [
+            {'segment_id': str(segment_id), 'success': False, 'error': 'Segment not found'}
+            for segment_id in segment_ids if str(segment_id) not in found
+        ]
+    
+    for segment in segments:
+        error = None
+        if segment.start_time is None or segment.end_time is None or segment.start_time >= segment.end_time:
+            error = 'Segment has no valid start/end time'
+        else:
+            error = _check_time_range(video, segment.start_time, segment.end_time)
+        if error:
+            results.append({
+                'segment_id': str(segment.pk), 'position': segment.position, 'success': False, 'error': error
+            })
+        else:
+            valid.append(segment)
+    
+    if valid:
+        if data.get('batch'):
+            job = enqueue_all_segments_job(video, cut_mode, segment_ids=[segment.pk for segment in valid])
+            jobs = [job] * len(valid)
+        else:
+            jobs = enqueue_segment_jobs(video, valid, cut_mode)
+        
+        results += [
+            {'segment_id': str(segment.pk), 'position': segment.position, 'success': True, 'job_id': str(job.id)}
+            for segment, job in zip(valid, jobs)
+        ]
+        VideoProfile.objects.filter(pk=video.pk).update(status='processing', updated_at=timezone.now())
+    
+    return JsonResponse({
+        'success': bool(valid),
+        'queued': len(valid),
+        'failed': len(results) - len(valid),
+        'results': results,
+    }, status=202 if valid else 400)
+
+
+@staff_member_required
+def pool_stats(request):
+    """
+    Thống kê connection pool của process hiện tại (DB và Minio HTTP) - chỉ staff
+    
+    Số liệu là của riêng process xử lý request (mỗi worker gunicorn/uvicorn có pool riêng).
+    """
+    databases = []
+    for alias in connections:
+        conn = connections[alias]
+        databases.append({
+            'alias': alias,
+            'vendor': conn.vendor,
+            'conn_max_age': conn.settings_dict.get('CONN_MAX_AGE'),
+            'health_checks': conn.settings_dict.get('CONN_HEALTH_CHECKS'),
+            'connected': conn.connection is not None,
+        })
+    
+    minio_client = MinioClient()
+    return JsonResponse({
+        'pid': os.getpid(),
+        'databases': databases,
+        'minio_http_pools': minio_client.http_pool_stats(),
+        'minio_presigned_cache': minio_client.presigned_cache_stats(),
+    })
+
+
+def _metrics_gauges():
+    """Gauge tính tại thời điểm scrape: độ sâu hàng đợi job và input cache"""
+    now = timezone.now()
+    depth = {
+        (row['status'], row['kind']): row['count']
+        for row in ProcessingJob.objects.filter(status__in=['queued', 'running'])
+        .values('status', 'kind').annotate(count=Count('id'))
+    }
+    oldest = ProcessingJob.objects.filter(status='queued').aggregate(oldest=Min('created_at'))['oldest']
+    
+    cache_stats = InputVideoCache(None).stats()
+    return [
+        ('video_job_queue_depth', 'Processing jobs waiting or running, by status and kind', [
+            ({'status': status, 'kind': kind}, depth.get((status, kind), 0))
+            for status in ('queued', 'running')
+            for kind, _ in ProcessingJob.KIND_CHOICES
+        ]),
+        ('video_job_queue_oldest_seconds', 'Age of the oldest queued processing job', [
+            ({}, (now - oldest).total_seconds() if oldest else 0.0)
+        ]),
+        ('video_input_cache_requests', 'Input video cache lookups since the cache dir was created, by result', [
+            ({'result': result}, cache_stats[key])
+            for result, key in (('hit', 'hits'), ('miss', 'misses'), ('bypass', 'bypass'), ('eviction', 'evictions'))
+        ]),
+        ('video_input_cache_hit_ratio', 'Input video cache hit ratio', [({}, cache_stats['hit_rate'])]),
+        ('video_input_cache_bytes', 'Bytes stored in the input video cache', [({}, cache_stats['bytes'])]),
+        ('video_input_cache_entries', 'Videos stored in the input video cache', [({}, cache_stats['entries'])]),
+    ]
+
+
+def metrics_view(request):
+    """
+    Prometheus metrics của pipeline (stage latency, Minio latency, hàng đợi, cache)
+    
+    Nếu settings.METRICS_TOKEN được đặt, request phải gửi header
+    Authorization: Bearer <token>; nếu không thì chỉ staff được xem.
+    """
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+            return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    elif not (request.user.is_authenticated and request.user.is_staff):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    
+    return HttpResponse(metrics.render(_metrics_gauges()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 def home(request):
     """Home page - redirect to video list"""
-    return redirect('video_list')
\ No newline at end of file
+    return redirect('videos:video_list')
\ No newline at end of file
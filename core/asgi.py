@@ -1,11 +1,21 @@
 """
-WSGI config for video_profile_manager project.
+ASGI config for video_profile_manager project.
+
+Chạy bằng uvicorn để các view async (vd: stream tiến độ SSE) không chiếm
+sync worker: uvicorn core.asgi:application
 """
 
 import os
 
-from django.core.wsgi import get_wsgi_application
+from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_wsgi_application()
\ No newline at end of file
+application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.DEBUG:
+    # Serve static files khi dev giống runserver
+    from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+    application = ASGIStaticFilesHandler(application)
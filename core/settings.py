@@ -3,7 +3,9 @@ Django settings for video_profile_manager project.
 """
 
 from pathlib import Path
+import json
 import os
+import socket
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -42,6 +44,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.videos.profiling.RequestProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -63,6 +66,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'core.wsgi.application'
+ASGI_APPLICATION = 'core.asgi.application'
 
 # Database
 DATABASES = {
@@ -73,8 +77,36 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', 'secretpassword'),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        # Giữ connection giữa các request (giây, 0 = đóng sau mỗi request)
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        # Kiểm tra connection còn sống trước khi dùng lại ở request mới
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+        # Bật khi đi qua PgBouncer ở chế độ transaction pooling
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_DISABLE_SERVER_SIDE_CURSORS', 'False') == 'True',
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '10')),
+        },
+    }
+}
+
+# Cache (mặc định local-memory trong từng process)
+# CACHE_BACKEND: locmem | file | redis | memcached. Khi chạy nhiều process/máy nên
+# dùng backend dùng chung (redis/memcached) để việc xóa cache có hiệu lực ở mọi process
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+}
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[os.getenv('CACHE_BACKEND', 'locmem')],
+        'LOCATION': os.getenv('CACHE_LOCATION', 'video-profile-manager'),
+        'KEY_PREFIX': os.getenv('CACHE_KEY_PREFIX', 'vpm'),
     }
 }
+# Thời gian (giây) cache dữ liệu tham chiếu: template active, danh sách user, dropdown đã render
+REFERENCE_CACHE_TIMEOUT = int(os.getenv('REFERENCE_CACHE_TIMEOUT', '3600'))
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -116,12 +148,107 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
+# Số dòng mỗi trang ở các màn hình danh sách (có thể đổi bằng ?page_size=)
+LIST_PAGE_SIZE = int(os.getenv('LIST_PAGE_SIZE', '25'))
+LIST_MAX_PAGE_SIZE = int(os.getenv('LIST_MAX_PAGE_SIZE', '200'))
+
 # Minio Configuration
 MINIO_ENDPOINT = os.getenv('MINIO_ENDPOINT', 'localhost:9000')
 MINIO_ACCESS_KEY = os.getenv('MINIO_ACCESS_KEY', 'minioadmin')
 MINIO_SECRET_KEY = os.getenv('MINIO_SECRET_KEY', 'minioadmin')
 MINIO_BUCKET = os.getenv('MINIO_BUCKET', 'video-profiles')
 MINIO_USE_SSL = os.getenv('MINIO_USE_SSL', 'False') == 'True'
+# Backend object store: minio | filesystem (thư mục local, cho dev/benchmark không có Minio)
+MINIO_BACKEND = os.getenv('MINIO_BACKEND', 'minio')
+MINIO_FILESYSTEM_ROOT = os.getenv('MINIO_FILESYSTEM_ROOT', os.path.join(BASE_DIR, 'object_store'))
+# Region cố định để ký presigned URL không cần gọi GetBucketLocation (để trống = tự dò)
+MINIO_REGION = os.getenv('MINIO_REGION', 'us-east-1') or None
+
+# Cache presigned URL (trong process): dùng lại URL tới khi còn SAFETY_MARGIN giây là hết hạn
+MINIO_PRESIGNED_URL_EXPIRES = int(os.getenv('MINIO_PRESIGNED_URL_EXPIRES', '3600'))
+MINIO_PRESIGNED_URL_SAFETY_MARGIN = int(os.getenv('MINIO_PRESIGNED_URL_SAFETY_MARGIN', '300'))
+MINIO_PRESIGNED_URL_CACHE_SIZE = int(os.getenv('MINIO_PRESIGNED_URL_CACHE_SIZE', '10000'))
+
+# Multipart upload / ranged download song song (part tối thiểu 5 MiB)
+MINIO_PART_SIZE = int(os.getenv('MINIO_PART_SIZE', str(64 * 1024 ** 2)))
+MINIO_TRANSFER_THREADS = int(os.getenv('MINIO_TRANSFER_THREADS', '8'))
+
+# HTTP connection pool của Minio client (urllib3, 1 pool/host, dùng chung giữa các thread)
+# Pool size luôn >= MINIO_TRANSFER_THREADS để các part song song không phải mở connection mới
+MINIO_HTTP_POOL_SIZE = int(os.getenv('MINIO_HTTP_POOL_SIZE', '16'))
+# True = thread chờ connection rảnh khi pool đầy thay vì mở connection ngoài pool
+MINIO_HTTP_POOL_BLOCK = os.getenv('MINIO_HTTP_POOL_BLOCK', 'False') == 'True'
+MINIO_HTTP_CONNECT_TIMEOUT = float(os.getenv('MINIO_HTTP_CONNECT_TIMEOUT', '10'))
+MINIO_HTTP_READ_TIMEOUT = float(os.getenv('MINIO_HTTP_READ_TIMEOUT', '300'))
+MINIO_HTTP_RETRIES = int(os.getenv('MINIO_HTTP_RETRIES', '5'))
+MINIO_HTTP_BACKOFF_FACTOR = float(os.getenv('MINIO_HTTP_BACKOFF_FACTOR', '0.2'))
+# TCP keep-alive cho connection rảnh trong pool (giây trước khi gửi probe đầu tiên)
+MINIO_HTTP_TCP_KEEPALIVE = int(os.getenv('MINIO_HTTP_TCP_KEEPALIVE', '60'))
 
 # Temporary directory for video processing
-TEMP_VIDEO_DIR = '/tmp/video_processing'
\ No newline at end of file
+TEMP_VIDEO_DIR = os.getenv('TEMP_VIDEO_DIR', '/tmp/video_processing')
+
+# Disk cache cho video input tải từ Minio (LRU, key = object name + ETag)
+VIDEO_INPUT_CACHE_DIR = os.getenv('VIDEO_INPUT_CACHE_DIR', os.path.join(TEMP_VIDEO_DIR, 'input_cache'))
+VIDEO_INPUT_CACHE_MAX_BYTES = int(os.getenv('VIDEO_INPUT_CACHE_MAX_BYTES', str(20 * 1024 ** 3)))
+
+# Video cutting
+# Chế độ cắt mặc định: reencode | copy | smart
+VIDEO_CUT_MODE = os.getenv('VIDEO_CUT_MODE', 'reencode')
+# Encoding profile khi re-encode (apps/videos/encoding.py: fast-preview, balanced, archival)
+VIDEO_ENCODING_PROFILE = os.getenv('VIDEO_ENCODING_PROFILE', 'balanced')
+# JSON ghi đè/thêm profile, vd: {"balanced": {"threads": 2}, "hd": {"preset": "fast", "max_height": 720}}
+VIDEO_ENCODING_PROFILES = json.loads(os.getenv('VIDEO_ENCODING_PROFILES', '{}'))
+# JSON category của PromptTemplate -> profile, vd: {"shorts": "fast-preview"}
+VIDEO_ENCODING_PROFILE_BY_CATEGORY = json.loads(os.getenv('VIDEO_ENCODING_PROFILE_BY_CATEGORY', '{}'))
+FFPROBE_BINARY = os.getenv('FFPROBE_BINARY', 'ffprobe')
+# Cắt streaming: ffmpeg đọc input qua presigned URL (ranged HTTP) và ghi fragmented MP4
+# thẳng vào upload Minio, không dùng file tạm
+VIDEO_STREAMING_CUT = os.getenv('VIDEO_STREAMING_CUT', 'False') == 'True'
+
+# Preview cho editor: proxy MP4 độ phân giải thấp + HLS (tạo bằng job nền khi có input)
+VIDEO_PREVIEW_ENABLED = os.getenv('VIDEO_PREVIEW_ENABLED', 'True') == 'True'
+VIDEO_PREVIEW_ENCODING_PROFILE = os.getenv('VIDEO_PREVIEW_ENCODING_PROFILE', 'fast-preview')
+# Độ dài mỗi chunk HLS (giây), proxy có keyframe đúng theo khoảng này
+VIDEO_PREVIEW_HLS_SEGMENT = int(os.getenv('VIDEO_PREVIEW_HLS_SEGMENT', '2'))
+
+# Sprite sheet thumbnail cho timeline của editor (job nền, decode input 1 lần)
+VIDEO_THUMBNAILS_ENABLED = os.getenv('VIDEO_THUMBNAILS_ENABLED', 'True') == 'True'
+# Khoảng cách giữa 2 thumbnail (giây)
+VIDEO_THUMBNAIL_INTERVAL = float(os.getenv('VIDEO_THUMBNAIL_INTERVAL', '2'))
+VIDEO_THUMBNAIL_WIDTH = int(os.getenv('VIDEO_THUMBNAIL_WIDTH', '160'))
+# Số cột x hàng thumbnail trong 1 sprite sheet
+VIDEO_THUMBNAIL_COLUMNS = int(os.getenv('VIDEO_THUMBNAIL_COLUMNS', '10'))
+VIDEO_THUMBNAIL_ROWS = int(os.getenv('VIDEO_THUMBNAIL_ROWS', '10'))
+# Chất lượng JPEG theo thang -q:v của ffmpeg (2 = tốt nhất, 31 = kém nhất)
+VIDEO_THUMBNAIL_QUALITY = int(os.getenv('VIDEO_THUMBNAIL_QUALITY', '5'))
+
+# Prometheus metrics (/metrics): mỗi process ghi số liệu vào METRICS_DIR (dùng chung
+# giữa web và worker), để trống = chỉ số liệu của process đang phục vụ request
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(TEMP_VIDEO_DIR, 'metrics'))
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+# Bearer token cho Prometheus khi scrape /metrics (để trống = chỉ staff đã đăng nhập)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Profiling request: staff bật bằng header X-Profile: 1|cprofile hoặc ?_profile=1|cprofile,
+# ngoài ra lấy mẫu ngẫu nhiên theo tỉ lệ (0 = tắt). Kết quả ghi log và REQUEST_PROFILING_DIR
+REQUEST_PROFILING_SAMPLE_RATE = float(os.getenv('REQUEST_PROFILING_SAMPLE_RATE', '0'))
+REQUEST_PROFILING_DIR = os.getenv('REQUEST_PROFILING_DIR', os.path.join(TEMP_VIDEO_DIR, 'profiles'))
+
+# Background worker (python manage.py run_video_worker)
+VIDEO_WORKER_CONCURRENCY = int(os.getenv('VIDEO_WORKER_CONCURRENCY', '2'))
+VIDEO_WORKER_POLL_INTERVAL = float(os.getenv('VIDEO_WORKER_POLL_INTERVAL', '2'))
+# Tên node và số job tối đa chạy đồng thời trên 1 node (tính cả nhiều worker cùng node)
+VIDEO_WORKER_NODE = os.getenv('VIDEO_WORKER_NODE', socket.gethostname())
+VIDEO_WORKER_NODE_CONCURRENCY = int(os.getenv('VIDEO_WORKER_NODE_CONCURRENCY', str(VIDEO_WORKER_CONCURRENCY)))
+# Lease của job: worker phải heartbeat trước khi lease hết hạn, nếu không job
+# sẽ được trả lại queue (tối đa VIDEO_JOB_MAX_ATTEMPTS lần)
+VIDEO_JOB_LEASE_SECONDS = int(os.getenv('VIDEO_JOB_LEASE_SECONDS', '60'))
+VIDEO_JOB_HEARTBEAT_INTERVAL = int(os.getenv('VIDEO_JOB_HEARTBEAT_INTERVAL', '15'))
+VIDEO_JOB_MAX_ATTEMPTS = int(os.getenv('VIDEO_JOB_MAX_ATTEMPTS', '3'))
+# Khoảng thời gian tối thiểu (giây) giữa 2 lần ghi tiến độ job vào DB
+VIDEO_JOB_PROGRESS_INTERVAL = float(os.getenv('VIDEO_JOB_PROGRESS_INTERVAL', '1'))
+# Server-Sent Events: chu kỳ kiểm tra tiến độ và keep-alive (giây)
+VIDEO_PROGRESS_STREAM_INTERVAL = float(os.getenv('VIDEO_PROGRESS_STREAM_INTERVAL', '1'))
+VIDEO_PROGRESS_STREAM_KEEPALIVE = float(os.getenv('VIDEO_PROGRESS_STREAM_KEEPALIVE', '15'))
+VIDEO_PROGRESS_STREAM_MAX_DURATION = float(os.getenv('VIDEO_PROGRESS_STREAM_MAX_DURATION', '600'))
\ No newline at end of file
@@ -7,9 +7,12 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import RedirectView
 
+from apps.videos.views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('videos/', include('apps.videos.urls')),
+    path('metrics', metrics_view, name='metrics'),
     path('', RedirectView.as_view(url='/videos/', permanent=False)),
 ]
 